@@ -15,6 +15,7 @@ const REQUIRED_KEYS = [
   "CognitoWebClientID",
   "WebUIBucket",
   "WebUrl",
+  "WebsocketEndpoint",
 ];
 
 const writeConfigFile = (src, dest, configMap) =>
@@ -4,4 +4,5 @@ export const AWS_API_URL = import.meta.env.VITE_APP_API_GATEWAY_ENDPOINT;
 export const AWS_USER_POOL_ID = import.meta.env.VITE_APP_AWS_USER_POOL_ID;
 export const AWS_USER_POOL_WEB_CLIENT_ID = import.meta.env
   .VITE_APP_AWS_USER_POOL_WEB_CLIENT_ID;
+export const AWS_WEBSOCKET_URL = import.meta.env.VITE_APP_WEBSOCKET_ENDPOINT;
 /************* END OF ENVIRONMENT VARIABLES **************/
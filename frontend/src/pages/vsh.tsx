@@ -11,6 +11,7 @@ import Tiles from "@cloudscape-design/components/tiles";
 import Select from "@cloudscape-design/components/select";
 import ProgressBar from "@cloudscape-design/components/progress-bar";
 import Table from "@cloudscape-design/components/table";
+import Box from "@cloudscape-design/components/box";
 import axios from "axios";
 import { OptionDefinition } from "@cloudscape-design/components/internal/components/option/interfaces";
 import Alert from "@cloudscape-design/components/alert";
@@ -25,6 +26,7 @@ import {
   AWS_REGION,
   AWS_USER_POOL_ID,
   AWS_USER_POOL_WEB_CLIENT_ID,
+  AWS_WEBSOCKET_URL,
 } from "../constants";
 
 const languages = [
@@ -68,6 +70,8 @@ var taskInputUrls: string[] = [];
 var pollyVoices: string[] = [];
 var taskOutputs: string[] = [];
 var taskTypes: string[] = [];
+var nextTasksCursor: string | null = null;
+const TASKS_PAGE_SIZE = 20;
 
 const getAuthToken = async () => {
   try {
@@ -139,6 +143,19 @@ const Vsh = () => {
   const addItem = (item: TableData) => {
     setTableData((prevTableData) => [item, ...prevTableData]);
   };
+  const appendItem = (item: TableData) => {
+    setTableData((prevTableData) => [...prevTableData, item]);
+  };
+  const [hasMoreTasks, setHasMoreTasks] = useState(false);
+  const [isLoadingMoreTasks, setIsLoadingMoreTasks] = useState(false);
+  const handleLoadMoreClick = () => {
+    if (userId) {
+      setIsLoadingMoreTasks(true);
+      retrieveTasks(userId, appendItem, setHasMoreTasks).finally(() =>
+        setIsLoadingMoreTasks(false)
+      );
+    }
+  };
 
   const [isSubmitDisabled, setIsSubmitDisabled] = useState(false);
   const handleSubmitClick = () => {
@@ -209,12 +226,51 @@ const Vsh = () => {
 
   const [showAlert, setShowAlert] = useState(false);
 
+  const updateTask = (taskId: string, status: string, endTime: string) => {
+    const i = taskIds.indexOf(taskId);
+    if (i === -1) return;
+    taskStatuses[i] = status;
+    endTimes[i] = endTime;
+    setTableData((prevTableData) =>
+      prevTableData.map((item) =>
+        item.taskId === taskId
+          ? { ...item, taskStatus: status, endTime: endTime }
+          : item
+      )
+    );
+    if (status !== "Complete") return;
+    // Events carry no URL, the download link is signed on request.
+    authenticatedAxios
+      .get(AWS_API_URL + "/gettaskstatus?taskId=" + taskId)
+      .then((response) => {
+        taskOutputs[i] = response.data["outputUrl"];
+        setDownloadText("Download");
+        setTableData((prevTableData) =>
+          prevTableData.map((item) =>
+            item.taskId === taskId
+              ? { ...item, taskOutput: response.data["outputUrl"] }
+              : item
+          )
+        );
+      })
+      .catch((error) => {
+        console.error(error);
+      });
+  };
+
   useEffect(() => {
     if (userId) {
       language = selectedLanguage.value;
       gender = selectedGender;
       getVoices(setSelectedVoice);
-      retrieveAllTasks(userId, addItem);
+      nextTasksCursor = null;
+      retrieveTasks(userId, appendItem, setHasMoreTasks);
+    }
+  }, [userId]);
+
+  useEffect(() => {
+    if (userId) {
+      return subscribeToTaskEvents(updateTask);
     }
   }, [userId]);
 
@@ -586,6 +642,18 @@ const Vsh = () => {
               loadingText=""
               selectionType="multi"
               trackBy="taskId"
+              footer={
+                hasMoreTasks ? (
+                  <Box textAlign="center">
+                    <Button
+                      onClick={handleLoadMoreClick}
+                      loading={isLoadingMoreTasks}
+                    >
+                      Load older tasks
+                    </Button>
+                  </Box>
+                ) : undefined
+              }
             />
           </SpaceBetween>
         </Container>
@@ -781,53 +849,91 @@ function startStepFunctionExecution(
   fetchData();
 }
 
-function retrieveAllTasks(userId: string, addItem: (item: TableData) => void) {
-  const fetchData = async () => {
-    const response = await authenticatedAxios
-      .get(AWS_API_URL + "/gettasks?userId=" + userId)
-      .then((response) => {
-        if (response.status == 200) {
-          let tasks = response.data;
-          tasks = tasks
-            .slice()
-            .sort((taskA: { started: string }, taskB: { started: string }) => {
-              const startedA = taskA.started as string;
-              const startedB = taskB.started as string;
-
-              return (
-                new Date(startedA).getTime() - new Date(startedB).getTime()
-              );
-            });
-          for (let i = 0; i < tasks.length; i++) {
-            taskIds.unshift(tasks[i]["taskId"]);
-            taskStatuses.unshift(tasks[i]["status"]);
-            startTimes.unshift(tasks[i]["started"]);
-            endTimes.unshift(
-              tasks[i]["endTime"] === "-" ? "" : tasks[i]["endTime"]
-            );
-            taskInputFilenames.unshift(tasks[i]["inputFilename"]);
-            taskInputUrls.unshift(tasks[i]["inputUrl"]);
-            pollyVoices.unshift(tasks[i]["pollyVoice"]);
-            taskOutputs.unshift(tasks[i]["outputUrl"]);
-            taskTypes.unshift(tasks[i]["taskType"]);
-            let item = {
-              taskId: tasks[i]["taskId"],
-              taskStatus: tasks[i]["status"],
-              startTime: tasks[i]["started"],
-              endTime: tasks[i]["endTime"] === "-" ? "" : tasks[i]["endTime"],
-              taskInputFilename: tasks[i]["inputFilename"],
-              taskInputUrl: tasks[i]["inputUrl"],
-              pollyVoice: tasks[i]["pollyVoice"],
-              taskOutput: tasks[i]["outputUrl"],
-              taskType: tasks[i]["taskType"],
-            };
-            addItem(item);
-          }
-        }
-      })
-      .catch((error) => {
-        console.error(error);
-      });
+function subscribeToTaskEvents(
+  updateTask: (taskId: string, status: string, endTime: string) => void
+) {
+  // Task events are pushed over a WebSocket so the table follows the tasks
+  // without polling. The Refresh button keeps working without it.
+  if (!AWS_WEBSOCKET_URL) return;
+  let socket: WebSocket | null = null;
+  let keepAlive: ReturnType<typeof setInterval> | undefined;
+  let closed = false;
+  const connect = async () => {
+    const session = await Auth.currentSession();
+    const token = session.getAccessToken().getJwtToken();
+    if (closed) return;
+    socket = new WebSocket(
+      AWS_WEBSOCKET_URL + "?token=" + encodeURIComponent(token)
+    );
+    socket.onmessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (event["type"] !== "task") return;
+      updateTask(event["taskId"], event["status"], event["endTime"] ?? "");
+    };
+    socket.onclose = () => {
+      clearInterval(keepAlive);
+      // API Gateway closes connections after 10 idle minutes or 2 hours.
+      if (!closed) setTimeout(connect, 5000);
+    };
+    keepAlive = setInterval(
+      () => socket?.send(JSON.stringify({ action: "ping" })),
+      5 * 60 * 1000
+    );
   };
-  fetchData();
+  connect().catch((error) => console.error(error));
+  return () => {
+    closed = true;
+    clearInterval(keepAlive);
+    socket?.close();
+  };
+}
+
+function retrieveTasks(
+  userId: string,
+  appendItem: (item: TableData) => void,
+  setHasMoreTasks: (hasMore: boolean) => void
+) {
+  // Tasks come newest first one page at a time, and only the URLs of the
+  // page are signed. Older pages are loaded from the table footer.
+  let url =
+    AWS_API_URL + "/gettasks?limit=" + TASKS_PAGE_SIZE + "&userId=" + userId;
+  if (nextTasksCursor) {
+    url += "&cursor=" + encodeURIComponent(nextTasksCursor);
+  }
+  return authenticatedAxios
+    .get(url)
+    .then((response) => {
+      if (response.status == 200) {
+        const tasks = response.data["tasks"];
+        nextTasksCursor = response.data["nextCursor"];
+        setHasMoreTasks(nextTasksCursor != null);
+        for (let i = 0; i < tasks.length; i++) {
+          if (taskIds.includes(tasks[i]["taskId"])) continue;
+          taskIds.push(tasks[i]["taskId"]);
+          taskStatuses.push(tasks[i]["status"]);
+          startTimes.push(tasks[i]["started"]);
+          endTimes.push(tasks[i]["endTime"] === "-" ? "" : tasks[i]["endTime"]);
+          taskInputFilenames.push(tasks[i]["inputFilename"]);
+          taskInputUrls.push(tasks[i]["inputUrl"]);
+          pollyVoices.push(tasks[i]["pollyVoice"]);
+          taskOutputs.push(tasks[i]["outputUrl"]);
+          taskTypes.push(tasks[i]["taskType"]);
+          let item = {
+            taskId: tasks[i]["taskId"],
+            taskStatus: tasks[i]["status"],
+            startTime: tasks[i]["started"],
+            endTime: tasks[i]["endTime"] === "-" ? "" : tasks[i]["endTime"],
+            taskInputFilename: tasks[i]["inputFilename"],
+            taskInputUrl: tasks[i]["inputUrl"],
+            pollyVoice: tasks[i]["pollyVoice"],
+            taskOutput: tasks[i]["outputUrl"],
+            taskType: tasks[i]["taskType"],
+          };
+          appendItem(item);
+        }
+      }
+    })
+    .catch((error) => {
+      console.error(error);
+    });
 }
@@ -0,0 +1,35 @@
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+FUNCTIONS = Path(__file__).resolve().parents[1] / "functions"
+LAYERS = Path(__file__).resolve().parents[1] / "layers"
+
+for layer in sorted(LAYERS.iterdir()):
+    if str(layer) not in sys.path:
+        sys.path.insert(0, str(layer))
+
+
+def load_module(function, module):
+    """Import a module of a Lambda function from its own directory."""
+    function_path = str(FUNCTIONS / function)
+    if function_path not in sys.path:
+        sys.path.insert(0, function_path)
+    spec = importlib.util.spec_from_file_location(
+        f"{function}.{module}", FUNCTIONS / function / f"{module}.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_of(repeat, func, *args):
+    """Run func repeat times and return (last result, fastest time in ms)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
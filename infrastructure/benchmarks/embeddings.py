@@ -0,0 +1,92 @@
+"""Compare serial and concurrent embed_texts on the offline fake transport.
+
+Usage: python benchmarks/embeddings.py [--texts 100] [--latency 0.02]
+       [--workers 10] [--throttle-rate 0.1] [--repeat 3]
+"""
+
+import argparse
+import random
+import threading
+
+from botocore.exceptions import ClientError
+
+from common import best_of, load_module
+
+embeddings = load_module("getframes", "embeddings")
+
+
+def counting(invoke):
+    """Wrap invoke to count calls and throttling errors."""
+    counts = {"calls": 0, "throttled": 0}
+    lock = threading.Lock()
+
+    def wrapped(text):
+        with lock:
+            counts["calls"] += 1
+        try:
+            return invoke(text)
+        except ClientError:
+            with lock:
+                counts["throttled"] += 1
+            raise
+
+    return wrapped, counts
+
+
+def run(texts, args, max_workers):
+    """Embed texts and return (vectors, fastest time in ms, counts of a run)."""
+    runs = []
+
+    def embed():
+        random.seed(0)
+        invoke, run_counts = counting(
+            embeddings.fake_invoke(
+                dimension=args.dimension,
+                latency=args.latency,
+                throttle_rate=args.throttle_rate,
+            )
+        )
+        runs.append(run_counts)
+        return embeddings.embed_texts(
+            texts, invoke, max_workers, args.max_attempts, args.base_delay
+        )
+
+    vectors, elapsed = best_of(args.repeat, embed)
+    assert vectors.shape == (len(texts), args.dimension)
+    return vectors, elapsed, runs[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--throttle-rate", type=float, default=0.1)
+    parser.add_argument("--max-attempts", type=int, default=8)
+    parser.add_argument("--base-delay", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = [f"Sentence {i} of the transcript." for i in range(args.texts)]
+    serial, serial_ms, serial_counts = run(texts, args, 1)
+    concurrent, concurrent_ms, concurrent_counts = run(texts, args, args.workers)
+    # The fake transport is deterministic per text, so the order is kept.
+    assert (serial == concurrent).all()
+
+    print(f"texts:       {args.texts}, {args.latency * 1000:.0f} ms per call")
+    print(f"throttling:  {args.throttle_rate:.0%} of calls")
+    for name, elapsed, counts in [
+        ("serial", serial_ms, serial_counts),
+        (f"{args.workers} workers", concurrent_ms, concurrent_counts),
+    ]:
+        print(
+            f"{name + ':':<12} {elapsed:.0f} ms (best of {args.repeat}), "
+            f"{args.texts / elapsed * 1000:.0f} texts/s, "
+            f"{counts['throttled']} of {counts['calls']} calls throttled"
+        )
+    print(f"speedup:     {serial_ms / concurrent_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
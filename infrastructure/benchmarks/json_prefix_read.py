@@ -0,0 +1,83 @@
+"""Compare reading one value with json_prefix against a full json.loads.
+
+Usage: python benchmarks/json_prefix_read.py [--items 100000] [--repeat 3]
+"""
+
+import argparse
+import json
+
+from common import best_of  # also puts the layers on sys.path
+import json_prefix
+
+
+class RangedS3:
+    """Serves ranged GETs from memory, like s3_client.get_object(Range=...)."""
+
+    class Body:
+        def __init__(self, data):
+            self.data = data
+
+        def read(self):
+            return self.data
+
+    def __init__(self, data):
+        self.data = data
+
+    def get_object(self, Bucket, Key, Range):
+        first, last = Range[len("bytes=") :].split("-")
+        return {"Body": self.Body(self.data[int(first) : int(last) + 1])}
+
+
+def make_transcript(items):
+    """Build a Transcribe result with the given number of pronunciation items."""
+    words = [
+        {
+            "start_time": f"{i * 0.4:.3f}",
+            "end_time": f"{i * 0.4 + 0.35:.3f}",
+            "alternatives": [{"confidence": "0.99", "content": f"word{i}"}],
+            "type": "pronunciation",
+        }
+        for i in range(items)
+    ]
+    transcript = " ".join(word["alternatives"][0]["content"] for word in words)
+    return json.dumps(
+        {
+            "jobName": "benchmark",
+            "accountId": "000000000000",
+            "results": {"transcripts": [{"transcript": transcript}], "items": words},
+            "status": "COMPLETED",
+        }
+    ).encode("utf-8")
+
+
+def read_prefix(data, path):
+    chunks = json_prefix.s3_chunks(RangedS3(data), "bucket", "key")
+    return json_prefix.read_value(chunks, path)
+
+
+def read_full(data, path):
+    value = json.loads(data.decode("utf-8-sig"))
+    for key in path:
+        value = value[key]
+    return value, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_transcript(args.items)
+    print(f"document: {len(data) / 1e6:.2f} MB, {args.items} items")
+    for path in (("results", "items", 0), ("results", "transcripts", 0)):
+        (value, prefix_bytes), prefix_ms = best_of(args.repeat, read_prefix, data, path)
+        (expected, full_bytes), full_ms = best_of(args.repeat, read_full, data, path)
+        assert value == expected
+        print(f"{'.'.join(map(str, path))}:")
+        print(f"  json_prefix: {prefix_bytes / 1e6:8.2f} MB read, {prefix_ms:8.1f} ms")
+        print(f"  json.loads:  {full_bytes / 1e6:8.2f} MB read, {full_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
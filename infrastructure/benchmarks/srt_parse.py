@@ -0,0 +1,66 @@
+"""Time the SRT parser on a synthetic Transcribe subtitle file.
+
+Usage: python benchmarks/srt_parse.py [--cues 10000] [--repeat 5]
+"""
+
+import argparse
+import io
+
+from common import best_of  # also puts the layers on sys.path
+import srt
+
+
+class Body:
+    """Stands in for the S3 StreamingBody that srt.iter_lines() reads."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def iter_lines(self, chunk_size=65536):
+        return (line.rstrip(b"\r\n") for line in io.BytesIO(self.data))
+
+
+def timestamp(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def make_srt(cues):
+    """Build an SRT document of 2.5 s cues, every third one ending a sentence
+    and every fifth one spread over two lines."""
+    parts = []
+    for i in range(cues):
+        start = i * 2500
+        text = f"word{i} and some more words of cue {i}"
+        if i % 5 == 0:
+            text += "\nwith a second line"
+        if i % 3 == 2:
+            text += "."
+        parts.append(
+            f"{i + 1}\n{timestamp(start)} --> {timestamp(start + 2400)}\n{text}\n"
+        )
+    return "\n".join(parts).encode("utf-8")
+
+
+def parse(data):
+    return srt.read_sentences(srt.iter_lines(Body(data)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cues", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_srt(args.cues)
+    (sentences, start_ms, end_ms), elapsed = best_of(args.repeat, parse, data)
+    assert len(sentences) == len(start_ms) == len(end_ms)
+    print(f"SRT size:   {len(data) / 1e6:.2f} MB, {args.cues} cues")
+    print(f"sentences:  {len(sentences)}")
+    print(f"parse time: {elapsed:.1f} ms (best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
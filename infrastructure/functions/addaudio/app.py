@@ -48,6 +48,16 @@ def lambda_handler(event, context):
     music_vol_level = 50
     music_vol = -60 + 60 * music_vol_level / 100
 
+    # The job carries the task ID in its user metadata, so the callback reads
+    # the token from the task item. The token is stored before the job can
+    # finish.
+    updateTaskStatus(
+        os.environ["vsh_dynamodb_table"],
+        userId,
+        taskId,
+        video_name,
+        event["TaskToken"],
+    )
     mediaconvertTaskId = create_mediaconvert_task(
         endpoint_url,
         taskId,
@@ -61,15 +71,6 @@ def lambda_handler(event, context):
         subtitle_file,
     )
 
-    updateTaskStatus(
-        os.environ["vsh_dynamodb_table"],
-        userId,
-        taskId,
-        mediaconvertTaskId,
-        video_name,
-        event["TaskToken"],
-    )
-
     return {"statusCode": 200}
 
 
@@ -88,7 +89,7 @@ def create_mediaconvert_task(
     media_convert = boto3.client("mediaconvert", endpoint_url=endpoint_url)
     response = media_convert.create_job(
         Queue=media_convert_queue,
-        UserMetadata={},
+        UserMetadata={"TaskId": taskId},
         Role=iam_role,
         Settings={
             "TimecodeConfig": {"Source": "ZEROBASED"},
@@ -181,9 +182,7 @@ def create_mediaconvert_task(
     return response["Job"]["Id"]
 
 
-def updateTaskStatus(
-    dynamodb_table, userId, taskId, mediaconvertTaskId, video_name, sfToken
-):
+def updateTaskStatus(dynamodb_table, userId, taskId, video_name, sfToken):
     output_filename = (
         userId
         + "/"
@@ -196,15 +195,13 @@ def updateTaskStatus(
     table = dynamodb_client.Table(dynamodb_table)
     dynamodbResponse = table.update_item(
         Key={"TaskId": taskId},
-        UpdateExpression="SET #att1 = :value1, #att2 = :value2, #att3 = :value3",
+        UpdateExpression="SET #att1 = :value1, #att2 = :value2",
         ExpressionAttributeValues={
-            ":value1": mediaconvertTaskId,
-            ":value2": output_filename,
-            ":value3": sfToken,
+            ":value1": output_filename,
+            ":value2": sfToken,
         },
         ExpressionAttributeNames={
-            "#att1": "MediaConvertTaskId",
-            "#att2": "Output",
-            "#att3": "LambdaMediaConvertTaskToken",
+            "#att1": "Output",
+            "#att2": "LambdaMediaConvertTaskToken",
         },
     )
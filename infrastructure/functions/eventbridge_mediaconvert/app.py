@@ -1,49 +1,85 @@
+import json
 import logging
 import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
 import os
 import datetime
 
+import notify
+
 s3_client = boto3.client("s3")
 dynamodb_client = boto3.resource("dynamodb")
 stepfunctions_client = boto3.client("stepfunctions")
+transcribe_client = boto3.client("transcribe")
 
 
 def lambda_handler(event, context):
     dynamodb_table = os.environ["vsh_dynamodb_table"]
 
     table = dynamodb_client.Table(dynamodb_table)
-    mediaconvertTaskId = event["detail"]["jobId"]
+    user_metadata = event["detail"].get("userMetadata", {})
+    if user_metadata.get("Purpose") == "transcribe-segment":
+        return transcribe_segment(table, event["detail"], user_metadata)
+
     queue = event["detail"]["queue"]
-    response = table.query(
-        IndexName="MediaConvertGSI",
-        KeyConditionExpression=Key("MediaConvertTaskId").eq(mediaconvertTaskId),
-    )
-    item = response["Items"][0]
+    item = table.get_item(Key={"TaskId": user_metadata["TaskId"]}, ConsistentRead=True)[
+        "Item"
+    ]
     sfTaskToken = item["LambdaMediaConvertTaskToken"]
 
     # sendTaskSuccess to Step Function to notify mediaconvert has successfully finished the job
+    # The render mode tells the state machine whether addaudio still has to run.
     sfResponse = stepfunctions_client.send_task_success(
-        taskToken=sfTaskToken, output="{}"
+        taskToken=sfTaskToken,
+        output=json.dumps({"renderMode": user_metadata.get("RenderMode", "two_pass")}),
     )
 
-    if queue == os.environ["media_convert_queue_release"]:
+    # The first of the two passes only cuts the clips, the task is complete
+    # once addaudio's job, or the single job, has finished.
+    if user_metadata.get("RenderMode") == "two_pass":
+        notify.publish_task_event(item["UserId"], item["TaskId"], "clips_rendered")
+    elif queue == os.environ["media_convert_queue_release"]:
         video_name = parse_s3_path(
             event["detail"]["outputGroupDetails"][0]["outputDetails"][0][
                 "outputFilePaths"
             ][0]
         )
-        updateTaskStatus(
-            dynamodb_table,
-            item["TaskId"],
-            "Complete",
-            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        endTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        updateTaskStatus(dynamodb_table, item["TaskId"], "Complete", endTime)
+        notify.publish_task_event(
+            item["UserId"], item["TaskId"], "complete", "Complete", endTime=endTime
         )
 
     return {"statusCode": 200}
 
 
+def transcribe_segment(table, detail, user_metadata):
+    """Start the Transcribe job of a segment whose audio has been cut."""
+    taskId = user_metadata["TaskId"]
+    if detail["status"] != "COMPLETE":
+        item = table.get_item(Key={"TaskId": taskId}, ConsistentRead=True)["Item"]
+        stepfunctions_client.send_task_failure(
+            taskToken=item["LambdaTranscribeTaskToken"],
+            error="TranscribeSegmentFailed",
+            cause=detail.get("errorMessage", "MediaConvert job " + detail["jobId"]),
+        )
+        return {"statusCode": 200}
+
+    transcribe_client.start_transcription_job(
+        TranscriptionJobName=f"{taskId}-seg{user_metadata['Segment']}",
+        Media={
+            "MediaFileUri": detail["outputGroupDetails"][0]["outputDetails"][0][
+                "outputFilePaths"
+            ][0]
+        },
+        MediaFormat="mp4",
+        LanguageCode=user_metadata["LanguageCode"],
+        Subtitles={"Formats": ["srt"]},
+        OutputBucketName=os.environ["bucket_transcripts"],
+    )
+    return {"statusCode": 200}
+
+
 def updateTaskStatus(dynamodb_table, taskId, status, endTime):
     table = dynamodb_client.Table(dynamodb_table)
     dynamodbResponse = table.update_item(
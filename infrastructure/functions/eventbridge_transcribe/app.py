@@ -1,9 +1,22 @@
+import json
+import logging
+import re
 import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
 import os
 
+import notify
+import srt
+import stitching
+import transcript_artifact
+
+logging.getLogger().setLevel(logging.INFO)
+
 dynamodb_client = boto3.resource("dynamodb")
+s3_client = boto3.client("s3")
+
+# Jobs of a segmented transcription are named <taskId>-seg<k>.
+SEGMENT_JOB_NAME = re.compile(r"^(.+)-seg(\d+)$")
 
 
 def lambda_handler(event, context):
@@ -11,16 +24,141 @@ def lambda_handler(event, context):
     table = dynamodb_client.Table(dynamodb_table)
 
     transcribeTaskId = event["detail"]["TranscriptionJobName"]
+    segment_job = SEGMENT_JOB_NAME.match(transcribeTaskId)
+    if segment_job:
+        return complete_segment(
+            table,
+            segment_job.group(1),
+            segment_job.group(2),
+            event["detail"]["TranscriptionJobStatus"],
+        )
 
-    response = table.query(
-        IndexName="TranscribeGSI",
-        KeyConditionExpression=Key("TranscribeTaskId").eq(transcribeTaskId),
-    )
-    item = response["Items"][0]
+    # Jobs are named after their task.
+    item = table.get_item(Key={"TaskId": transcribeTaskId}, ConsistentRead=True)["Item"]
     sfTaskToken = item["LambdaTranscribeTaskToken"]
 
+    if event["detail"]["TranscriptionJobStatus"] == "COMPLETED":
+        create_transcript_artifact(
+            os.environ["bucket_transcripts"], item["TaskId"], transcribeTaskId
+        )
+        if "MediaFingerprint" in item:
+            index_media(
+                os.environ["bucket_transcripts"],
+                item["MediaFingerprint"],
+                item["TaskId"],
+            )
+
     # sendTaskSuccess to Step Function to notify Transcribe has successfully finished the job
     stepfunctions = boto3.client("stepfunctions")
     sfResponse = stepfunctions.send_task_success(taskToken=sfTaskToken, output="{}")
+    if event["detail"]["TranscriptionJobStatus"] == "COMPLETED":
+        notify.publish_task_event(item["UserId"], item["TaskId"], "transcribed")
+
+    return {"statusCode": 200}
+
+
+def complete_segment(table, taskId, segment, status):
+    """Record a finished segment, and stitch them all once the last is done."""
+    stepfunctions = boto3.client("stepfunctions")
+    if status != "COMPLETED":
+        item = table.get_item(Key={"TaskId": taskId}, ConsistentRead=True)["Item"]
+        stepfunctions.send_task_failure(
+            taskToken=item["LambdaTranscribeTaskToken"],
+            error="TranscribeSegmentFailed",
+            cause=f"Transcription of segment {segment} of task {taskId} failed",
+        )
+        return {"statusCode": 200}
+
+    # A set makes a repeated event for the same segment count only once.
+    item = table.update_item(
+        Key={"TaskId": taskId},
+        UpdateExpression="ADD TranscribeSegmentsCompleted :segment",
+        ExpressionAttributeValues={":segment": {segment}},
+        ReturnValues="ALL_NEW",
+    )["Attributes"]
+    segments = [(int(start), int(end)) for start, end in item["TranscribeSegmentsMs"]]
+    completed = len(item["TranscribeSegmentsCompleted"])
+    logging.info(f"Task {taskId}: {completed} of {len(segments)} segments transcribed")
+    if completed < len(segments):
+        notify.publish_task_event(
+            item["UserId"],
+            taskId,
+            "transcribing",
+            segmentsCompleted=completed,
+            segments=len(segments),
+        )
+        return {"statusCode": 200}
 
+    bucket_transcripts = os.environ["bucket_transcripts"]
+    stitch_segments(bucket_transcripts, taskId, segments)
+    create_transcript_artifact(bucket_transcripts, taskId, taskId)
+    if "MediaFingerprint" in item:
+        index_media(bucket_transcripts, item["MediaFingerprint"], taskId)
+    stepfunctions.send_task_success(
+        taskToken=item["LambdaTranscribeTaskToken"], output="{}"
+    )
+    notify.publish_task_event(item["UserId"], taskId, "transcribed")
     return {"statusCode": 200}
+
+
+def stitch_segments(bucket_transcripts, taskId, segments):
+    # Writes <taskId>.json and <taskId>.srt in the same shape as a single
+    # Transcribe job, so downstream functions do not know about segments.
+    def read(key):
+        return (
+            s3_client.get_object(Bucket=bucket_transcripts, Key=key)["Body"]
+            .read()
+            .decode("utf-8")
+        )
+
+    names = [f"{taskId}-seg{k}" for k in range(len(segments))]
+    results = [json.loads(read(name + ".json")) for name in names]
+    s3_client.put_object(
+        Body=json.dumps(stitching.stitch_json(segments, results, taskId)),
+        Bucket=bucket_transcripts,
+        Key=taskId + ".json",
+    )
+    documents = [read(name + ".srt") for name in names]
+    s3_client.put_object(
+        Body=stitching.stitch_srt(segments, documents),
+        Bucket=bucket_transcripts,
+        Key=taskId + ".srt",
+    )
+
+
+def create_transcript_artifact(bucket_transcripts, taskId, transcribeTaskId):
+    # Downstream functions fall back to the Transcribe JSON and SRT when the
+    # artifact is missing, so a failure here must not fail the task.
+    try:
+        transcribe_result = json.loads(
+            s3_client.get_object(
+                Bucket=bucket_transcripts, Key=transcribeTaskId + ".json"
+            )["Body"].read()
+        )
+        # Sentences come from the SRT cues, as getframes has always split them.
+        subtitle_sentences = srt.read_sentences(
+            srt.iter_lines(
+                s3_client.get_object(
+                    Bucket=bucket_transcripts, Key=transcribeTaskId + ".srt"
+                )["Body"]
+            )
+        )
+        s3_client.put_object(
+            Body=transcript_artifact.encode(
+                transcript_artifact.build_columns(transcribe_result, subtitle_sentences)
+            ),
+            Bucket=bucket_transcripts,
+            Key=transcript_artifact.artifact_key(taskId),
+        )
+    except (ClientError, KeyError, ValueError) as e:
+        logging.error("Could not create the transcript artifact: " + repr(e))
+
+
+def index_media(bucket_transcripts, media_fingerprint, taskId):
+    # Later tasks for the same media copy this task's transcripts instead of
+    # starting a new Transcribe job.
+    s3_client.put_object(
+        Body=json.dumps({"taskId": taskId}),
+        Bucket=bucket_transcripts,
+        Key="media-index/" + media_fingerprint + ".json",
+    )
@@ -0,0 +1,168 @@
+import srt
+
+# The first word kept after a cut that repeats the last word before the cut
+# within this distance is the same word heard twice around the cut.
+DUPLICATE_WINDOW_MS = 300
+
+
+def cut_points(segments):
+    """Where each segment's share of the media starts and ends.
+
+    Neighbouring segments overlap, and the boundary between them is placed in
+    the middle of the overlap, away from the clipped edges where words are
+    most likely to be cut off.
+
+    :param segments: List of (start_ms, end_ms) of each segment in the media.
+    :return: List of (from_ms, to_ms); to_ms of the last one is None.
+    """
+    cuts = []
+    for k, (start_ms, end_ms) in enumerate(segments):
+        from_ms = 0 if k == 0 else (start_ms + segments[k - 1][1]) // 2
+        to_ms = None
+        if k + 1 < len(segments):
+            to_ms = (segments[k + 1][0] + end_ms) // 2
+        cuts.append((from_ms, to_ms))
+    return cuts
+
+
+def in_share(time_ms, share):
+    from_ms, to_ms = share
+    return time_ms >= from_ms and (to_ms is None or time_ms < to_ms)
+
+
+def stitch_json(segments, results, job_name):
+    """Combine the Transcribe JSON results of overlapping segments.
+
+    Word times are shifted by the segment start, and each segment only
+    contributes the words that start in its share of the media. Punctuation
+    follows the word before it. Only the first word after each cut is checked
+    against the word before the cut, so repeats within a segment are kept.
+
+    :param segments: List of (start_ms, end_ms) of each segment in the media.
+    :param results: Transcribe JSON result of each segment, in the same order.
+    :return: A Transcribe JSON result for the whole media.
+    """
+    items = []
+    last_word = None
+    for (start_ms, _), share, result in zip(segments, cut_points(segments), results):
+        keep = False
+        after_cut = last_word is not None
+        for item in result["results"]["items"]:
+            if item["type"] == "punctuation":
+                if keep:
+                    items.append(dict(item))
+                continue
+            item_start_ms = start_ms + to_ms(item["start_time"])
+            keep = in_share(item_start_ms, share)
+            content = item["alternatives"][0]["content"]
+            if keep and after_cut:
+                after_cut = False
+                if (
+                    content.lower() == last_word[0].lower()
+                    and item_start_ms - last_word[1] < DUPLICATE_WINDOW_MS
+                ):
+                    keep = False
+            if not keep:
+                continue
+            item = dict(item)
+            item["start_time"] = from_ms(item_start_ms)
+            item["end_time"] = from_ms(start_ms + to_ms(item["end_time"]))
+            items.append(item)
+            last_word = (content, item_start_ms)
+
+    for i, item in enumerate(items):
+        if "id" in item:
+            item["id"] = i
+
+    return {
+        "jobName": job_name,
+        "status": "COMPLETED",
+        "results": {
+            "transcripts": [{"transcript": transcript_text(items)}],
+            "items": items,
+        },
+    }
+
+
+def transcript_text(items):
+    text = ""
+    for item in items:
+        content = item["alternatives"][0]["content"]
+        if item["type"] == "punctuation" or not text:
+            text += content
+        else:
+            text += " " + content
+    return text
+
+
+def stitch_srt(segments, documents):
+    """Combine the SRT subtitles of overlapping segments.
+
+    Cues are shifted by the segment start and renumbered from 1. Each
+    segment keeps the part of its cues inside its share of the media, so a
+    cue that crosses a cut is split between the segments on either side.
+
+    :param documents: SRT text of each segment, in the same order as segments.
+    :return: SRT text for the whole media.
+    """
+    cues = []
+    for (start_ms, _), share, document in zip(
+        segments, cut_points(segments), documents
+    ):
+        for cue_start, cue_end, lines in srt.iter_cue_lines(
+            document.lstrip("\ufeff").splitlines()
+        ):
+            cue = cue_in_share(start_ms + cue_start, start_ms + cue_end, lines, share)
+            if cue is not None:
+                cues.append(cue)
+
+    blocks = []
+    for number, (cue_start, cue_end, lines) in enumerate(cues, start=1):
+        timing = srt_time(cue_start) + " --> " + srt_time(cue_end)
+        blocks.append("\n".join([str(number), timing] + lines))
+    return "\n\n".join(blocks) + "\n" if blocks else ""
+
+
+def cue_in_share(cue_start, cue_end, lines, share):
+    """Part of a cue inside a share of the media, or None.
+
+    SRT has no word times, so the words are spread evenly over the cue and
+    the ones that start inside the share are kept, with their lines.
+    """
+    words = [(line, word) for line, text in enumerate(lines) for word in text.split()]
+    if not words:
+        return (cue_start, cue_end, lines) if in_share(cue_start, share) else None
+    step = (cue_end - cue_start) / len(words)
+    kept = [
+        k for k in range(len(words)) if in_share(cue_start + round(k * step), share)
+    ]
+    if not kept:
+        return None
+    kept_lines = lines
+    if len(kept) < len(words):
+        kept_lines = []
+        for line in range(len(lines)):
+            text = " ".join(words[k][1] for k in kept if words[k][0] == line)
+            if text:
+                kept_lines.append(text)
+    # The cue ends at the cut at the latest, where the next segment's
+    # cues start.
+    end = cue_start + round((kept[-1] + 1) * step)
+    if share[1] is not None:
+        end = min(end, share[1])
+    return cue_start + round(kept[0] * step), end, kept_lines
+
+
+def srt_time(time_ms):
+    hours, rest = divmod(time_ms, 3600000)
+    minutes, rest = divmod(rest, 60000)
+    seconds, milliseconds = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def to_ms(seconds):
+    return round(float(seconds) * 1000)
+
+
+def from_ms(time_ms):
+    return f"{time_ms / 1000:.3f}"
@@ -3,6 +3,8 @@ from botocore.exceptions import ClientError
 import os
 import datetime
 
+import notify
+
 dynamodb_client = boto3.resource("dynamodb")
 
 
@@ -11,7 +13,11 @@ def lambda_handler(event, context):
     taskId = event["taskId"]
     status = "Failed"
     endTime = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    updateTaskStatus(dynamodb_table, taskId, status, endTime)
+    item = updateTaskStatus(dynamodb_table, taskId, status, endTime)
+    if "UserId" in item:
+        notify.publish_task_event(
+            item["UserId"], taskId, "failed", status, endTime=endTime
+        )
     return {"statusCode": 200}
 
 
@@ -22,4 +28,6 @@ def updateTaskStatus(dynamodb_table, taskId, status, endTime):
         UpdateExpression="SET #st = :value1, #et = :value2",
         ExpressionAttributeValues={":value1": status, ":value2": endTime},
         ExpressionAttributeNames={"#st": "Status", "#et": "EndTime"},
+        ReturnValues="ALL_NEW",
     )
+    return dynamodbResponse["Attributes"]
@@ -0,0 +1,224 @@
+import numpy as np
+
+import similarity
+
+
+def best_matching_indices(similarity_matrix):
+    """Align summary sentences to original sentences, keeping their order.
+
+    Row i of the DP scores summary sentence i against every original
+    sentence j. A cell is only reachable when its similarity is positive and
+    some earlier original sentence k < j holds a positive score in the
+    previous row, in which case it takes the best of those scores. The best
+    predecessor is a running maximum of the previous row, so each row costs
+    O(N) instead of O(N^2).
+
+    Instead of keeping the dense score matrix and re-scanning it with argmax
+    during the backtrack, the position of each row's running maximum is
+    stored as an int32 backpointer.
+
+    :param similarity_matrix: (summary sentences, original sentences) array
+    :return: List with the index of the best matching original sentence for
+             each of the first min(M, N) summary sentences.
+    """
+    similarity_matrix = np.asarray(similarity_matrix, dtype=float)
+    len_summarized_sentences, len_original_sentences = similarity_matrix.shape
+    return best_matching_indices_from_tiles(
+        [similarity_matrix], len_summarized_sentences, len_original_sentences
+    )
+
+
+def best_matching_indices_from_tiles(
+    tiles, len_summarized_sentences, len_original_sentences
+):
+    """Run best_matching_indices over column tiles of the similarity matrix.
+
+    Tiles cover consecutive original sentences from left to right and are
+    consumed one at a time, so only the current tile and the int32
+    backpointers are held in memory. For every row the best score and its
+    position over all earlier tiles are carried into the next tile.
+
+    :param tiles: Iterable of (summary sentences, tile width) arrays.
+    :return: Same result as best_matching_indices on the concatenated tiles.
+    """
+    if len_summarized_sentences == 0 or len_original_sentences == 0:
+        return []
+
+    rows = min(len_original_sentences, len_summarized_sentences)
+    backpointers = np.empty([rows, len_original_sentences], dtype=np.int32)
+    carried_max = np.full(rows, -np.inf)
+    carried_argmax = np.zeros(rows, dtype=np.int32)
+    start = 0
+    for tile in tiles:
+        previous_carried_max = carried_max.copy()
+        previous_running_max = None
+        for i in range(rows):
+            if i == 0:
+                dp_row = tile[0]
+            else:
+                dp_row = next_dp_row(
+                    tile[i],
+                    np.maximum(previous_running_max, previous_carried_max[i - 1]),
+                    start,
+                    start,
+                    carry=previous_carried_max[i - 1],
+                )
+            previous_running_max = running_max(dp_row)
+            backpointers[i, start : start + tile.shape[1]] = np.where(
+                previous_running_max > carried_max[i],
+                prefix_argmax(dp_row) + start,
+                carried_argmax[i],
+            )
+            if previous_running_max[-1] > carried_max[i]:
+                carried_max[i] = previous_running_max[-1]
+                carried_argmax[i] = backpointers[i, start + tile.shape[1] - 1]
+        start += tile.shape[1]
+
+    return backtrack(backpointers, len_original_sentences)
+
+
+def next_dp_row(
+    similarity_row, previous_running_max, start=0, previous_start=0, carry=-1.0
+):
+    """Compute a DP row from its similarities and the previous row's running max.
+
+    previous_running_max[k] is the best score of the previous row up to and
+    including column previous_start + k. The row itself covers the columns
+    starting at start, and the best strictly earlier predecessor of column j
+    is therefore found at offset j - 1 - previous_start. Columns before
+    previous_start take carry, the best score of the previous row there.
+    """
+    offsets = np.arange(start, start + len(similarity_row)) - 1 - previous_start
+    best_predecessor = np.where(
+        offsets >= 0,
+        previous_running_max[np.clip(offsets, 0, len(previous_running_max) - 1)],
+        carry,
+    )
+    reachable = (similarity_row > 0) & (best_predecessor > 0)
+    return np.where(reachable, similarity_row + best_predecessor, -1.0)
+
+
+def running_max(row):
+    return np.maximum.accumulate(row)
+
+
+def prefix_argmax(row):
+    """Index of the first maximum of row[: j + 1] for every j, as int32."""
+    new_max = np.empty(len(row), dtype=bool)
+    new_max[0] = True
+    new_max[1:] = row[1:] > np.maximum.accumulate(row)[:-1]
+    positions = np.where(new_max, np.arange(len(row), dtype=np.int32), 0)
+    return np.maximum.accumulate(positions).astype(np.int32)
+
+
+def backtrack(backpointers, len_original_sentences, starts=None):
+    """Walk the backpointers from the last row to the first.
+
+    backpointers[i][k] holds the original sentence with the best score in
+    row i up to column starts[i] + k, where starts defaults to all zeros.
+    """
+    best_matching_indices = []
+    j = len_original_sentences
+    for i in range(len(backpointers) - 1, -1, -1):
+        start = 0 if starts is None else starts[i]
+        # The original sentence chosen for row i + 1 bounds the search for row
+        # i. When nothing of row i lies below that bound, step back by one.
+        if j > start:
+            k = min(j - start, len(backpointers[i])) - 1
+            idx = int(backpointers[i][k])
+        else:
+            idx = max(j - 1, 0)
+        best_matching_indices.append(idx)
+        j = idx
+    best_matching_indices.reverse()
+    return best_matching_indices
+
+
+def band_starts(len_summarized_sentences, len_original_sentences, band):
+    """First original sentence of each summary sentence's window.
+
+    Summary sentences follow the source in order, so summary sentence i is
+    expected around original sentence (i + 0.5) * N / M. The window of band
+    sentences is centred on that position and clamped to the transcript.
+    """
+    centers = (
+        (np.arange(len_summarized_sentences) + 0.5)
+        * len_original_sentences
+        / len_summarized_sentences
+    )
+    starts = np.round(centers - band / 2).astype(int)
+    return np.clip(starts, 0, len_original_sentences - band)
+
+
+def banded_best_matching_indices(summarized_embeddings, original_embeddings, band):
+    """Approximate best_matching_indices within a sliding window.
+
+    Only band original sentences around the expected position of each summary
+    sentence are scored, so time and memory grow with N * band instead of
+    N * M, and the full similarity matrix is never built. With band >= N the
+    result is the same as the exact DP.
+
+    :param summarized_embeddings: (M, dimension) array, normalized or not
+    :param original_embeddings: (N, dimension) array, normalized or not
+    :param band: Number of candidate original sentences per summary sentence.
+    :return: Same shape of result as best_matching_indices.
+    """
+    len_summarized_sentences = len(summarized_embeddings)
+    len_original_sentences = len(original_embeddings)
+    if len_summarized_sentences == 0 or len_original_sentences == 0:
+        return []
+
+    band = max(1, min(band, len_original_sentences))
+    summarized_embeddings = similarity.normalize_embeddings(summarized_embeddings)
+    original_embeddings = similarity.normalize_embeddings(original_embeddings)
+    rows = min(len_original_sentences, len_summarized_sentences)
+    starts = band_starts(len_summarized_sentences, len_original_sentences, band)[:rows]
+    backpointers = np.empty([rows, band], dtype=np.int32)
+    previous_running_max = None
+    for i in range(rows):
+        start = starts[i]
+        similarity_row = original_embeddings[start : start + band].astype(
+            np.float32
+        ) @ summarized_embeddings[i].astype(np.float32)
+        if i == 0:
+            dp_row = similarity_row
+        else:
+            dp_row = next_dp_row(
+                similarity_row, previous_running_max, start, starts[i - 1]
+            )
+        previous_running_max = running_max(dp_row)
+        backpointers[i] = prefix_argmax(dp_row) + start
+
+    return backtrack(backpointers, len_original_sentences, starts)
+
+
+def compare_alignments(
+    exact_indices, banded_indices, len_summarized_sentences, len_original_sentences
+):
+    """Describe how far a banded alignment is from the exact one.
+
+    :return: Dictionary with the number of summary sentences matched to a
+             different original sentence, the largest and mean index offset,
+             and the smallest band that would have contained the exact path.
+    """
+    exact = np.asarray(exact_indices)
+    banded = np.asarray(banded_indices)
+    if len(exact) == 0:
+        return {
+            "mismatches": 0,
+            "max_offset": 0,
+            "mean_offset": 0.0,
+            "required_band": 0,
+        }
+    offsets = np.abs(exact - banded)
+    centers = (
+        (np.arange(len(exact)) + 0.5)
+        * len_original_sentences
+        / len_summarized_sentences
+    )
+    return {
+        "mismatches": int(np.count_nonzero(offsets)),
+        "max_offset": int(offsets.max()),
+        "mean_offset": float(offsets.mean()),
+        "required_band": int(np.ceil(2 * np.abs(exact - centers).max())) + 1,
+    }
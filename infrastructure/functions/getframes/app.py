@@ -1,38 +1,88 @@
 import json
-import re
+import logging
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
 import time
 import numpy as np
 
-s3_client = boto3.client("s3")
+import alignment
+import clip_planner
+import embeddings
+import json_prefix
+import notify
+import polly_sync
+from embedding_cache import DynamoDBKeyIndex, EmbeddingCache, S3Store
+import similarity
+import srt
+import transcript_artifact
+
+logging.getLogger().setLevel(logging.INFO)
+
+embedding_concurrency = int(os.environ.get("embedding_concurrency", "10"))
+polly_concurrency = int(os.environ.get("polly_concurrency", "8"))
+
+s3_client = boto3.client(
+    "s3", config=Config(max_pool_connections=embedding_concurrency)
+)
 bedrock_client = boto3.client(
     service_name="bedrock-runtime",
     region_name=os.environ["bedrock_endpoint_region"],
+    config=Config(max_pool_connections=embedding_concurrency),
+)
+polly_client = boto3.client(
+    "polly", config=Config(max_pool_connections=polly_concurrency)
 )
-polly_client = boto3.client("polly")
 dynamodb_client = boto3.resource("dynamodb")
+stepfunctions_client = boto3.client("stepfunctions")
 comprehend_client = boto3.client("comprehend")
+embedding_cache = EmbeddingCache(
+    store=S3Store(
+        s3_client,
+        os.environ["bucket_transcripts"],
+        os.environ.get("embedding_cache_prefix", "embedding-cache/"),
+    ),
+    index=DynamoDBKeyIndex(dynamodb_client, os.environ["embedding_index_table"]),
+    max_entries=int(os.environ.get("embedding_cache_size", "20000")),
+    max_workers=embedding_concurrency,
+)
 
 
 def lambda_handler(event, context):
+    # The state machine runs the narration and the timecodes as two parallel
+    # branches. Without a branch both run in this invocation.
+    branch = event.get("Branch", "all")
+    if branch in ("timecodes", "all"):
+        generate_timecodes(event)
+    if branch in ("narration", "all"):
+        generate_narration(event)
+
+    return {"statusCode": 200}
+
+
+def generate_timecodes(event):
     bucket_audio = os.environ["bucket_audio"]
     bucket_transcripts = os.environ["bucket_transcripts"]
     taskId = event["VSHParams"]["taskId"]
-    voiceId = event["VSHParams"]["voiceId"]
+    # Drafts can use the local provider to skip Bedrock entirely.
+    embedding_provider = event["VSHParams"].get(
+        "embedding_provider", os.environ.get("embedding_provider", "bedrock")
+    )
+    # Resolved when the execution starts, from the request or the video.
+    frame_rate = float(
+        event["VSHParams"].get("frame_rate", os.environ.get("default_frame_rate", "24"))
+    )
 
-    subtitle = get_subtitle(bucket_transcripts, taskId + ".srt")
     polly_ssml = get_polly_ssml(
         bucket_audio, event["VSHParams"]["PollySSMLParams"]["outputUri"]
     )
-    intro_time = get_intro(bucket_transcripts, taskId + ".json")
-
-    original_sentences, startTimes, endTimes = srt_to_arrays(subtitle)
+    original_sentences, startTimes, endTimes, intro_time = get_original_sentences(
+        bucket_transcripts, taskId
+    )
     (summarized_sentences, durations, best_matching_indices, ignored_indices) = (
-        text_embedding(original_sentences, polly_ssml)
+        text_embedding(original_sentences, polly_ssml, embedding_provider)
     )
-    generate_polly_audio(bucket_audio, taskId, voiceId, intro_time, event["TaskToken"])
     get_frames(
         bucket_transcripts,
         original_sentences,
@@ -43,6 +93,7 @@ def lambda_handler(event, context):
         ignored_indices,
         intro_time,
         taskId,
+        frame_rate,
     )
     create_subtitle_summary(
         bucket_transcripts,
@@ -54,10 +105,25 @@ def lambda_handler(event, context):
         taskId,
     )
 
-    return {"statusCode": 200}
 
+def generate_narration(event):
+    bucket_audio = os.environ["bucket_audio"]
+    bucket_transcripts = os.environ["bucket_transcripts"]
+    taskId = event["VSHParams"]["taskId"]
+    voiceId = event["VSHParams"]["voiceId"]
 
-def text_embedding(original_sentences, polly_ssml):
+    intro_time = get_intro_time(bucket_transcripts, taskId)
+    if os.environ.get("polly_mode", "async") == "sync":
+        outputUri = generate_polly_audio_sync(bucket_audio, taskId, voiceId, intro_time)
+        stepfunctions_client.send_task_success(
+            taskToken=event["TaskToken"], output=json.dumps({"outputUri": outputUri})
+        )
+        notify.publish_task_event(event["VSHParams"]["userId"], taskId, "narration")
+        return
+    generate_polly_audio(bucket_audio, taskId, voiceId, intro_time, event["TaskToken"])
+
+
+def text_embedding(original_sentences, polly_ssml, embedding_provider="bedrock"):
     summarized_sentences = []
     durations = []
     polly_ssml = polly_ssml.split("\n")
@@ -71,63 +137,90 @@ def text_embedding(original_sentences, polly_ssml):
         summarized_sentences.append(curr["value"])
         durations.append(int(next["time"]) - int(curr["time"]))
 
-    model_id = os.environ["bedrock_embedding_model"]
-    accept = "application/json"
-    content_type = "application/json"
-    original_embeddings = []
-    for str in original_sentences:
-        body = json.dumps({"inputText": str})
-        response = bedrock_client.invoke_model(
-            body=body, modelId=model_id, accept=accept, contentType=content_type
-        )
-        response_body = json.loads(response["body"].read())
-        original_embeddings.append(response_body.get("embedding"))
-    original_embeddings = np.array(original_embeddings)
-
-    summarized_embeddings = []
-    for str in summarized_sentences:
-        body = json.dumps({"inputText": str})
-        response = bedrock_client.invoke_model(
-            body=body, modelId=model_id, accept=accept, contentType=content_type
-        )
-        response_body = json.loads(response["body"].read())
-        summarized_embeddings.append(response_body.get("embedding"))
-    summarized_embeddings = np.array(summarized_embeddings)
-
-    similarity_matrix = np_cosine_similarity(summarized_embeddings, original_embeddings)
-    best_matching_indices = []
-    len_summarized_sentences = len(summarized_sentences)
-    len_original_sentences = len(original_sentences)
+    all_embeddings = embed_sentences(
+        original_sentences + summarized_sentences, embedding_provider
+    )
+    original_embeddings = all_embeddings[: len(original_sentences)]
+    summarized_embeddings = all_embeddings[len(original_sentences) :]
 
     # Find the best matching sentences.
-    dp = np.zeros([len_summarized_sentences, len_original_sentences], dtype=float)
-    for i in range(0, len_summarized_sentences):
-        for j in range(0, len_original_sentences):
-            if i == 0:
-                dp[i][j] = similarity_matrix[i][j]
-            else:
-                max_score = -1
-                for k in range(0, j):
-                    if similarity_matrix[i][j] > 0 and dp[i - 1][k] > 0:
-                        max_score = max(
-                            max_score, similarity_matrix[i][j] + dp[i - 1][k]
-                        )
-                dp[i][j] = max_score
-
-    j = len_original_sentences
-
-    for i in range(min(len_original_sentences, len_summarized_sentences) - 1, -1, -1):
-        arr = dp[i][:j]
-        idx = np.argmax(arr)
-        best_matching_indices.append(idx)
-        j = idx
-    best_matching_indices.reverse()
+    storage_dtype = np.dtype(os.environ.get("embedding_storage_dtype", "float32"))
+    original_embeddings = similarity.normalize_embeddings(
+        original_embeddings, storage_dtype
+    )
+    summarized_embeddings = similarity.normalize_embeddings(
+        summarized_embeddings, storage_dtype
+    )
+    if os.environ.get("alignment_mode", "exact") == "banded":
+        band = int(os.environ.get("alignment_band", "200"))
+        best_matching_indices = alignment.banded_best_matching_indices(
+            summarized_embeddings, original_embeddings, band
+        )
+        if os.environ.get("alignment_report_deviation", "false") == "true":
+            deviation = alignment.compare_alignments(
+                exact_alignment(summarized_embeddings, original_embeddings),
+                best_matching_indices,
+                len(summarized_sentences),
+                len(original_sentences),
+            )
+            logging.info("Banded alignment deviation: " + json.dumps(deviation))
+    else:
+        best_matching_indices = exact_alignment(
+            summarized_embeddings, original_embeddings
+        )
 
     ignored_indices = set()
 
     return summarized_sentences, durations, best_matching_indices, ignored_indices
 
 
+def embed_sentences(texts, embedding_provider):
+    """Embed texts with the named provider from EMBEDDING_PROVIDERS.
+
+    Every provider takes a list of strings and returns one vector per string,
+    so the alignment does not depend on the provider in use.
+    """
+    if embedding_provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {embedding_provider}")
+    logging.info(f"Embedding {len(texts)} sentences with {embedding_provider}")
+    return EMBEDDING_PROVIDERS[embedding_provider](texts)
+
+
+def bedrock_embed(texts):
+    model_id = os.environ["bedrock_embedding_model"]
+    invoke = embeddings.bedrock_invoke(bedrock_client, model_id)
+    vectors = embedding_cache.get_or_embed(
+        texts,
+        model_id,
+        lambda texts: embeddings.embed_texts(
+            texts, invoke, max_workers=embedding_concurrency
+        ),
+    )
+    logging.info("Embedding cache: " + json.dumps(embedding_cache.stats()))
+    return vectors
+
+
+def local_embed(texts):
+    # The IDF is fitted on the batch, so these vectors are not cached.
+    return embeddings.hashed_ngram_embed(
+        texts, dimension=int(os.environ.get("local_embedding_dimension", "4096"))
+    )
+
+
+EMBEDDING_PROVIDERS = {"bedrock": bedrock_embed, "local": local_embed}
+
+
+def exact_alignment(summarized_embeddings, original_embeddings):
+    tile_size = int(os.environ.get("similarity_tile_size", "512"))
+    return alignment.best_matching_indices_from_tiles(
+        similarity.similarity_tiles(
+            summarized_embeddings, original_embeddings, tile_size
+        ),
+        len(summarized_embeddings),
+        len(original_embeddings),
+    )
+
+
 def get_frames(
     bucket_transcripts,
     original_sentences,
@@ -138,6 +231,7 @@ def get_frames(
     ignored_indices,
     intro_time,
     taskId,
+    frame_rate=24,
 ):
     timecodes = [[0, intro_time]]
     for i in range(min(len(original_sentences), len(summarized_sentences))):
@@ -153,12 +247,20 @@ def get_frames(
         timecodes.append([startTime, endTime])
     creditTime = endTime + 3500
     timecodes.append([endTime, creditTime])
+    # Contiguous clips are merged and the rest snapped to the frames of the
+    # source, so MediaConvert gets as few clippings as the summary allows.
+    clips = clip_planner.plan_clips(
+        timecodes,
+        frame_rate,
+        max_clips=int(os.environ.get("max_clippings", "150")),
+    )
+    logging.info(f"Planned {len(clips)} clips from {len(timecodes)} ranges")
     timecodes_text = ""
-    for timecode in timecodes:
+    for start_frame, end_frame in clips:
         timecodes_text += (
-            milliseconds_to_time(timecode[0])
+            clip_planner.frame_to_timecode(start_frame, frame_rate)
             + ","
-            + milliseconds_to_time(timecode[1])
+            + clip_planner.frame_to_timecode(end_frame, frame_rate)
             + "\n"
         )
     s3_client.put_object(
@@ -222,21 +324,64 @@ def get_timecodes(best_matching_indices, idx, endTimes, duration, timecodes):
     return startTime, endTime
 
 
-def get_subtitle(bucket_transcripts, subtitle_filename):
-    subtitle = (
-        s3_client.get_object(Bucket=bucket_transcripts, Key=subtitle_filename)["Body"]
-        .read()
-        .decode("utf-8-sig")
+def get_original_sentences(bucket_transcripts, taskId):
+    """Load the transcript sentences, their timings and the intro length.
+
+    The compact artifact written when Transcribe finished is preferred. Older
+    tasks without one fall back to the SRT and the Transcribe JSON.
+    """
+    try:
+        columns = transcript_artifact.read_columns(
+            transcript_artifact.s3_fetch(
+                s3_client,
+                bucket_transcripts,
+                transcript_artifact.artifact_key(taskId),
+            ),
+            ["sentence_text", "sentence_start_ms", "sentence_end_ms"],
+        )
+    except ClientError:
+        subtitle_lines = get_subtitle_lines(bucket_transcripts, taskId + ".srt")
+        original_sentences, startTimes, endTimes = srt.read_sentences(subtitle_lines)
+        intro_time = get_intro(bucket_transcripts, taskId + ".json")
+        return original_sentences, startTimes, endTimes, intro_time
+
+    startTimes = columns["sentence_start_ms"]
+    intro_time = float(startTimes[0]) if startTimes else 0.0
+    return (
+        columns["sentence_text"],
+        startTimes,
+        columns["sentence_end_ms"],
+        intro_time,
     )
-    return subtitle
+
+
+def get_intro_time(bucket_transcripts, taskId):
+    try:
+        startTimes = transcript_artifact.read_columns(
+            transcript_artifact.s3_fetch(
+                s3_client,
+                bucket_transcripts,
+                transcript_artifact.artifact_key(taskId),
+            ),
+            ["sentence_start_ms"],
+        )["sentence_start_ms"]
+    except ClientError:
+        return get_intro(bucket_transcripts, taskId + ".json")
+    return float(startTimes[0]) if startTimes else 0.0
+
+
+def get_subtitle_lines(bucket_transcripts, subtitle_filename):
+    body = s3_client.get_object(Bucket=bucket_transcripts, Key=subtitle_filename)[
+        "Body"
+    ]
+    return srt.iter_lines(body)
 
 
 def get_polly_ssml(bucket_audio, fullpath):
     fullpath = fullpath.replace("s3://", "").split("/")
     polly_ssml_filepath = "/".join(fullpath[1:])
-    polly_ssml_filename = os.path.basename(polly_ssml_filepath)
     polly_ssml = (
-        s3_client.get_object(Bucket=bucket_audio, Key=polly_ssml_filename)["Body"]
+        s3_client.get_object(Bucket=bucket_audio, Key=polly_ssml_filepath)["Body"]
         .read()
         .decode("utf-8-sig")
     )
@@ -244,15 +389,13 @@ def get_polly_ssml(bucket_audio, fullpath):
 
 
 def get_intro(bucket_transcripts, transcribe_json_filename):
-    data = (
-        s3_client.get_object(Bucket=bucket_transcripts, Key=transcribe_json_filename)[
-            "Body"
-        ]
-        .read()
-        .decode("utf-8-sig")
+    # Only the beginning of the Transcribe result is needed, so stop reading
+    # as soon as the first item has been parsed.
+    first_item, bytes_read = json_prefix.read_value(
+        json_prefix.s3_chunks(s3_client, bucket_transcripts, transcribe_json_filename),
+        ("results", "items", 0),
     )
-    data = json.loads(data)
-    first_item = data["results"]["items"][0]
+    logging.info(f"Read {bytes_read} bytes of {transcribe_json_filename} for the intro")
     start_time = float(first_item["start_time"]) * 1000  # ms
     return start_time
 
@@ -279,20 +422,91 @@ def generate_polly_audio(bucket_audio, taskId, voiceId, intro_time, taskToken):
     ssml += '<break time = "' + str(intro_time) + 'ms"/>'
     ssml += escaped_summarized_text
     ssml += "</speak>"
-    pollyAudioResponse = create_polly_audio_task(ssml, bucket_audio, voiceId)
-    add_polly_taskid(
-        taskId,
-        os.environ["vsh_dynamodb_table"],
-        pollyAudioResponse["SynthesisTask"]["TaskId"],
-        taskToken,
+    add_polly_task_token(taskId, os.environ["vsh_dynamodb_table"], taskToken)
+    pollyAudioResponse = create_polly_audio_task(ssml, bucket_audio, voiceId, taskId)
+
+
+def generate_polly_audio_sync(bucket_audio, taskId, voiceId, intro_time):
+    """Synthesize the narration MP3 without an asynchronous Polly task.
+
+    text2speech already stored the audio of the summary, so only the intro
+    silence is synthesized and joined in front of it. Without that audio the
+    sentence chunks of the summary are synthesized here as well.
+
+    :return: S3 URI of the narration, like the outputUri of a Polly task.
+    """
+    voice = {"Engine": "neural", "OutputFormat": "mp3", "VoiceId": voiceId}
+    requests = [dict(voice, Text=intro_ssml(intro_time), TextType="ssml")]
+    cache = get_tts_cache(bucket_audio)
+    summary_audio = get_summary_audio(bucket_audio, taskId)
+    if summary_audio is None:
+        summarized_text = (
+            s3_client.get_object(
+                Bucket=os.environ["bucket_transcripts"], Key=taskId + ".txt"
+            )["Body"]
+            .read()
+            .decode("utf-8-sig")
+        )
+        max_chars = int(os.environ.get("polly_chunk_chars", "2500"))
+        if cache is None:
+            chunks = polly_sync.split_text(summarized_text, max_chars)
+        else:
+            chunks = polly_sync.split_sentences(summarized_text, max_chars)
+        requests += [dict(voice, Text=chunk, TextType="text") for chunk in chunks]
+    audio = polly_sync.synthesize_all(
+        polly_sync.polly_synthesize(polly_client),
+        requests,
+        polly_concurrency,
+        cache,
+    )
+    if cache is not None:
+        logging.info("TTS cache: " + json.dumps(cache.stats()))
+    if summary_audio is not None:
+        audio.append(summary_audio)
+
+    key = taskId + ".mp3"
+    s3_client.put_object(
+        Body=polly_sync.concat_mp3(audio), Bucket=bucket_audio, Key=key
     )
+    return "s3://" + bucket_audio + "/" + key
 
 
-def create_polly_audio_task(text, bucket_audio, voiceId):
+def get_summary_audio(bucket_audio, taskId):
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_audio, Key=polly_sync.summary_audio_key(taskId)
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            logging.info(f"No summary audio of task {taskId}, synthesizing it")
+            return None
+        raise
+    return response["Body"].read()
+
+
+def intro_ssml(intro_time):
+    ssml = "<speak>"
+    while intro_time > 10000:  # maximum break time in Polly is 10s
+        ssml += '<break time = "10000ms"/>'
+        intro_time -= 10000
+    ssml += '<break time = "' + str(intro_time) + 'ms"/>'
+    return ssml + "</speak>"
+
+
+def get_tts_cache(bucket_audio):
+    if os.environ.get("tts_cache", "false") != "true":
+        return None
+    return polly_sync.TtsCache(
+        s3_client, bucket_audio, os.environ.get("tts_cache_prefix", "tts-cache/")
+    )
+
+
+def create_polly_audio_task(text, bucket_audio, voiceId, taskId):
     response = polly_client.start_speech_synthesis_task(
         Engine="neural",
         OutputFormat="mp3",
         OutputS3BucketName=bucket_audio,
+        OutputS3KeyPrefix=taskId + "/",
         Text=text,
         TextType="ssml",
         SnsTopicArn=os.environ["SNSTopic"],
@@ -302,13 +516,12 @@ def create_polly_audio_task(text, bucket_audio, voiceId):
     return response
 
 
-def add_polly_taskid(taskId, dynamodb_table, polly_task_id, sf_task_token):
+def add_polly_task_token(taskId, dynamodb_table, sf_task_token):
     table = dynamodb_client.Table(dynamodb_table)
-    ttl = str(int(time.time() + 3600))
     dynamodbResponse = table.update_item(
         Key={"TaskId": taskId},
-        UpdateExpression="SET PollyTaskId = :value1, LambdaPollyTaskToken = :value2",
-        ExpressionAttributeValues={":value1": polly_task_id, ":value2": sf_task_token},
+        UpdateExpression="SET LambdaPollyTaskToken = :value1",
+        ExpressionAttributeValues={":value1": sf_task_token},
     )
 
 
@@ -316,16 +529,6 @@ def remove_trademark(text, target):
     return text[: -len(target)] if text.endswith(target) else text
 
 
-def milliseconds_to_time(ms, frame_rate=24):
-    return "{:02d}:{:02d}:{:02d}:{:02d}".format(
-        int((ms // 3600000) % 24),  # hours
-        int((ms // 60000) % 60),  # minutes
-        int((ms // 1000) % 60),  # seconds
-        # fractions of a second (assuming 24 fps)
-        int((ms % 1000) * frame_rate / 1000),
-    )
-
-
 def milliseconds_to_subtitleTimeFormat(ms):
     return "{:02d}:{:02d}:{:02d},{:03d}".format(
         int((ms // 3600000) % 24),  # hours
@@ -333,59 +536,3 @@ def milliseconds_to_subtitleTimeFormat(ms):
         int((ms // 1000) % 60),  # seconds
         int(ms % 1000),  # milliseconds
     )
-
-
-def srt_to_arrays(s):
-    sentences = [line.strip() for line in re.findall(r"\d+\n.*?\n(.*?)\n", s)]
-
-    def get_time(s):
-        return re.findall(r"\d{2}:\d{2}:\d{2},\d{3}", s)
-
-    startTimes = get_time(s)[::2]
-    endTimes = get_time(s)[1::2]
-    startTimes_ms = [time_to_ms(time) for time in startTimes]
-    endTimes_ms = [time_to_ms(time) for time in endTimes]
-
-    filtered_sentences = []
-    filtered_startTimes_ms = []
-    filtered_endTimes_ms = []
-
-    startTime_ms = -1
-    endTime_ms = -1
-    sentence = ""
-    for i in range(len(sentences)):
-        if startTime_ms == -1:
-            startTime_ms = startTimes_ms[i]
-        sentence += " " + sentences[i]
-        if (
-            sentences[i].endswith(".")
-            or sentences[i].endswith("?")
-            or sentences[i].endswith("!")
-            or i == len(sentences) - 1
-        ):
-            endTime_ms = endTimes_ms[i]
-            filtered_sentences.append(sentence)
-            filtered_startTimes_ms.append(startTime_ms)
-            filtered_endTimes_ms.append(endTime_ms)
-            startTime_ms = -1
-            endTime_ms = -1
-            sentence = ""
-
-    return filtered_sentences, filtered_startTimes_ms, filtered_endTimes_ms
-
-
-def time_to_ms(time_str):
-    h, m, s, ms = re.split(":|,", time_str)
-    return int(h) * 3600000 + int(m) * 60000 + int(s) * 1000 + int(ms)
-
-
-def np_cosine_similarity(summarized_embeddings, original_embeddings):
-    dot_products = np.dot(summarized_embeddings, original_embeddings.T)
-    summarized_norms = np.linalg.norm(summarized_embeddings, axis=1)
-    original_norms = np.linalg.norm(original_embeddings, axis=1)
-
-    similarity_matrix = (
-        dot_products / summarized_norms[:, None] / original_norms[None, :]
-    )
-
-    return similarity_matrix
@@ -0,0 +1,92 @@
+# Above max_clips, neighbours at most this far apart are merged first. The
+# second one's footage then plays up to this much earlier than matched.
+MAX_FORWARD_MERGE_MS = 1000
+
+
+def plan_clips(
+    ranges,
+    frame_rate,
+    max_clips=None,
+    merge_gap_ms=None,
+    max_forward_merge_ms=MAX_FORWARD_MERGE_MS,
+):
+    """Turn the matched [start_ms, end_ms] ranges into frame-accurate clips.
+
+    The narration and the summary subtitles are timed on the output, which
+    is the clips played one after another. Merging two clips therefore keeps
+    their combined duration: the merged clip starts where the first one
+    starts and lasts as long as both, so nothing after it moves.
+
+    - Clips that touch, overlap or are at most merge_gap_ms apart (one frame
+      by default) are merged.
+    - While there are more than max_clips clips, the two neighbours with the
+      smallest forward gap of at most max_forward_merge_ms are merged.
+    - When no such neighbours are left, the shortest clip after the first is
+      dropped and its predecessor plays on for its duration instead.
+    - Clip ends are snapped from the running output time rather than from
+      each clip's own duration, so rounding to frames never adds up.
+
+    :param ranges: List of [start_ms, end_ms] in the source, in output order.
+    :param frame_rate: Frame rate of the source, e.g. 29.97.
+    :return: List of (start_frame, end_frame), end exclusive.
+    """
+    if merge_gap_ms is None:
+        merge_gap_ms = 1000 / frame_rate
+    clips = []
+    for start_ms, end_ms in ranges:
+        if end_ms <= start_ms:
+            continue
+        if clips:
+            last_start, last_duration = clips[-1]
+            gap_ms = start_ms - (last_start + last_duration)
+            if start_ms >= last_start and gap_ms <= merge_gap_ms:
+                clips[-1] = (last_start, last_duration + end_ms - start_ms)
+                continue
+        clips.append((start_ms, end_ms - start_ms))
+
+    while max_clips and len(clips) > max_clips:
+        forward = [
+            i
+            for i in range(len(clips) - 1)
+            if 0 <= gap(clips[i], clips[i + 1]) <= max_forward_merge_ms
+        ]
+        if forward:
+            i = min(forward, key=lambda i: gap(clips[i], clips[i + 1]))
+        else:
+            i = min(range(1, len(clips)), key=lambda i: clips[i][1]) - 1
+        clips[i : i + 2] = [(clips[i][0], clips[i][1] + clips[i + 1][1])]
+
+    frames = []
+    output_ms = 0
+    for start_ms, duration_ms in clips:
+        output_frames = ms_to_frame(output_ms + duration_ms, frame_rate) - (
+            ms_to_frame(output_ms, frame_rate)
+        )
+        output_ms += duration_ms
+        if output_frames <= 0:
+            continue
+        start_frame = ms_to_frame(start_ms, frame_rate)
+        frames.append((start_frame, start_frame + output_frames))
+    return frames
+
+
+def gap(clip, next_clip):
+    """Source time skipped between two clips, negative when it jumps back."""
+    return next_clip[0] - (clip[0] + clip[1])
+
+
+def ms_to_frame(ms, frame_rate):
+    return round(ms * frame_rate / 1000)
+
+
+def frame_to_timecode(frame, frame_rate):
+    """Non-drop-frame HH:MM:SS:FF of a frame number.
+
+    Timecodes count frames at the nominal rate, 30 for 29.97, so the frame
+    number rather than the wall-clock time decides the timecode.
+    """
+    nominal_rate = round(frame_rate)
+    seconds, frames = divmod(frame, nominal_rate)
+    return "{:02d}:{:02d}:{:02d}:{:02d}".format(
+        seconds // 3600, seconds // 60 % 60, seconds % 60, frames
+    )
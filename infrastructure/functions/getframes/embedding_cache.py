@@ -0,0 +1,265 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def cache_key(model_id, text):
+    return hashlib.sha256(
+        (model_id + "\0" + normalize_text(text)).encode("utf-8")
+    ).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier cache of sentence embeddings keyed by (model id, sentence hash).
+
+    The memory tier is an LRU that lives as long as the warm Lambda container.
+    The optional persistent tier writes the vectors a task embedded as one
+    pack: a single object of little-endian float32 rows. A key index maps
+    each key to its pack and row, so a lookup asks the index for the task's
+    keys and then reads only the rows it needs from the packs that hold
+    them. The I/O of a task follows the size of the task and not the size of
+    the cache. The store and the index make up the persistent tier together.
+    """
+
+    def __init__(self, store=None, index=None, max_entries=20000, max_workers=10):
+        self.store = store
+        self.index = index
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self.memory = OrderedDict()
+        self.last_stats = {
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "packs_read": 0,
+        }
+        self.lock = threading.Lock()
+
+    def get_or_embed(self, texts, model_id, embed):
+        """Return embeddings for texts, calling embed() only for cache misses.
+
+        :param texts: List of strings.
+        :param model_id: Embedding model the vectors belong to.
+        :param embed: Callable that embeds a list of strings into an array.
+        :return: float32 array with one embedding per text.
+        """
+        keys = [cache_key(model_id, text) for text in texts]
+        stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "packs_read": 0}
+        vectors = {}
+        for key in set(keys):
+            vector = self.memory_get(key)
+            if vector is not None:
+                vectors[key] = vector
+                stats["memory_hits"] += 1
+
+        missing = [key for key in set(keys) if key not in vectors]
+        if self.store is not None and missing:
+            found, stats["packs_read"] = self.read_packed(missing)
+            for key, vector in found.items():
+                vectors[key] = vector
+                self.memory_put(key, vector)
+            stats["persistent_hits"] = len(found)
+            missing = [key for key in missing if key not in vectors]
+
+        if missing:
+            texts_by_key = {}
+            for key, text in zip(keys, texts):
+                if key in vectors:
+                    continue
+                texts_by_key.setdefault(key, normalize_text(text))
+            new_keys = list(texts_by_key)
+            new_vectors = np.asarray(
+                embed([texts_by_key[key] for key in new_keys]), dtype=np.float32
+            )
+            stats["misses"] = len(new_keys)
+            for key, vector in zip(new_keys, new_vectors):
+                vectors[key] = vector
+                self.memory_put(key, vector)
+            if self.store is not None:
+                self.write_pack(new_keys, new_vectors)
+
+        self.last_stats = stats
+        return np.array([vectors[key] for key in keys], dtype=np.float32)
+
+    def stats(self):
+        """Hits and misses of the last get_or_embed call, i.e. of the task."""
+        return {**self.last_stats, "memory_entries": len(self.memory)}
+
+    def memory_get(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+            return vector
+
+    def memory_put(self, key, vector):
+        with self.lock:
+            self.memory[key] = vector
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def map(self, function, items):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(function, items))
+
+    def read_packed(self, keys):
+        """Read the vectors of keys from the packs the index points to.
+
+        :return: ({key: vector} of the keys found, number of packs read).
+        """
+        rows_by_pack = {}
+        for key, (pack, row, dimension) in self.index.get(keys).items():
+            rows_by_pack.setdefault((pack, dimension), []).append((row, key))
+        found = {}
+        for vectors in self.map(self.read_rows, rows_by_pack.items()):
+            found.update(vectors)
+        return found, len(rows_by_pack)
+
+    def read_rows(self, item):
+        (pack, dimension), rows = item
+        # One ranged read per pack, from its first to its last needed row.
+        row_bytes = dimension * 4
+        first = min(row for row, key in rows)
+        last = max(row for row, key in rows)
+        data = self.store.get(
+            pack_name(pack), first * row_bytes, (last + 1) * row_bytes - 1
+        )
+        if data is None:
+            # The pack expired before its index entries did.
+            return {}
+        matrix = np.frombuffer(data, dtype="<f4").reshape(-1, dimension)
+        return {key: matrix[row - first].copy() for row, key in rows}
+
+    def write_pack(self, keys, vectors):
+        # Named after its content, so writing the same pack again is harmless.
+        pack = hashlib.sha256("".join(keys).encode("ascii")).hexdigest()
+        self.store.put(pack_name(pack), vectors.astype("<f4").tobytes())
+        # The index is written last, so it never points to a missing pack.
+        self.index.put(
+            {key: (pack, row, vectors.shape[1]) for row, key in enumerate(keys)}
+        )
+
+
+def pack_name(pack):
+    return f"packs/{pack}.f32"
+
+
+class DynamoDBKeyIndex:
+    """Pack and row of every persisted embedding, in DynamoDB.
+
+    Items expire a day before the 30-day expiration rule of the packs, so the
+    index does not point to packs that are gone.
+    """
+
+    def __init__(self, dynamodb, table_name, ttl_seconds=29 * 24 * 3600):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, keys):
+        """Return {key: (pack, row, dimension)} of the keys in the index."""
+        entries = {}
+        now = int(time.time())
+        # BatchGetItem takes at most 100 keys per request.
+        for offset in range(0, len(keys), 100):
+            request = {
+                self.table_name: {
+                    "Keys": [
+                        {"EmbeddingKey": key} for key in keys[offset : offset + 100]
+                    ]
+                }
+            }
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response["Responses"].get(self.table_name, []):
+                    # TTL deletes expired items late, so they are skipped here.
+                    if int(item["ExpireTime"]) > now:
+                        entries[item["EmbeddingKey"]] = (
+                            item["Pack"],
+                            int(item["Row"]),
+                            int(item["Dimension"]),
+                        )
+                request = response.get("UnprocessedKeys")
+        return entries
+
+    def put(self, entries):
+        """Add {key: (pack, row, dimension)} to the index."""
+        expire_time = int(time.time()) + self.ttl_seconds
+        with self.dynamodb.Table(self.table_name).batch_writer() as batch:
+            for key, (pack, row, dimension) in entries.items():
+                batch.put_item(
+                    Item={
+                        "EmbeddingKey": key,
+                        "Pack": pack,
+                        "Row": row,
+                        "Dimension": dimension,
+                        "ExpireTime": expire_time,
+                    }
+                )
+
+
+class InMemoryKeyIndex:
+    """Same interface as DynamoDBKeyIndex, for local runs and tests."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, keys):
+        return {key: self.entries[key] for key in keys if key in self.entries}
+
+    def put(self, entries):
+        self.entries.update(entries)
+
+
+class S3Store:
+    def __init__(self, s3_client, bucket, prefix):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, name, first, last):
+        """Return bytes first to last (inclusive) of an object, or None."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket,
+                Key=self.prefix + name,
+                Range=f"bytes={first}-{last}",
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return response["Body"].read()
+
+    def put(self, name, data):
+        self.s3_client.put_object(Body=data, Bucket=self.bucket, Key=self.prefix + name)
+
+
+class DirectoryStore:
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, name, first, last):
+        try:
+            with open(os.path.join(self.path, name), "rb") as f:
+                f.seek(first)
+                return f.read(last + 1 - first)
+        except FileNotFoundError:
+            return None
+
+    def put(self, name, data):
+        filename = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, "wb") as f:
+            f.write(data)
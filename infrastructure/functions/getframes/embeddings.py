@@ -0,0 +1,118 @@
+import hashlib
+import json
+import random
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+def embed_texts(texts, invoke, max_workers=10, max_attempts=6, base_delay=0.2):
+    """Embed texts through a bounded thread pool, keeping the input order.
+
+    :param texts: List of strings to embed.
+    :param invoke: Transport that turns one string into an embedding vector,
+                   for example bedrock_invoke() or fake_invoke().
+    :param max_workers: Maximum number of requests in flight.
+    :param max_attempts: Attempts per text before a throttling error is raised.
+    :param base_delay: Base of the exponential backoff, in seconds.
+    :return: Array with one embedding per row.
+    """
+    if not texts:
+        return np.array([])
+
+    def embed(text):
+        return invoke_with_retry(invoke, text, max_attempts, base_delay)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(texts)))) as pool:
+        return np.array(list(pool.map(embed, texts)))
+
+
+def invoke_with_retry(invoke, text, max_attempts=6, base_delay=0.2, max_delay=10):
+    for attempt in range(max_attempts):
+        try:
+            return invoke(text)
+        except ClientError as e:
+            if (
+                e.response["Error"]["Code"] not in RETRYABLE_ERROR_CODES
+                or attempt == max_attempts - 1
+            ):
+                raise
+        # Full jitter keeps concurrent workers from retrying in lockstep.
+        time.sleep(random.uniform(0, min(max_delay, base_delay * 2**attempt)))
+
+
+def bedrock_invoke(bedrock_client, model_id):
+    def invoke(text):
+        response = bedrock_client.invoke_model(
+            body=json.dumps({"inputText": text}),
+            modelId=model_id,
+            accept="application/json",
+            contentType="application/json",
+        )
+        return json.loads(response["body"].read()).get("embedding")
+
+    return invoke
+
+
+def fake_invoke(dimension=1536, latency=0.05, throttle_rate=0.0):
+    """Offline transport for benchmarking embed_texts without Bedrock.
+
+    Every call sleeps for latency seconds and returns a vector derived from
+    the text, so equal texts get equal embeddings. A throttle_rate share of
+    calls fails with a ThrottlingException to exercise the retry path.
+    """
+
+    def invoke(text):
+        time.sleep(latency)
+        if random.random() < throttle_rate:
+            raise ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                "InvokeModel",
+            )
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        return np.random.default_rng(seed).standard_normal(dimension).tolist()
+
+    return invoke
+
+
+def hashed_ngram_embed(texts, dimension=4096, ngram_sizes=(3, 4, 5)):
+    """CPU-only TF-IDF embeddings over hashed character n-grams.
+
+    The n-grams of each lowercased text are hashed into dimension buckets
+    with CRC32, which is stable across processes unlike hash(). Term
+    frequencies are damped with 1 + log(count) and weighted by a smoothed
+    IDF fitted on texts itself, so all sentences that are compared with each
+    other should be embedded in the same call.
+
+    :param texts: List of strings to embed.
+    :param dimension: Number of hash buckets, i.e. the embedding size.
+    :param ngram_sizes: Lengths of the character n-grams.
+    :return: float32 array with one L2-normalized embedding per row.
+    """
+    counts = np.zeros([len(texts), dimension], dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = " " + " ".join(text.lower().split()) + " "
+        buckets = [
+            zlib.crc32(text[i : i + size].encode("utf-8")) % dimension
+            for size in ngram_sizes
+            for i in range(len(text) - size + 1)
+        ]
+        np.add.at(counts[row], buckets, 1)
+
+    present = counts > 0
+    document_frequency = np.count_nonzero(present, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+    weights = np.where(present, 1 + np.log(np.where(present, counts, 1)), 0)
+    weights = (weights * idf).astype(np.float32)
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return weights / np.where(norms == 0, 1, norms)
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def normalize_embeddings(embeddings, storage_dtype=np.float32):
+    """Scale embeddings to unit length once, so cosine similarity is a dot product.
+
+    :param embeddings: (sentences, dimension) array
+    :param storage_dtype: np.float32, or np.float16 to halve the memory held
+                          between tiles. Tiles are always computed in float32.
+    :return: Normalized copy of the embeddings in storage_dtype; the input is
+             left unchanged.
+    """
+    embeddings = np.array(embeddings, dtype=np.float32)
+    if embeddings.size == 0:
+        return embeddings.astype(storage_dtype)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings /= np.where(norms == 0, 1, norms)
+    return embeddings.astype(storage_dtype, copy=False)
+
+
+def similarity_tiles(summarized_normalized, original_normalized, tile_size=512):
+    """Yield the cosine similarity matrix one tile of original sentences at a time.
+
+    :param summarized_normalized: Output of normalize_embeddings for the summary.
+    :param original_normalized: Output of normalize_embeddings for the transcript.
+    :param tile_size: Number of original sentences per tile.
+    :return: Generator of float32 (summary sentences, tile) arrays, left to right.
+    """
+    summarized = summarized_normalized.astype(np.float32, copy=False)
+    for start in range(0, len(original_normalized), tile_size):
+        tile = original_normalized[start : start + tile_size]
+        yield summarized @ tile.astype(np.float32, copy=False).T
@@ -1,3 +1,5 @@
+import base64
+import binascii
 import json
 import boto3
 from botocore.exceptions import ClientError
@@ -8,41 +10,123 @@ import logging
 dynamodb_client = boto3.resource("dynamodb")
 s3_client = boto3.client("s3")
 
+# Only the attributes of the listing are read, never the task tokens.
+TASK_ATTRIBUTES = [
+    "TaskId",
+    "UserId",
+    "Input",
+    "PollyVoice",
+    "Status",
+    "Started",
+    "EndTime",
+    "Output",
+    "TaskType",
+]
+
 
 def lambda_handler(event, context):
-    bucket_input_video = os.environ["bucket_input_video"]
-    bucket_output_video = os.environ["bucket_output_video"]
     dynamodb_table = os.environ["vsh_dynamodb_table"]
-    userId = event["queryStringParameters"]["userId"]
+    params = event["queryStringParameters"]
+    userId = params["userId"]
+    # "page" signs the URLs of the returned tasks, "none" leaves them empty
+    # for the client to fetch on demand with taskId.
+    with_urls = params.get("urls", "page") != "none"
 
     table = dynamodb_client.Table(dynamodb_table)
-    response = table.query(
-        IndexName="UserIdGSI", KeyConditionExpression=Key("UserId").eq(userId)
-    )
-    items = response["Items"]
-    response = []
-    for item in items:
-        inputUrl = create_presigned_url(bucket_input_video, item["Input"])
-        if item["Status"] == "Complete":
-            outputUrl = create_presigned_url(bucket_output_video, item["Output"])
-        else:
-            outputUrl = ""
-        response.append(
+    if "taskId" in params:
+        item = table.get_item(
+            Key={"TaskId": params["taskId"]}, **projection(TASK_ATTRIBUTES)
+        ).get("Item")
+        if item is None or item["UserId"] != userId:
+            return {"statusCode": 404, "body": json.dumps({"message": "Not found"})}
+        return {"statusCode": 200, "body": json.dumps(task_response(item, True))}
+
+    max_limit = int(os.environ.get("max_page_size", "100"))
+    try:
+        limit = int(params.get("limit", os.environ.get("default_page_size", "50")))
+        start_key = decode_cursor(params.get("cursor"), userId)
+    except ValueError as e:
+        return {"statusCode": 400, "body": json.dumps({"message": str(e)})}
+    query_args = {
+        "IndexName": "UserIdStartedGSI",
+        "KeyConditionExpression": Key("UserId").eq(userId),
+        # Newest tasks first.
+        "ScanIndexForward": False,
+        "Limit": max(1, min(limit, max_limit)),
+        **projection(TASK_ATTRIBUTES),
+    }
+    if start_key is not None:
+        query_args["ExclusiveStartKey"] = start_key
+    response = table.query(**query_args)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
             {
-                "taskId": item["TaskId"],
-                "inputFilename": item["Input"],
-                "inputUrl": inputUrl,
-                "pollyVoice": item["PollyVoice"],
-                "status": item["Status"],
-                "started": item["Started"],
-                "endTime": item["EndTime"],
-                "outputFilename": item["Output"],
-                "outputUrl": outputUrl,
-                "taskType": item["TaskType"],
+                "tasks": [task_response(item, with_urls) for item in response["Items"]],
+                "nextCursor": encode_cursor(response.get("LastEvaluatedKey")),
             }
-        )
+        ),
+    }
+
+
+def projection(attributes):
+    names = {f"#a{i}": attribute for i, attribute in enumerate(attributes)}
+    return {
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
 
-    return {"statusCode": 200, "body": json.dumps(response)}
+
+def task_response(item, with_urls):
+    inputUrl = ""
+    outputUrl = ""
+    if with_urls:
+        inputUrl = create_presigned_url(os.environ["bucket_input_video"], item["Input"])
+        if item["Status"] == "Complete":
+            outputUrl = create_presigned_url(
+                os.environ["bucket_output_video"], item["Output"]
+            )
+    return {
+        "taskId": item["TaskId"],
+        "inputFilename": item["Input"],
+        "inputUrl": inputUrl,
+        "pollyVoice": item["PollyVoice"],
+        "status": item["Status"],
+        "started": item["Started"],
+        "endTime": item["EndTime"],
+        "outputFilename": item["Output"],
+        "outputUrl": outputUrl,
+        "taskType": item["TaskType"],
+    }
+
+
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(
+        json.dumps(last_evaluated_key, separators=(",", ":")).encode("utf-8")
+    ).decode("ascii")
+
+
+def decode_cursor(cursor, userId):
+    """Return the ExclusiveStartKey of a cursor, or None for the first page.
+
+    :raises ValueError: When the cursor is malformed or of another user.
+    """
+    if not cursor:
+        return None
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if (
+        not isinstance(start_key, dict)
+        or set(start_key) != {"TaskId", "UserId", "Started"}
+        or start_key["UserId"] != userId
+    ):
+        raise ValueError("Invalid cursor")
+    return start_key
 
 
 def create_presigned_url(bucket_name, object_name, expiration=3600):
@@ -1,7 +1,12 @@
 import boto3
+import logging
 from botocore.exceptions import ClientError
 import os
 
+import job_settings
+
+logging.getLogger().setLevel(logging.INFO)
+
 s3_client = boto3.client("s3")
 dynamodb_client = boto3.resource("dynamodb")
 
@@ -34,83 +39,59 @@ def lambda_handler(event, context):
     ]
     timecodes = to_json(timecodes)
 
-    mediaconvertTaskId = create_mediaconvert_task(
-        endpoint_url,
-        taskId,
-        media_convert_queue,
-        iam_role,
-        video_file,
-        audio_file,
-        timecodes,
-        output_file,
+    # "single" cuts the clips, adds the narration and burns in the captions
+    # in one job. "two_pass" only cuts the clips here and leaves the rest to
+    # addaudio. The mode of the job is passed on in its user metadata, so the
+    # state machine knows whether addaudio has to run.
+    render_mode = event["VSHParams"].get(
+        "render_mode", os.environ.get("render_mode", "two_pass")
     )
+    if render_mode == "single" and len(timecodes) <= job_settings.MAX_INPUTS:
+        subtitle_file = "s3://" + bucket_transcripts + "/" + taskId + "-summary.srt"
+        settings = job_settings.single_job_settings(
+            video_file,
+            audio_file,
+            subtitle_file,
+            timecodes,
+            output_file,
+            float(event["VSHParams"].get("frame_rate", 24)),
+        )
+    else:
+        render_mode = "two_pass"
+        settings = job_settings.clip_settings(video_file, timecodes, output_file)
+    logging.info(f"Rendering {len(timecodes)} clips in {render_mode} mode")
 
+    # The job carries the task ID in its user metadata, so the callback reads
+    # the token from the task item. The token is stored before the job can
+    # finish.
     updateTaskStatus(
         os.environ["vsh_dynamodb_table"],
         userId,
         taskId,
-        mediaconvertTaskId,
         video_name,
         event["TaskToken"],
     )
+    mediaconvertTaskId = create_mediaconvert_task(
+        endpoint_url,
+        media_convert_queue,
+        iam_role,
+        settings,
+        {"TaskId": taskId, "RenderMode": render_mode},
+    )
+    logging.info(f"Started MediaConvert job {mediaconvertTaskId}")
 
     return {"statusCode": 200}
 
 
 def create_mediaconvert_task(
-    endpoint_url,
-    taskId,
-    media_convert_queue,
-    iam_role,
-    video_file,
-    audio_file,
-    timecodes,
-    output_file,
+    endpoint_url, media_convert_queue, iam_role, settings, user_metadata
 ):
     media_convert = boto3.client("mediaconvert", endpoint_url=endpoint_url)
     response = media_convert.create_job(
         Queue=media_convert_queue,
-        UserMetadata={},
+        UserMetadata=user_metadata,
         Role=iam_role,
-        Settings={
-            "TimecodeConfig": {"Source": "ZEROBASED"},
-            "OutputGroups": [
-                {
-                    "Name": "File Group",
-                    "Outputs": [
-                        {
-                            "ContainerSettings": {
-                                "Container": "MP4",
-                                "Mp4Settings": {},
-                            },
-                            "VideoDescription": {
-                                "CodecSettings": {
-                                    "Codec": "H_264",
-                                    "H264Settings": {
-                                        "MaxBitrate": 40000000,
-                                        "RateControlMode": "QVBR",
-                                        "SceneChangeDetect": "TRANSITION_DETECTION",
-                                    },
-                                }
-                            },
-                            "NameModifier": "_raw",
-                        }
-                    ],
-                    "OutputGroupSettings": {
-                        "Type": "FILE_GROUP_SETTINGS",
-                        "FileGroupSettings": {"Destination": output_file},
-                    },
-                }
-            ],
-            "Inputs": [
-                {
-                    "VideoSelector": {},
-                    "TimecodeSource": "ZEROBASED",
-                    "FileInput": video_file,
-                    "InputClippings": timecodes,
-                }
-            ],
-        },
+        Settings=settings,
         AccelerationSettings={"Mode": "DISABLED"},
         StatusUpdateInterval="SECONDS_60",
         Priority=0,
@@ -118,9 +99,7 @@ def create_mediaconvert_task(
     return response["Job"]["Id"]
 
 
-def updateTaskStatus(
-    dynamodb_table, userId, taskId, mediaconvertTaskId, video_name, sfToken
-):
+def updateTaskStatus(dynamodb_table, userId, taskId, video_name, sfToken):
     output_filename = (
         userId
         + "/"
@@ -133,15 +112,13 @@ def updateTaskStatus(
     table = dynamodb_client.Table(dynamodb_table)
     dynamodbResponse = table.update_item(
         Key={"TaskId": taskId},
-        UpdateExpression="SET #att1 = :value1, #att2 = :value2, #att3 = :value3",
+        UpdateExpression="SET #att1 = :value1, #att2 = :value2",
         ExpressionAttributeValues={
-            ":value1": mediaconvertTaskId,
-            ":value2": output_filename,
-            ":value3": sfToken,
+            ":value1": output_filename,
+            ":value2": sfToken,
         },
         ExpressionAttributeNames={
-            "#att1": "MediaConvertTaskId",
-            "#att2": "Output",
-            "#att3": "LambdaMediaConvertTaskToken",
+            "#att1": "Output",
+            "#att2": "LambdaMediaConvertTaskToken",
         },
     )
@@ -0,0 +1,161 @@
+# MediaConvert accepts at most this many inputs in one job.
+MAX_INPUTS = 150
+
+VIDEO_DESCRIPTION = {
+    "CodecSettings": {
+        "Codec": "H_264",
+        "H264Settings": {
+            "MaxBitrate": 40000000,
+            "RateControlMode": "QVBR",
+            "SceneChangeDetect": "TRANSITION_DETECTION",
+        },
+    }
+}
+AUDIO_CODEC_SETTINGS = {
+    "Codec": "AAC",
+    "AacSettings": {
+        "Bitrate": 96000,
+        "CodingMode": "CODING_MODE_2_0",
+        "SampleRate": 48000,
+    },
+}
+BURN_IN_SETTINGS = {
+    "DestinationType": "BURN_IN",
+    "BurninDestinationSettings": {
+        "BackgroundOpacity": 100,
+        "FontSize": 18,
+        "FontColor": "WHITE",
+        "ApplyFontColor": "ALL_TEXT",
+        "BackgroundColor": "BLACK",
+    },
+}
+
+
+def clip_settings(video_file, timecodes, output_file):
+    """Settings of the first pass, which only cuts the clips into _raw.mp4."""
+    return {
+        "TimecodeConfig": {"Source": "ZEROBASED"},
+        "OutputGroups": [
+            {
+                "Name": "File Group",
+                "Outputs": [
+                    {
+                        "ContainerSettings": {
+                            "Container": "MP4",
+                            "Mp4Settings": {},
+                        },
+                        "VideoDescription": VIDEO_DESCRIPTION,
+                        "NameModifier": "_raw",
+                    }
+                ],
+                "OutputGroupSettings": {
+                    "Type": "FILE_GROUP_SETTINGS",
+                    "FileGroupSettings": {"Destination": output_file},
+                },
+            }
+        ],
+        "Inputs": [
+            {
+                "VideoSelector": {},
+                "TimecodeSource": "ZEROBASED",
+                "FileInput": video_file,
+                "InputClippings": timecodes,
+            }
+        ],
+    }
+
+
+def single_job_settings(
+    video_file, audio_file, subtitle_file, timecodes, output_file, frame_rate=24
+):
+    """Settings that cut the clips, add the narration and burn in captions.
+
+    Every clip is its own input, so the narration and the summary subtitles,
+    which are both timed on the output, can be shifted per clip. A clip that
+    starts at source time s and at output time p gets an audio offset and a
+    caption time delta of s - p, so narration time p plays at video time s.
+
+    :param timecodes: List of {"StartTimecode", "EndTimecode"} in HH:MM:SS:FF.
+    :param frame_rate: Frame rate the timecodes were written with.
+    :return: Settings for create_job, producing <output_file>.mp4.
+    """
+    inputs = []
+    output_ms = 0
+    for clip in timecodes:
+        start_ms = timecode_to_ms(clip["StartTimecode"], frame_rate)
+        end_ms = timecode_to_ms(clip["EndTimecode"], frame_rate)
+        delta_ms = start_ms - output_ms
+        inputs.append(
+            {
+                "FileInput": video_file,
+                "VideoSelector": {},
+                "TimecodeSource": "ZEROBASED",
+                "InputClippings": [clip],
+                "AudioSelectors": {
+                    "Audio Selector 1": {
+                        "DefaultSelection": "DEFAULT",
+                        "ExternalAudioFileInput": audio_file,
+                        "Offset": delta_ms,
+                    }
+                },
+                "CaptionSelectors": {
+                    "Captions Selector 1": {
+                        "SourceSettings": {
+                            "SourceType": "SRT",
+                            "FileSourceSettings": {
+                                "SourceFile": subtitle_file,
+                                "TimeDelta": delta_ms,
+                                "TimeDeltaUnits": "MILLISECONDS",
+                            },
+                        }
+                    }
+                },
+            }
+        )
+        output_ms += end_ms - start_ms
+
+    return {
+        "TimecodeConfig": {"Source": "ZEROBASED"},
+        "OutputGroups": [
+            {
+                "Name": "File Group",
+                "Outputs": [
+                    {
+                        "ContainerSettings": {
+                            "Container": "MP4",
+                            "Mp4Settings": {},
+                        },
+                        "VideoDescription": VIDEO_DESCRIPTION,
+                        "AudioDescriptions": [
+                            {
+                                "AudioSourceName": "Audio Selector 1",
+                                "CodecSettings": AUDIO_CODEC_SETTINGS,
+                            }
+                        ],
+                        "CaptionDescriptions": [
+                            {
+                                "CaptionSelectorName": "Captions Selector 1",
+                                "DestinationSettings": BURN_IN_SETTINGS,
+                            }
+                        ],
+                    }
+                ],
+                "OutputGroupSettings": {
+                    "Type": "FILE_GROUP_SETTINGS",
+                    "FileGroupSettings": {"Destination": output_file},
+                },
+            }
+        ],
+        "Inputs": inputs,
+    }
+
+
+def timecode_to_ms(timecode, frame_rate=24):
+    """Source time of a non-drop-frame timecode.
+
+    Timecodes count frames at the nominal rate, 30 for 29.97, so the frame
+    number is found first and then timed at the real rate.
+    """
+    hours, minutes, seconds, frames = (int(part) for part in timecode.split(":"))
+    frame = (hours * 3600 + minutes * 60 + seconds) * round(frame_rate) + frames
+    return round(frame * 1000 / frame_rate)
@@ -1,9 +1,10 @@
 import json
 import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
 import os
 
+import notify
+
 dynamodb_client = boto3.resource("dynamodb")
 
 
@@ -14,11 +15,9 @@ def lambda_handler(event, context):
 
     message = json.loads(event["Records"][0]["Sns"]["Message"])
 
-    pollyTaskId = message["taskId"]
-    response = table.query(
-        IndexName="PollyGSI", KeyConditionExpression=Key("PollyTaskId").eq(pollyTaskId)
-    )
-    item = response["Items"][0]
+    # Synthesis tasks write to <taskId>/<Polly task id>.<format>.
+    taskId = message["outputUri"].replace("s3://", "").split("/")[1]
+    item = table.get_item(Key={"TaskId": taskId}, ConsistentRead=True)["Item"]
     sfTaskToken = item["LambdaPollyTaskToken"]
 
     # sendTaskSuccess to Step Function to notify Polly has successfully generated the audio
@@ -27,4 +26,8 @@ def lambda_handler(event, context):
         taskToken=sfTaskToken, output=event["Records"][0]["Sns"]["Message"]
     )
 
+    # Speech marks are written as .marks, the narration as .mp3.
+    stage = "speech_marks" if message["outputUri"].endswith(".marks") else "narration"
+    notify.publish_task_event(item["UserId"], taskId, stage)
+
     return {"statusCode": 200}
@@ -1,3 +1,4 @@
+import base64
 import json
 import logging
 import boto3
@@ -5,64 +6,231 @@ from botocore.exceptions import ClientError
 import os
 import datetime
 import time
+import uuid
+
+# Values getframes knows, checked here so a typo fails the request rather
+# than the task.
+EMBEDDING_PROVIDERS = ("bedrock", "local")
+RENDER_MODES = ("two_pass", "single")
+MAX_FRAME_RATE = 240
 
 sqs_client = boto3.client("sqs")
 dynamodb_client = boto3.resource("dynamodb")
 
 
 def lambda_handler(event, context):
-    bucket_video = os.environ["bucket_videos"]
-    userId = event["queryStringParameters"]["userId"]
-    video_name = event["queryStringParameters"]["video_name"]
-    language = event["queryStringParameters"]["language"]
-    voiceId = event["queryStringParameters"]["voiceId"]
-    gender = event["queryStringParameters"]["gender"]
+    if event.get("routeKey") == "POST /stepfunction/bulk":
+        return submit_bulk(event)
 
-    input = {
-        "userId": userId,
-        "video_name": video_name,
-        "voiceId": voiceId,
-        "gender": gender,
-    }
+    bucket_video = os.environ["bucket_videos"]
+    try:
+        input = task_input(event["queryStringParameters"])
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return bad_request(f"Invalid submission: {e!r}")
     sqs_queue_url = os.environ["sqs_queue_url"]
-    response = sqs_client.send_message(
-        QueueUrl=sqs_queue_url, MessageBody=json.dumps(input)
-    )
-
-    taskId = response["MessageId"]
 
+    # The item is written before the message is sent, so the intake, which
+    # updates the item, never runs before it exists.
+    taskId = input["taskId"]
     table = dynamodb_client.Table(os.environ["vsh_dynamodb_table"])
     started = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     ttl = int(time.time() + int(os.environ["task_expire_time"]))
-    dynamodbResponse = table.put_item(
-        Item={
-            "TaskId": taskId,
-            "UserId": userId,
-            "Input": video_name,
-            "PollyVoice": voiceId,
-            "PollyAudioTaskId": "-",
-            "LambdaTaskToken": "-",
-            "MediaConvertTaskId": "-",
-            "Started": started,
-            "EndTime": "-",
-            "Status": "Running",
-            "Output": "-",
-            "TaskType": "-",
-            "ExpireTime": ttl,
-        }
-    )
+    dynamodbResponse = table.put_item(Item=task_item(taskId, input, started, ttl))
+    try:
+        sqs_client.send_message(QueueUrl=sqs_queue_url, MessageBody=json.dumps(input))
+    except ClientError:
+        table.delete_item(Key={"TaskId": taskId})
+        raise
 
     response = {
         "taskId": taskId,
-        "inputFilename": video_name,
-        "inputUrl": create_presigned_url(bucket_video, video_name),
-        "pollyVoice": voiceId,
+        "inputFilename": input["video_name"],
+        "inputUrl": create_presigned_url(bucket_video, input["video_name"]),
+        "pollyVoice": input["voiceId"],
         "started": started,
     }
 
     return {"statusCode": 200, "body": json.dumps(response)}
 
 
+def task_input(params):
+    """Build the message of one task from its request parameters.
+
+    :raises ValueError: When an optional parameter has an unknown value.
+    """
+    input = {
+        "taskId": str(uuid.uuid4()),
+        "userId": params["userId"],
+        "video_name": params["video_name"],
+        "voiceId": params["voiceId"],
+        "gender": params["gender"],
+    }
+    # Optional, e.g. "local" for a quick draft without Bedrock embeddings.
+    embedding_provider = params.get("embedding_provider")
+    if embedding_provider:
+        if embedding_provider not in EMBEDDING_PROVIDERS:
+            raise ValueError(f"Unknown embedding_provider: {embedding_provider}")
+        input["embedding_provider"] = embedding_provider
+    # Optional, "single" renders the video in one MediaConvert job.
+    render_mode = params.get("render_mode")
+    if render_mode:
+        if render_mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render_mode: {render_mode}")
+        input["render_mode"] = render_mode
+    # Optional, read from the video when missing.
+    frame_rate = params.get("frame_rate")
+    if frame_rate:
+        try:
+            frame_rate = float(frame_rate)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid frame_rate: {frame_rate!r}")
+        # Also rejects nan and inf, which compare false.
+        if not 0 < frame_rate <= MAX_FRAME_RATE:
+            raise ValueError(f"frame_rate out of range: {frame_rate}")
+        input["frame_rate"] = frame_rate
+    return input
+
+
+def task_item(taskId, input, started, ttl):
+    return {
+        "TaskId": taskId,
+        "UserId": input["userId"],
+        "Input": input["video_name"],
+        "PollyVoice": input["voiceId"],
+        "PollyAudioTaskId": "-",
+        "LambdaTaskToken": "-",
+        "Started": started,
+        "EndTime": "-",
+        "Status": "Running",
+        "Output": "-",
+        "TaskType": "-",
+        "ExpireTime": ttl,
+    }
+
+
+def submit_bulk(event):
+    """Submit a JSON list of tasks, each with the parameters of a single one.
+
+    Task items are written 25 and messages sent 10 per request, the limits
+    of batch_write_item and send_message_batch. Every item is written before
+    any message is sent, since the intake updates the item of its task.
+    Submissions that SQS still rejects after the retries are returned under
+    "failed" with their index, and their items are deleted again.
+    """
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    try:
+        submissions = json.loads(body)
+        if not isinstance(submissions, list):
+            raise ValueError("the body must be a JSON list")
+        inputs = [task_input(submission) for submission in submissions]
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return bad_request(f"Invalid submissions: {e!r}")
+    max_submissions = int(os.environ.get("bulk_max_submissions", "500"))
+    if not 0 < len(inputs) <= max_submissions:
+        return bad_request(f"Submit between 1 and {max_submissions} videos")
+
+    started = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ttl = int(time.time() + int(os.environ["task_expire_time"]))
+    try:
+        write_items(
+            [
+                {
+                    "PutRequest": {
+                        "Item": task_item(input["taskId"], input, started, ttl)
+                    }
+                }
+                for input in inputs
+            ]
+        )
+    except (ClientError, RuntimeError):
+        # Nothing was queued yet, so no task is left without its item.
+        delete_items([input["taskId"] for input in inputs])
+        raise
+
+    sent, failed = send_messages(inputs)
+    delete_items([inputs[entry["index"]]["taskId"] for entry in failed])
+
+    response = {
+        "tasks": [
+            {
+                "taskId": inputs[index]["taskId"],
+                "inputFilename": inputs[index]["video_name"],
+                "pollyVoice": inputs[index]["voiceId"],
+                "started": started,
+            }
+            for index in sorted(sent)
+        ],
+        "failed": failed,
+    }
+    return {"statusCode": 200, "body": json.dumps(response)}
+
+
+def bad_request(message):
+    return {"statusCode": 400, "body": json.dumps({"message": message})}
+
+
+def send_messages(inputs, max_attempts=4):
+    """Send one message per input with send_message_batch.
+
+    Entries that failed through no fault of the sender are sent again with
+    exponential backoff.
+
+    :return: List of the indexes of the sent inputs, and list of
+             {"index", "error"} of the others.
+    """
+    sqs_queue_url = os.environ["sqs_queue_url"]
+    sent = []
+    failed = []
+    pending = list(range(len(inputs)))
+    for attempt in range(max_attempts):
+        if attempt:
+            time.sleep(0.1 * 2**attempt)
+        retry = []
+        for start in range(0, len(pending), 10):
+            response = sqs_client.send_message_batch(
+                QueueUrl=sqs_queue_url,
+                Entries=[
+                    {"Id": str(index), "MessageBody": json.dumps(inputs[index])}
+                    for index in pending[start : start + 10]
+                ],
+            )
+            for entry in response.get("Successful", []):
+                sent.append(int(entry["Id"]))
+            for entry in response.get("Failed", []):
+                if entry["SenderFault"] or attempt + 1 == max_attempts:
+                    failed.append({"index": int(entry["Id"]), "error": entry["Code"]})
+                else:
+                    retry.append(int(entry["Id"]))
+        pending = retry
+        if not pending:
+            break
+    return sent, failed
+
+
+def delete_items(taskIds):
+    write_items([{"DeleteRequest": {"Key": {"TaskId": taskId}}} for taskId in taskIds])
+
+
+def write_items(requests, max_attempts=8):
+    """Run Put/DeleteRequests with batch_write_item, retrying unprocessed ones."""
+    table_name = os.environ["vsh_dynamodb_table"]
+    for start in range(0, len(requests), 25):
+        request_items = {table_name: requests[start : start + 25]}
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(0.05 * 2**attempt)
+            response = dynamodb_client.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems")
+            if not request_items:
+                break
+        else:
+            raise RuntimeError(
+                f"{len(request_items[table_name])} task writes were not processed"
+            )
+
+
 def create_presigned_url(bucket_name, object_name, expiration=3600):
     """Generate a presigned URL to share an S3 object
 
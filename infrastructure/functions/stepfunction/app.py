@@ -1,33 +1,157 @@
 import json
+import logging
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import os
+import struct
+
+import media_info
+
+logging.getLogger().setLevel(logging.INFO)
+
+intake_concurrency = int(os.environ.get("intake_concurrency", "10"))
+s3_client = boto3.client("s3", config=Config(max_pool_connections=intake_concurrency))
+stepfunctions_client = boto3.client(
+    "stepfunctions", config=Config(max_pool_connections=intake_concurrency)
+)
+dynamodb_client = boto3.resource(
+    "dynamodb", config=Config(max_pool_connections=intake_concurrency)
+)
 
 
 def lambda_handler(event, context):
+    # Every record of the batch is started concurrently. Only the records that
+    # failed are reported, so SQS retries them and deletes the others.
     records = event["Records"]
-    message = records[0]["body"]
-
-    # Deserialize the message body from the string representation
-    message_body = json.loads(message)
-
-    # Access the values in the JSON payload
-    taskId = records[0]["messageId"]
-    userId = message_body["userId"]
-    video_name = message_body["video_name"]
-    voiceId = message_body["voiceId"]
-    gender = message_body["gender"]
-
-    input = {
-        "userId": userId,
-        "taskId": taskId,
-        "video_name": video_name,
-        "voiceId": voiceId,
-        "gender": gender,
-    }
-    stepfunctions = boto3.client("stepfunctions")
-    sfResponse = stepfunctions.start_execution(
-        stateMachineArn=os.environ["StepFunction"], input=json.dumps(input)
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(intake_concurrency, len(records)))
+    ) as pool:
+        errors = list(pool.map(start_task, records))
+
+    failures = []
+    for record, error in zip(records, errors):
+        if error is not None:
+            logging.error(f"Could not start task {record['messageId']}: {error!r}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    return {"batchItemFailures": failures}
+
+
+def start_task(record):
+    """Start the execution of one SQS record, returning the error if any."""
+    try:
+        # Deserialize the message body from the string representation
+        message_body = json.loads(record["body"])
+
+        # Access the values in the JSON payload. The task ID is chosen when
+        # the task item is written, messages sent before that used their ID.
+        taskId = message_body.get("taskId", record["messageId"])
+        if not claim_task(taskId):
+            logging.info(f"Task {taskId} was already started, skipping the duplicate")
+            return None
+        userId = message_body["userId"]
+        video_name = message_body["video_name"]
+        voiceId = message_body["voiceId"]
+        gender = message_body["gender"]
+
+        input = {
+            "userId": userId,
+            "taskId": taskId,
+            "video_name": video_name,
+            "voiceId": voiceId,
+            "gender": gender,
+        }
+        if "embedding_provider" in message_body:
+            input["embedding_provider"] = message_body["embedding_provider"]
+        if "render_mode" in message_body:
+            input["render_mode"] = message_body["render_mode"]
+        input["frame_rate"] = get_frame_rate(video_name, message_body.get("frame_rate"))
+        # Text to speech then starts on the first sentences of the summary.
+        input["summary_streaming"] = (
+            os.environ.get("summary_streaming", "false") == "true"
+        )
+        start_execution(taskId, input)
+    except Exception as e:
+        return e
+    return None
+
+
+def claim_task(taskId):
+    """Move the task to Starting, unless an execution was already started.
+
+    SQS delivers messages at least once. A redelivered message finds the
+    task Started and is skipped with this single write. A task left in
+    Starting by a failed attempt is claimed again.
+
+    :return: False when the task is a duplicate.
+    """
+    table = dynamodb_client.Table(os.environ["vsh_dynamodb_table"])
+    try:
+        table.update_item(
+            Key={"TaskId": taskId},
+            UpdateExpression="SET ExecutionState = :starting",
+            ConditionExpression="attribute_not_exists(ExecutionState) OR ExecutionState = :starting",
+            ExpressionAttributeValues={":starting": "Starting"},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
+
+
+def start_execution(taskId, input):
+    # The execution is named after the task, so Step Functions refuses a
+    # second one even when two deliveries of the message run concurrently.
+    stateMachineArn = os.environ["StepFunction"]
+    try:
+        sfResponse = stepfunctions_client.start_execution(
+            stateMachineArn=stateMachineArn, name=taskId, input=json.dumps(input)
+        )
+        executionArn = sfResponse["executionArn"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ExecutionAlreadyExists":
+            raise
+        logging.info(f"The execution of task {taskId} already exists")
+        executionArn = (
+            stateMachineArn.replace(":stateMachine:", ":execution:") + ":" + taskId
+        )
+
+    table = dynamodb_client.Table(os.environ["vsh_dynamodb_table"])
+    table.update_item(
+        Key={"TaskId": taskId},
+        UpdateExpression="SET ExecutionState = :started, ExecutionArn = :arn",
+        ExpressionAttributeValues={":started": "Started", ":arn": executionArn},
     )
 
-    return {"statusCode": 200}
+
+def get_frame_rate(video_name, frame_rate=None):
+    """Frame rate the clip timecodes of the task are planned and read with.
+
+    A rate given with the request wins. Otherwise it is read from the video,
+    falling back to default_frame_rate when the file is not an MP4 whose
+    video track can be found.
+    """
+    if frame_rate:
+        return float(frame_rate)
+    bucket_videos = os.environ["bucket_videos"]
+    try:
+        size = s3_client.head_object(Bucket=bucket_videos, Key=video_name)[
+            "ContentLength"
+        ]
+
+        def fetch(offset, length):
+            return s3_client.get_object(
+                Bucket=bucket_videos,
+                Key=video_name,
+                Range=f"bytes={offset}-{min(offset + length, size) - 1}",
+            )["Body"].read()
+
+        frame_rate = media_info.mp4_frame_rate(fetch, size)
+    except (ClientError, struct.error) as e:
+        logging.warning(f"Could not read the frame rate of {video_name}: {e}")
+    if not frame_rate:
+        return float(os.environ.get("default_frame_rate", "24"))
+    logging.info(f"Frame rate of {video_name}: {frame_rate}")
+    return round(frame_rate, 3)
@@ -0,0 +1,57 @@
+import struct
+
+from mp4_boxes import find_box, find_path, iter_boxes
+
+# Only the most common sample durations matter, so a long table of a
+# variable frame rate video is not read to its end.
+MAX_STTS_ENTRIES = 1000
+
+
+def mp4_frame_rate(fetch, size):
+    """Read the frame rate of the first video track of an MP4 file.
+
+    The rate is the track's timescale divided by the sample duration shared
+    by most of its frames, from the mdhd and stts boxes.
+
+    :param fetch: Callable (offset, length) -> bytes over the file.
+    :param size: Size of the file in bytes.
+    :return: Frames per second, or None when it cannot be found.
+    """
+    moov = find_box(fetch, b"moov", 0, size)
+    if moov is None:
+        return None
+    for box_type, start, end in iter_boxes(fetch, *moov):
+        if box_type != b"trak":
+            continue
+        mdia = find_box(fetch, b"mdia", start, end)
+        if mdia is None:
+            continue
+        hdlr = find_box(fetch, b"hdlr", *mdia)
+        if hdlr is None or fetch(hdlr[0] + 8, 4) != b"vide":
+            continue
+        mdhd = find_box(fetch, b"mdhd", *mdia)
+        stbl = find_path(fetch, (b"minf", b"stbl", b"stts"), *mdia)
+        if mdhd is None or stbl is None:
+            return None
+        header = fetch(mdhd[0], 24)
+        timescale = struct.unpack_from(">I", header, 20 if header[0] == 1 else 12)[0]
+        return frame_rate(timescale, stts_entries(fetch, stbl[0]))
+    return None
+
+
+def frame_rate(timescale, entries):
+    entries = [(count, delta) for count, delta in entries if delta]
+    if not timescale or not entries:
+        return None
+    _, delta = max(entries)
+    return timescale / delta
+
+
+def stts_entries(fetch, start):
+    """Return the (sample count, sample delta) entries of an stts box."""
+    entry_count = struct.unpack_from(">I", fetch(start + 4, 4))[0]
+    entry_count = min(entry_count, MAX_STTS_ENTRIES)
+    if entry_count == 0:
+        return []
+    data = fetch(start + 8, entry_count * 8)
+    return [struct.unpack_from(">II", data, i * 8) for i in range(entry_count)]
@@ -1,57 +1,200 @@
 import json
+import logging
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
 
+import json_prefix
+import map_reduce
+import summary_stream
+import transcript_artifact
+from summary_cache import SummaryCache, cache_key
+
+logging.getLogger().setLevel(logging.INFO)
+
+# Bump when any prompt changes so cached summaries of the old prompts are
+# not reused.
+PROMPT_VERSION = "2"
+SAMPLING_PARAMS = {
+    "max_tokens_to_sample": 1024,
+    "temperature": 0.25,
+    "top_p": 0.9,
+    "stop_sequences": ["\\n\\nHuman:"],
+}
+
+summarize_concurrency = int(os.environ.get("summarize_concurrency", "4"))
 bedrock_client = boto3.client(
     service_name="bedrock-runtime",
     region_name=os.environ["bedrock_endpoint_region"],
+    config=Config(max_pool_connections=summarize_concurrency),
 )
 s3_client = boto3.client("s3")
+dynamodb_client = boto3.resource("dynamodb")
+summary_cache = SummaryCache(
+    s3_client,
+    os.environ["bucket_transcripts"],
+    os.environ.get("summary_cache_prefix", "summary-cache/"),
+    int(os.environ.get("summary_cache_ttl_days", "30")),
+)
 
 
 def lambda_handler(event, context):
     bucket_transcripts = os.environ["bucket_transcripts"]
     taskId = event["taskId"]
-    transcript_filename = taskId + ".json"
+    writer = None
+    if event.get("summary_streaming"):
+        # text2speech runs at the same time and reads the sentences from the
+        # stream as soon as they are written.
+        writer = summary_stream.SummaryStreamWriter(
+            s3_client, bucket_transcripts, summary_stream.stream_key(taskId)
+        )
+    try:
+        summarized_text = get_summary(bucket_transcripts, taskId, writer)
+    except Exception as e:
+        if writer is not None:
+            writer.fail(repr(e))
+        raise
+
+    write_text_to_s3(summarized_text, bucket_transcripts, taskId + ".txt")
+    if writer is not None:
+        if writer.count == 0:
+            # The final summary came from the cache or without a last model
+            # call, so nothing was streamed yet.
+            writer.write_text(summarized_text)
+        writer.close()
 
-    original_text = get_text_from_s3(bucket_transcripts, transcript_filename)
+    return {"statusCode": 200}
+
+
+def get_summary(bucket_transcripts, taskId, writer=None):
+    """Summarize the transcript of a task, or take the summary from the cache.
+
+    :param writer: Optional SummaryStreamWriter that gets the sentences of the
+                   final model call as they are generated.
+    """
+    original_text = get_transcript(bucket_transcripts, taskId)
+
+    mode = summarize_mode(original_text)
+    params = dict(SAMPLING_PARAMS, mode=mode)
+    if mode == "map_reduce":
+        params["chunk_tokens"] = chunk_tokens()
+    key = cache_key(
+        original_text, os.environ["bedrock_endpoint_model"], PROMPT_VERSION, params
+    )
+    summarized_text = summary_cache.get(key)
+    record_summary_cache_result(taskId, summarized_text is not None)
+    if summarized_text is None:
+        final_complete = None
+        if writer is not None:
+            final_complete = lambda prompt: bedrock_stream_complete(
+                prompt, writer.write
+            )
+        summarized_text = summarize(
+            original_text, bedrock_complete, mode, final_complete
+        )
+        summary_cache.put(key, summarized_text)
+    else:
+        logging.info("Summary cache hit: " + key)
+    return summarized_text
+
+
+def summarize_mode(original_text):
+    """Resolve summarize_mode to "single" or "map_reduce".
+
+    "auto" only uses map-reduce when the transcript does not fit in one chunk.
+    """
+    mode = os.environ.get("summarize_mode", "single")
+    if mode == "auto":
+        fits = map_reduce.estimate_tokens(original_text) <= chunk_tokens()
+        mode = "single" if fits else "map_reduce"
+    return mode
+
+
+def chunk_tokens():
+    return int(os.environ.get("summarize_chunk_tokens", "6000"))
 
-    modelId = os.environ["bedrock_endpoint_model"]
-    accept = "application/json"
-    contentType = "application/json"
 
-    prompt = f"""\n\nHuman: Summarize the key points from the following video content:
+def summarize(original_text, complete, mode="single", final_complete=None):
+    """Summarize in one call, or map-reduce over chunks for long transcripts.
+
+    :param final_complete: Used instead of complete for the call that
+                           produces the final summary, e.g. a streaming one.
+    """
+    if mode == "map_reduce":
+        return map_reduce.summarize(
+            original_text,
+            complete,
+            chunk_tokens=chunk_tokens(),
+            max_workers=summarize_concurrency,
+            whole_prompt=summary_prompt,
+            final_complete=final_complete,
+        )
+    return (final_complete or complete)(summary_prompt(original_text))
+
+
+def summary_prompt(original_text):
+    return f"""\n\nHuman: Summarize the key points from the following video content:
 
     {original_text} 
 
     \n\nThe summary should only contain information present in the video content. Do not include any new or unrelated information. Make each sentence highly semantically similar to a sentence in the video content.
     \n\nAssistant: Here is a summary of the video: """
-    body = json.dumps(
-        {
-            "prompt": prompt,
-            "max_tokens_to_sample": 1024,
-            "temperature": 0.25,
-            "top_p": 0.9,
-            "stop_sequences": ["\\n\\nHuman:"],
-        }
-    )
+
+
+def bedrock_complete(prompt):
+    modelId = os.environ["bedrock_endpoint_model"]
+    accept = "application/json"
+    contentType = "application/json"
+
+    body = json.dumps(dict(SAMPLING_PARAMS, prompt=prompt))
     response = bedrock_client.invoke_model(
         body=body, modelId=modelId, accept=accept, contentType=contentType
     )
     response_body = json.loads(response.get("body").read())
-    summarized_text = response_body["completion"]
+    return response_body["completion"]
 
-    write_text_to_s3(summarized_text, bucket_transcripts, taskId + ".txt")
 
-    return {"statusCode": 200}
+def bedrock_stream_complete(prompt, on_sentence):
+    response = bedrock_client.invoke_model_with_response_stream(
+        body=json.dumps(dict(SAMPLING_PARAMS, prompt=prompt)),
+        modelId=os.environ["bedrock_endpoint_model"],
+        accept="application/json",
+        contentType="application/json",
+    )
+    return summary_stream.stream_sentences(response["body"], on_sentence)
+
+
+def record_summary_cache_result(taskId, hit):
+    table = dynamodb_client.Table(os.environ["vsh_dynamodb_table"])
+    table.update_item(
+        Key={"TaskId": taskId},
+        UpdateExpression="ADD SummaryCacheHits :hits, SummaryCacheMisses :misses",
+        ExpressionAttributeValues={":hits": int(hit), ":misses": int(not hit)},
+    )
+
+
+def get_transcript(bucket_transcripts, taskId):
+    # Only the transcript column of the compact artifact is downloaded. Tasks
+    # transcribed before the artifact existed still read the Transcribe JSON.
+    try:
+        return transcript_artifact.read_columns(
+            transcript_artifact.s3_fetch(
+                s3_client,
+                bucket_transcripts,
+                transcript_artifact.artifact_key(taskId),
+            ),
+            ["transcript"],
+        )["transcript"]
+    except ClientError:
+        return get_text_from_s3(bucket_transcripts, taskId + ".json")
 
 
 def get_text_from_s3(bucket_transcripts, transcript_filename):
-    response = s3_client.get_object(Bucket=bucket_transcripts, Key=transcript_filename)
-    content = response["Body"].read().decode("utf-8")
-    json_content = json.loads(content)
-    text = json_content["results"]["transcripts"][0]["transcript"]
+    text, bytes_read = json_prefix.read_value(
+        json_prefix.s3_chunks(s3_client, bucket_transcripts, transcript_filename),
+        ("results", "transcripts", 0, "transcript"),
+    )
     return text
 
 
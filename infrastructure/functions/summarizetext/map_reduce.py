@@ -0,0 +1,132 @@
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+SENTENCE_END = re.compile(r"(?<=[.?!])\s+")
+# Rough size of a token in characters for English text. Only used to
+# budget chunks, so it does not need to match the model's tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_into_chunks(text, max_tokens):
+    """Split text on sentence boundaries into chunks of about max_tokens.
+
+    Sentences are never cut unless a single sentence is longer than the
+    budget, in which case it is split between words.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in SENTENCE_END.split(text.strip()):
+        for piece in split_long_sentence(sentence, max_tokens):
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def split_long_sentence(sentence, max_tokens):
+    if estimate_tokens(sentence) <= max_tokens:
+        return [sentence]
+    pieces = []
+    words = []
+    for word in sentence.split():
+        if words and estimate_tokens(" ".join(words + [word])) > max_tokens:
+            pieces.append(" ".join(words))
+            words = []
+        words.append(word)
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+def summarize(
+    text,
+    complete,
+    chunk_tokens=6000,
+    max_workers=4,
+    whole_prompt=None,
+    final_complete=None,
+):
+    """Summarize text by summarizing its chunks concurrently, then combining.
+
+    When the partial summaries together are still larger than one chunk they
+    are chunked and summarized again, until a single reduce call fits.
+
+    :param text: Transcript to summarize.
+    :param complete: Callable that sends a prompt to the model and returns the
+                     completion, so a fake model can be used instead of Bedrock.
+    :param chunk_tokens: Estimated token budget of the text in one prompt.
+    :param max_workers: Maximum number of model calls in flight.
+    :param whole_prompt: Prompt builder for a text that fits in one chunk,
+                         which is summarized as the whole video rather than
+                         as one part of it.
+    :param final_complete: Used instead of complete for the call that
+                           produces the final summary, e.g. a streaming one.
+    :return: Summary text.
+    """
+    chunks = split_into_chunks(text, chunk_tokens)
+    if not chunks:
+        return ""
+    if len(chunks) == 1:
+        return (final_complete or complete)((whole_prompt or map_prompt)(text))
+    logging.info(f"Summarizing {len(chunks)} chunks")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        partials = list(pool.map(lambda chunk: complete(map_prompt(chunk)), chunks))
+        while len(partials) > 1 and estimate_tokens("\n".join(partials)) > chunk_tokens:
+            groups = group_partials(partials, chunk_tokens)
+            logging.info(
+                f"Combining {len(partials)} partial summaries in {len(groups)} groups"
+            )
+            partials = list(
+                pool.map(lambda group: complete(reduce_prompt(group)), groups)
+            )
+    if len(partials) == 1:
+        return partials[0]
+    return (final_complete or complete)(reduce_prompt(partials))
+
+
+def group_partials(partials, max_tokens):
+    groups = [[]]
+    tokens = 0
+    for partial in partials:
+        partial_tokens = estimate_tokens(partial)
+        if groups[-1] and tokens + partial_tokens > max_tokens:
+            groups.append([])
+            tokens = 0
+        groups[-1].append(partial)
+        tokens += partial_tokens
+    # Every reduce call has to shrink the list, so never leave a group of one
+    # when the budget only fits one partial at a time.
+    if len(groups) == len(partials) and len(groups) > 1:
+        groups = [partials[i : i + 2] for i in range(0, len(partials), 2)]
+    return groups
+
+
+def map_prompt(chunk):
+    return f"""\n\nHuman: The following is one part of the transcript of a video. Summarize its key points:
+
+    {chunk}
+
+    \n\nThe summary should only contain information present in this part. Do not include any new or unrelated information. Make each sentence highly semantically similar to a sentence in the transcript.
+    \n\nAssistant: Here is a summary of this part: """
+
+
+def reduce_prompt(partials):
+    joined = "\n\n".join(partials)
+    return f"""\n\nHuman: The following are summaries of consecutive parts of a video, in order. Combine them into one summary of the key points of the video:
+
+    {joined}
+
+    \n\nThe summary should only contain information present in these summaries and keep their order. Do not include any new or unrelated information. Keep the sentences close to the wording of the summaries.
+    \n\nAssistant: Here is a summary of the video: """
@@ -0,0 +1,56 @@
+import datetime
+import hashlib
+import json
+
+from botocore.exceptions import ClientError
+
+
+def cache_key(transcript, model_id, prompt_version, params):
+    """Hash of everything that determines the summary of a transcript.
+
+    :param params: JSON-serializable sampling and chunking parameters.
+    """
+    return hashlib.sha256(
+        json.dumps(
+            {
+                "transcript": transcript,
+                "model_id": model_id,
+                "prompt_version": prompt_version,
+                "params": params,
+            },
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+class SummaryCache:
+    """Summaries stored as text objects next to the task outputs.
+
+    Entries older than ttl_days are treated as misses. A lifecycle rule on
+    the same prefix deletes them from the bucket.
+    """
+
+    def __init__(self, s3_client, bucket, prefix="summary-cache/", ttl_days=30):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.ttl = datetime.timedelta(days=ttl_days)
+
+    def get(self, key):
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket, Key=self.prefix + key + ".txt"
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        age = datetime.datetime.now(datetime.timezone.utc) - response["LastModified"]
+        if age > self.ttl:
+            return None
+        return response["Body"].read().decode("utf-8")
+
+    def put(self, key, summary):
+        self.s3_client.put_object(
+            Body=summary, Bucket=self.bucket, Key=self.prefix + key + ".txt"
+        )
@@ -1,11 +1,25 @@
+import json
+import logging
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
+import itertools
 import os
 import time
 
+import notify
+import polly_sync
+import summary_stream
+
+logging.getLogger().setLevel(logging.INFO)
+
+polly_concurrency = int(os.environ.get("polly_concurrency", "8"))
 s3_client = boto3.client("s3")
-polly_client = boto3.client("polly")
+polly_client = boto3.client(
+    "polly", config=Config(max_pool_connections=polly_concurrency)
+)
 dynamodb_client = boto3.resource("dynamodb")
+stepfunctions_client = boto3.client("stepfunctions")
 
 
 def lambda_handler(event, context):
@@ -14,32 +28,62 @@ def lambda_handler(event, context):
     voiceId = event["VSHParams"]["voiceId"]
     taskId = event["VSHParams"]["taskId"]
 
-    text = (
-        s3_client.get_object(Bucket=bucket_transcripts, Key=taskId + ".txt")["Body"]
-        .read()
-        .decode("utf-8-sig")
-    )
-    text += " This video is generated by Video Summarization Hub."
+    sentences = None
+    if event["VSHParams"].get("summary_streaming"):
+        # Summarization is still running, and its sentences arrive one by one.
+        sentences = read_summary_stream(bucket_transcripts, taskId)
+
+    if os.environ.get("polly_mode", "async") == "sync":
+        cache = get_tts_cache(bucket_audio)
+        max_chars = int(os.environ.get("polly_chunk_chars", "2500"))
+        if sentences is not None:
+            chunks = (
+                piece
+                for sentence in sentences
+                for piece in polly_sync.split_sentences(sentence, max_chars)
+            )
+        elif cache is None:
+            chunks = polly_sync.split_text(
+                get_summary(bucket_transcripts, taskId), max_chars
+            )
+        else:
+            # One sentence per request, so unchanged sentences hit the cache.
+            chunks = polly_sync.split_sentences(
+                get_summary(bucket_transcripts, taskId), max_chars
+            )
+        outputUri = create_speech_marks_sync(
+            chunks, bucket_audio, voiceId, taskId, cache
+        )
+        stepfunctions_client.send_task_success(
+            taskToken=event["TaskToken"], output=json.dumps({"outputUri": outputUri})
+        )
+        notify.publish_task_event(event["VSHParams"]["userId"], taskId, "speech_marks")
+        return {"statusCode": 200}
+
+    # An asynchronous Polly task needs the whole text up front.
+    if sentences is not None:
+        summarized_text = " ".join(sentences)
+    else:
+        summarized_text = get_summary(bucket_transcripts, taskId)
+    text = summarized_text + " " + polly_sync.TRAILER
+
+    # Add the Step Function token in DynamoDB for the callback function, which
+    # finds the task from the output key prefix. It is stored first so it is
+    # there however fast the Polly task finishes.
+    add_polly_task_token(taskId, os.environ["vsh_dynamodb_table"], event["TaskToken"])
 
     # Create Polly task
-    pollyTextResponse = create_polly_text_task(text, bucket_audio, voiceId)
-
-    # Add Polly Task Id in DynamoDB for Step Function callback function
-    add_polly_taskid(
-        taskId,
-        os.environ["vsh_dynamodb_table"],
-        pollyTextResponse["SynthesisTask"]["TaskId"],
-        event["TaskToken"],
-    )
+    pollyTextResponse = create_polly_text_task(text, bucket_audio, voiceId, taskId)
 
     return {"statusCode": 200}
 
 
-def create_polly_text_task(text, bucket_audio, voiceId):
+def create_polly_text_task(text, bucket_audio, voiceId, taskId):
     response = polly_client.start_speech_synthesis_task(
         Engine="neural",
         OutputFormat="json",
         OutputS3BucketName=bucket_audio,
+        OutputS3KeyPrefix=taskId + "/",
         Text=text,
         TextType="text",
         SpeechMarkTypes=["sentence"],
@@ -50,11 +94,96 @@ def create_polly_text_task(text, bucket_audio, voiceId):
     return response
 
 
-def add_polly_taskid(taskId, dynamodb_table, polly_task_id, sf_task_token):
+def create_speech_marks_sync(chunks, bucket_audio, voiceId, taskId, cache=None):
+    """Synthesize sentence speech marks without an asynchronous Polly task.
+
+    Marks and audio of the summary chunks are synthesized concurrently, each
+    chunk as soon as it is produced, and the trailer is its own last chunk.
+    The audio measures each chunk so its marks can be shifted in time, and
+    the audio of the summary chunks is stored for getframes, which then only
+    has to add the intro.
+
+    :param chunks: Iterable of summary text chunks that each fit a
+                   synchronous request, e.g. a generator over a summary that
+                   is still being written.
+    :param cache: Optional TtsCache.
+    :return: S3 URI of the speech marks, like the outputUri of a Polly task.
+    """
+    voice = {"Engine": "neural", "TextType": "text", "VoiceId": voiceId}
+    texts = []
+
+    def requests():
+        for chunk in itertools.chain(chunks, [polly_sync.TRAILER]):
+            texts.append(chunk)
+            yield dict(
+                voice, Text=chunk, OutputFormat="json", SpeechMarkTypes=["sentence"]
+            )
+            yield dict(voice, Text=chunk, OutputFormat="mp3")
+
+    results = polly_sync.synthesize_all(
+        polly_sync.polly_synthesize(polly_client),
+        requests(),
+        polly_concurrency,
+        cache,
+    )
+    if cache is not None:
+        logging.info("TTS cache: " + json.dumps(cache.stats()))
+    audio = results[1::2]
+    durations = [polly_sync.mp3_duration_ms(part) for part in audio]
+    speech_marks = polly_sync.rebase_speech_marks(results[0::2], durations, texts)
+
+    # The narration does not speak the trailer.
+    s3_client.put_object(
+        Body=polly_sync.concat_mp3(audio[:-1]),
+        Bucket=bucket_audio,
+        Key=polly_sync.summary_audio_key(taskId),
+    )
+    key = taskId + ".marks"
+    s3_client.put_object(Body=speech_marks, Bucket=bucket_audio, Key=key)
+    return "s3://" + bucket_audio + "/" + key
+
+
+def get_summary(bucket_transcripts, taskId):
+    return (
+        s3_client.get_object(Bucket=bucket_transcripts, Key=taskId + ".txt")["Body"]
+        .read()
+        .decode("utf-8-sig")
+    )
+
+
+def read_summary_stream(bucket_transcripts, taskId):
+    """Generator over the sentences of a summary that is still being written."""
+    key = summary_stream.stream_key(taskId)
+
+    def read():
+        try:
+            return s3_client.get_object(Bucket=bucket_transcripts, Key=key)[
+                "Body"
+            ].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    return summary_stream.read_sentences(
+        read,
+        poll_seconds=float(os.environ.get("summary_stream_poll_seconds", "0.5")),
+        timeout_seconds=float(os.environ.get("summary_stream_timeout", "840")),
+    )
+
+
+def get_tts_cache(bucket_audio):
+    if os.environ.get("tts_cache", "false") != "true":
+        return None
+    return polly_sync.TtsCache(
+        s3_client, bucket_audio, os.environ.get("tts_cache_prefix", "tts-cache/")
+    )
+
+
+def add_polly_task_token(taskId, dynamodb_table, sf_task_token):
     table = dynamodb_client.Table(dynamodb_table)
-    ttl = str(int(time.time() + 3600))
     dynamodbResponse = table.update_item(
         Key={"TaskId": taskId},
-        UpdateExpression="SET PollyTaskId = :value1, LambdaPollyTaskToken = :value2",
-        ExpressionAttributeValues={":value1": polly_task_id, ":value2": sf_task_token},
+        UpdateExpression="SET LambdaPollyTaskToken = :value1",
+        ExpressionAttributeValues={":value1": sf_task_token},
     )
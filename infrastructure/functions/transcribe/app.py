@@ -1,10 +1,21 @@
+import hashlib
 import json
+import logging
 import boto3
 from botocore.exceptions import ClientError
 import os
 
+import media_segments
+import notify
+
+logging.getLogger().setLevel(logging.INFO)
+
 transcribe_client = boto3.client("transcribe")
 dynamodb_client = boto3.resource("dynamodb")
+s3_client = boto3.client("s3")
+stepfunctions = boto3.client("stepfunctions")
+
+MEDIA_INDEX_PREFIX = "media-index/"
 
 
 def lambda_handler(event, context):
@@ -22,18 +33,58 @@ def lambda_handler(event, context):
         "taskId": taskId,
     }
 
+    language_code = "en-US"
+    media_fingerprint = get_media_fingerprint(bucket_videos, video_name, language_code)
+    sourceTaskId = find_transcribed_media(bucket_transcripts, media_fingerprint)
+    if sourceTaskId is not None and copy_transcripts(
+        bucket_transcripts, sourceTaskId, taskId
+    ):
+        # The same media was already transcribed, so the Transcribe job and
+        # its callback are skipped.
+        logging.info(f"Reusing the transcripts of task {sourceTaskId}")
+        add_transcript_source(
+            taskId, os.environ["vsh_dynamodb_table"], media_fingerprint, sourceTaskId
+        )
+        stepfunctions.send_task_success(taskToken=event["TaskToken"], output="{}")
+        notify.publish_task_event(
+            event["VSHParams"]["userId"], taskId, "transcribed", reused=True
+        )
+        return {"statusCode": 200, "body": json.dumps(response)}
+
+    if os.environ.get("transcribe_mode", "single") == "segmented":
+        segments = plan_transcribe_segments(bucket_videos, video_name)
+        if segments is not None and len(segments) > 1:
+            # The segments are recorded first, since their callbacks need them.
+            add_transcribe_segments(
+                taskId,
+                os.environ["vsh_dynamodb_table"],
+                segments,
+                event["TaskToken"],
+                media_fingerprint,
+            )
+            start_segment_jobs(
+                taskId, bucket_videos, video_name, bucket_transcripts, segments
+            )
+            return {"statusCode": 200, "body": json.dumps(response)}
+
+    # The job is named after the task, so its callback can read the token
+    # from the task item. The token is stored before the job can finish.
+    add_transcribe_taskid(
+        taskId,
+        os.environ["vsh_dynamodb_table"],
+        taskId,
+        event["TaskToken"],
+        media_fingerprint,
+    )
     job = start_job(
         taskId,
         "s3://" + bucket_videos + "/" + video_name,
         "mp4",
-        "en-US",
+        language_code,
         transcribe_client,
         bucket_transcripts,
         None,
     )
-    add_transcribe_taskid(
-        taskId, os.environ["vsh_dynamodb_table"], taskId, event["TaskToken"]
-    )
 
     return {"statusCode": 200, "body": json.dumps(response)}
 
@@ -79,13 +130,187 @@ def start_job(
     return job
 
 
-def add_transcribe_taskid(taskId, dynamodb_table, transcribe_task_id, sf_task_token):
+def get_media_fingerprint(bucket_videos, video_name, language_code):
+    """Identify the media by its ETag and size, and the transcription language."""
+    head = s3_client.head_object(Bucket=bucket_videos, Key=video_name)
+    return hashlib.sha256(
+        f"{head['ETag']}:{head['ContentLength']}:{language_code}".encode("utf-8")
+    ).hexdigest()
+
+
+def find_transcribed_media(bucket_transcripts, media_fingerprint):
+    try:
+        index_entry = s3_client.get_object(
+            Bucket=bucket_transcripts,
+            Key=MEDIA_INDEX_PREFIX + media_fingerprint + ".json",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(index_entry["Body"].read())["taskId"]
+
+
+def plan_transcribe_segments(bucket_videos, video_name):
+    """Split long videos into overlapping segments, or return None.
+
+    Videos shorter than segmented_min_duration_s, or whose duration cannot be
+    read, are transcribed in a single job.
+    """
+    size = s3_client.head_object(Bucket=bucket_videos, Key=video_name)["ContentLength"]
+
+    def fetch(offset, length):
+        return s3_client.get_object(
+            Bucket=bucket_videos,
+            Key=video_name,
+            Range=f"bytes={offset}-{min(offset + length, size) - 1}",
+        )["Body"].read()
+
+    duration_ms = media_segments.mp4_duration_ms(fetch, size)
+    logging.info(f"Duration of {video_name}: {duration_ms} ms")
+    min_duration_ms = int(os.environ.get("segmented_min_duration_s", "1200")) * 1000
+    if duration_ms is None or duration_ms < min_duration_ms:
+        return None
+    return media_segments.plan_segments(
+        duration_ms,
+        int(os.environ.get("segment_duration_s", "600")) * 1000,
+        int(os.environ.get("segment_overlap_s", "20")) * 1000,
+    )
+
+
+def start_segment_jobs(taskId, bucket_videos, video_name, bucket_transcripts, segments):
+    # Transcribe cannot work on a time range of a file, so MediaConvert first
+    # cuts the audio of each segment. eventbridge_mediaconvert starts the
+    # Transcribe job of a segment as soon as its audio is ready.
+    endpoint_url = boto3.client("mediaconvert").describe_endpoints(Mode="GET_ONLY")
+    media_convert = boto3.client(
+        "mediaconvert", endpoint_url=endpoint_url["Endpoints"][0]["Url"]
+    )
+    for k, (start_ms, end_ms) in enumerate(segments):
+        clipping = {"StartTimecode": media_segments.clip_timecode(start_ms)}
+        if k + 1 < len(segments):
+            clipping["EndTimecode"] = media_segments.clip_timecode(end_ms)
+        media_convert.create_job(
+            Queue=os.environ["media_convert_queue"],
+            Role=os.environ["iam_role"],
+            UserMetadata={
+                "TaskId": taskId,
+                "Purpose": "transcribe-segment",
+                "Segment": str(k),
+                "LanguageCode": "en-US",
+            },
+            Settings={
+                "TimecodeConfig": {"Source": "ZEROBASED"},
+                "Inputs": [
+                    {
+                        "FileInput": "s3://" + bucket_videos + "/" + video_name,
+                        "TimecodeSource": "ZEROBASED",
+                        "InputClippings": [clipping],
+                        "AudioSelectors": {
+                            "Audio Selector 1": {"DefaultSelection": "DEFAULT"}
+                        },
+                    }
+                ],
+                "OutputGroups": [
+                    {
+                        "Name": "File Group",
+                        "OutputGroupSettings": {
+                            "Type": "FILE_GROUP_SETTINGS",
+                            "FileGroupSettings": {
+                                "Destination": "s3://"
+                                + bucket_transcripts
+                                + "/"
+                                + taskId
+                                + "-segments/"
+                            },
+                        },
+                        "Outputs": [
+                            {
+                                "NameModifier": f"-seg{k}",
+                                "ContainerSettings": {
+                                    "Container": "MP4",
+                                    "Mp4Settings": {},
+                                },
+                                "AudioDescriptions": [
+                                    {
+                                        "AudioSourceName": "Audio Selector 1",
+                                        "CodecSettings": {
+                                            "Codec": "AAC",
+                                            "AacSettings": {
+                                                "Bitrate": 96000,
+                                                "CodingMode": "CODING_MODE_2_0",
+                                                "SampleRate": 48000,
+                                            },
+                                        },
+                                    }
+                                ],
+                            }
+                        ],
+                    }
+                ],
+            },
+        )
+
+
+def add_transcribe_segments(
+    taskId, dynamodb_table, segments, sf_task_token, media_fingerprint
+):
+    table = dynamodb_client.Table(dynamodb_table)
+    dynamodbResponse = table.update_item(
+        Key={"TaskId": taskId},
+        UpdateExpression="SET TranscribeSegmentsMs = :value1, LambdaTranscribeTaskToken = :value2, MediaFingerprint = :value3",
+        ExpressionAttributeValues={
+            ":value1": [[start_ms, end_ms] for start_ms, end_ms in segments],
+            ":value2": sf_task_token,
+            ":value3": media_fingerprint,
+        },
+    )
+
+
+def copy_transcripts(bucket_transcripts, sourceTaskId, taskId):
+    """Copy the Transcribe outputs of another task under this task's name.
+
+    :return: False when the source transcripts no longer exist.
+    """
+    for suffix in (".json", ".srt", "-transcript.bin"):
+        try:
+            s3_client.copy_object(
+                Bucket=bucket_transcripts,
+                Key=taskId + suffix,
+                CopySource={"Bucket": bucket_transcripts, "Key": sourceTaskId + suffix},
+            )
+        except ClientError as e:
+            # The compact artifact is optional, downstream functions fall back
+            # to the Transcribe JSON and SRT without it.
+            if suffix == "-transcript.bin":
+                continue
+            logging.warning(f"Could not copy {sourceTaskId + suffix}: {e}")
+            return False
+    return True
+
+
+def add_transcribe_taskid(
+    taskId, dynamodb_table, transcribe_task_id, sf_task_token, media_fingerprint
+):
     table = dynamodb_client.Table(dynamodb_table)
     dynamodbResponse = table.update_item(
         Key={"TaskId": taskId},
-        UpdateExpression="SET TranscribeTaskId = :value1, LambdaTranscribeTaskToken = :value2",
+        UpdateExpression="SET TranscribeTaskId = :value1, LambdaTranscribeTaskToken = :value2, MediaFingerprint = :value3",
         ExpressionAttributeValues={
             ":value1": transcribe_task_id,
             ":value2": sf_task_token,
+            ":value3": media_fingerprint,
+        },
+    )
+
+
+def add_transcript_source(taskId, dynamodb_table, media_fingerprint, sourceTaskId):
+    table = dynamodb_client.Table(dynamodb_table)
+    dynamodbResponse = table.update_item(
+        Key={"TaskId": taskId},
+        UpdateExpression="SET MediaFingerprint = :value1, TranscriptSource = :value2",
+        ExpressionAttributeValues={
+            ":value1": media_fingerprint,
+            ":value2": sourceTaskId,
         },
     )
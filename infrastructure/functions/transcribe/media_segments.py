@@ -0,0 +1,54 @@
+import struct
+
+from mp4_boxes import find_box
+
+
+def mp4_duration_ms(fetch, size):
+    """Read the duration of an MP4 file from its movie header.
+
+    Only the box headers on the way to moov/mvhd are fetched, so the cost is
+    a few small ranged GETs wherever the moov box is placed.
+
+    :param fetch: Callable (offset, length) -> bytes over the file.
+    :param size: Size of the file in bytes.
+    :return: Duration in milliseconds, or None when it cannot be found.
+    """
+    moov = find_box(fetch, b"moov", 0, size)
+    if moov is None:
+        return None
+    mvhd = find_box(fetch, b"mvhd", moov[0], moov[1])
+    if mvhd is None:
+        return None
+    header = fetch(mvhd[0], 32)
+    if header[0] == 1:
+        timescale, duration = struct.unpack_from(">IQ", header, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", header, 12)
+    if timescale == 0:
+        return None
+    return duration * 1000 // timescale
+
+
+def plan_segments(duration_ms, segment_ms, overlap_ms):
+    """Split the media into segments of segment_ms that overlap by overlap_ms.
+
+    Boundaries are whole seconds so they can be used as input clippings
+    without knowing the frame rate.
+
+    :return: List of (start_ms, end_ms).
+    """
+    step_ms = max(1000, (segment_ms - overlap_ms) // 1000 * 1000)
+    segment_ms = segment_ms // 1000 * 1000
+    segments = []
+    start_ms = 0
+    while True:
+        end_ms = min(start_ms + segment_ms, -(-duration_ms // 1000) * 1000)
+        segments.append((start_ms, end_ms))
+        if end_ms >= duration_ms:
+            return segments
+        start_ms += step_ms
+
+
+def clip_timecode(time_ms):
+    seconds = time_ms // 1000
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}:00"
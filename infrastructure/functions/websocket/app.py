@@ -0,0 +1,40 @@
+import json
+import logging
+import boto3
+from botocore.exceptions import ClientError
+import os
+
+import notify
+
+dynamodb_client = boto3.resource("dynamodb")
+cognito_client = boto3.client("cognito-idp")
+
+
+def lambda_handler(event, context):
+    store = notify.DynamoDBConnectionStore(
+        dynamodb_client.Table(os.environ["connections_table"])
+    )
+    route = event["requestContext"]["routeKey"]
+    connectionId = event["requestContext"]["connectionId"]
+
+    if route == "$connect":
+        # Browsers cannot set headers on a WebSocket, so the Cognito access
+        # token comes in the query string. GetUser both checks it and tells
+        # whose task events the connection receives.
+        token = (event.get("queryStringParameters") or {}).get("token")
+        if not token:
+            return {"statusCode": 401}
+        try:
+            userId = cognito_client.get_user(AccessToken=token)["Username"]
+        except ClientError as e:
+            logging.warning(f"Refused connection {connectionId}: {e!r}")
+            return {"statusCode": 401}
+        store.add(connectionId, userId)
+    elif route == "$disconnect":
+        store.remove(connectionId)
+    else:
+        # Clients only listen, anything they send is answered with a pong so
+        # it can be used to keep the connection open.
+        return {"statusCode": 200, "body": json.dumps({"type": "pong"})}
+
+    return {"statusCode": 200}
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+# API Gateway closes WebSocket connections after two hours at the latest.
+CONNECTION_TTL_SECONDS = 7200
+
+
+class DynamoDBConnectionStore:
+    """WebSocket connections in DynamoDB, keyed by connection ID."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def add(self, connectionId, userId):
+        self.table.put_item(
+            Item={
+                "ConnectionId": connectionId,
+                "UserId": userId,
+                "ExpireTime": int(time.time()) + CONNECTION_TTL_SECONDS,
+            }
+        )
+
+    def remove(self, connectionId):
+        self.table.delete_item(Key={"ConnectionId": connectionId})
+
+    def connections(self, userId):
+        query_args = {
+            "IndexName": "UserIdGSI",
+            "KeyConditionExpression": Key("UserId").eq(userId),
+        }
+        connectionIds = []
+        while True:
+            response = self.table.query(**query_args)
+            connectionIds += [item["ConnectionId"] for item in response["Items"]]
+            if "LastEvaluatedKey" not in response:
+                return connectionIds
+            query_args["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class InMemoryConnectionStore:
+    """Same interface as DynamoDBConnectionStore, for local runs."""
+
+    def __init__(self):
+        self.users = {}
+
+    def add(self, connectionId, userId):
+        self.users[connectionId] = userId
+
+    def remove(self, connectionId):
+        self.users.pop(connectionId, None)
+
+    def connections(self, userId):
+        return [
+            connectionId
+            for connectionId, connection_user in self.users.items()
+            if connection_user == userId
+        ]
+
+
+def api_gateway_sender(client):
+    """Send data to a connection, returning False when it is gone."""
+
+    def send(connectionId, data):
+        try:
+            client.post_to_connection(ConnectionId=connectionId, Data=data)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "GoneException":
+                return False
+            raise
+        return True
+
+    return send
+
+
+class Notifier:
+    """Fan a message out to every connection of a user.
+
+    :param store: DynamoDBConnectionStore or InMemoryConnectionStore.
+    :param send: Callable (connection ID, data) -> False when the connection
+                 is gone, e.g. api_gateway_sender().
+    """
+
+    def __init__(self, store, send):
+        self.store = store
+        self.send = send
+
+    def publish(self, userId, message):
+        data = json.dumps(message)
+        sent = 0
+        for connectionId in self.store.connections(userId):
+            if self.send(connectionId, data):
+                sent += 1
+            else:
+                self.store.remove(connectionId)
+        return sent
+
+
+def task_event(taskId, stage, status="Running", **detail):
+    return {
+        "type": "task",
+        "taskId": taskId,
+        "stage": stage,
+        "status": status,
+        **detail,
+    }
+
+
+notifier = None
+
+
+def get_notifier():
+    global notifier
+    if notifier is None and os.environ.get("websocket_endpoint"):
+        notifier = Notifier(
+            DynamoDBConnectionStore(
+                boto3.resource("dynamodb").Table(os.environ["connections_table"])
+            ),
+            api_gateway_sender(
+                boto3.client(
+                    "apigatewaymanagementapi",
+                    endpoint_url=os.environ["websocket_endpoint"],
+                )
+            ),
+        )
+    return notifier
+
+
+def publish_task_event(userId, taskId, stage, status="Running", **detail):
+    """Push a progress event of a task to its user's open connections.
+
+    Progress is best effort: the task's state is in the tasks table, so a
+    failure to notify is logged and never fails the caller.
+    """
+    try:
+        notifier = get_notifier()
+        if notifier is not None:
+            notifier.publish(userId, task_event(taskId, stage, status, **detail))
+    except Exception as e:
+        logging.warning(f"Could not publish the {stage} event of task {taskId}: {e!r}")
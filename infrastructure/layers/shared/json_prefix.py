@@ -0,0 +1,152 @@
+import codecs
+import json
+import re
+
+from botocore.exceptions import ClientError
+
+WHITESPACE = re.compile(r"\s*")
+SCALAR = re.compile(r"[^\s,:\[\]{}]+")
+
+
+def s3_chunks(s3_client, bucket, key, first_chunk=65536, max_chunk=1048576):
+    """Yield an S3 object in ranged GETs of growing size until it ends."""
+    offset = 0
+    size = first_chunk
+    while True:
+        try:
+            data = s3_client.get_object(
+                Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + size - 1}"
+            )["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "InvalidRange":
+                return
+            raise
+        if data:
+            yield data
+        if len(data) < size:
+            return
+        offset += len(data)
+        size = min(size * 2, max_chunk)
+
+
+def read_value(chunks, path):
+    """Return the JSON value at path, reading no further than where it ends.
+
+    A pull parser walks the document structure chunk by chunk and only keeps
+    the text of the value that is being captured, so for a value near the
+    start of a large document the rest is never downloaded or parsed.
+
+    :param chunks: Iterable of bytes, for example from s3_chunks().
+    :param path: Keys and array indices, e.g. ("results", "items", 0).
+    :return: Tuple of (value, number of bytes read).
+    """
+    path = list(path)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = iter(chunks)
+    bytes_read = 0
+    buffer = ""
+    pos = 0
+    eof = False
+    # Each open container is [kind, current key or index].
+    stack = []
+    state = "value"
+    capture_start = None
+    capture_depth = None
+    # Where to continue looking for the end of a string split across chunks.
+    string_resume = None
+
+    while True:
+        token_end = None
+        match = WHITESPACE.match(buffer, pos)
+        if match.end() < len(buffer):
+            pos = match.end()
+            char = buffer[pos]
+            if char == '"':
+                token_end = find_string_end(buffer, pos, string_resume)
+                string_resume = None if token_end else len(buffer)
+            elif char in "{}[]:,":
+                token_end = pos + 1
+            else:
+                match = SCALAR.match(buffer, pos)
+                if match.end() < len(buffer) or eof:
+                    token_end = match.end()
+
+        if token_end is None:
+            if eof:
+                raise KeyError(tuple(path))
+            keep_from = pos if capture_start is None else capture_start
+            buffer = buffer[keep_from:]
+            pos -= keep_from
+            if string_resume is not None:
+                string_resume -= keep_from
+            if capture_start is not None:
+                capture_start = 0
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                buffer += decoder.decode(b"", final=True)
+            else:
+                bytes_read += len(chunk)
+                buffer += decoder.decode(chunk)
+            continue
+
+        token = buffer[pos:token_end]
+        value_done = False
+        if state in ("value", "value_or_end"):
+            if state == "value_or_end" and token == "]":
+                stack.pop()
+                value_done = True
+            else:
+                if capture_start is None and [frame[1] for frame in stack] == path:
+                    capture_start = pos
+                    capture_depth = len(stack)
+                if token == "{":
+                    stack.append(["object", None])
+                    state = "key_or_end"
+                elif token == "[":
+                    stack.append(["array", 0])
+                    state = "value_or_end"
+                else:
+                    value_done = True
+        elif state in ("key", "key_or_end"):
+            if state == "key_or_end" and token == "}":
+                stack.pop()
+                value_done = True
+            else:
+                stack[-1][1] = json.loads(token)
+                state = "colon"
+        elif state == "colon":
+            state = "value"
+        elif state == "comma_or_end":
+            if token == ",":
+                if stack[-1][0] == "object":
+                    state = "key"
+                else:
+                    stack[-1][1] += 1
+                    state = "value"
+            else:
+                stack.pop()
+                value_done = True
+        pos = token_end
+
+        if value_done:
+            if capture_start is not None and len(stack) == capture_depth:
+                return json.loads(buffer[capture_start:pos]), bytes_read
+            if not stack:
+                raise KeyError(tuple(path))
+            state = "comma_or_end"
+
+
+def find_string_end(buffer, start, resume=None):
+    """Index just past the closing quote of the string at start, or None."""
+    i = start + 1 if resume is None else resume
+    while True:
+        i = buffer.find('"', i)
+        if i == -1:
+            return None
+        backslashes = 0
+        while buffer[i - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return i + 1
+        i += 1
@@ -0,0 +1,42 @@
+import struct
+
+BOX_HEADER = struct.Struct(">I4s")
+
+
+def iter_boxes(fetch, start, end):
+    """Yield (type, payload offset, payload end) of the boxes in a range.
+
+    :param fetch: Callable (offset, length) -> bytes over the file.
+    """
+    offset = start
+    while offset + BOX_HEADER.size <= end:
+        header = fetch(offset, 16)
+        box_size, box_type = BOX_HEADER.unpack_from(header)
+        header_size = BOX_HEADER.size
+        if box_size == 1:
+            box_size = struct.unpack_from(">Q", header, 8)[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header_size:
+            return
+        yield box_type, offset + header_size, offset + box_size
+        offset += box_size
+
+
+def find_box(fetch, box_type, start, end):
+    """Return (payload offset, payload end) of the first box_type in a range."""
+    for found_type, payload_start, payload_end in iter_boxes(fetch, start, end):
+        if found_type == box_type:
+            return payload_start, payload_end
+    return None
+
+
+def find_path(fetch, box_types, start, end):
+    """Return the payload range of nested boxes, e.g. (b"minf", b"stbl")."""
+    for box_type in box_types:
+        box = find_box(fetch, box_type, start, end)
+        if box is None:
+            return None
+        start, end = box
+    return start, end
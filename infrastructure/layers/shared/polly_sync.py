@@ -0,0 +1,234 @@
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+SENTENCE_END = re.compile(r"(?<=[.?!])\s+")
+# Spoken after the summary in the speech marks, but not in the narration.
+TRAILER = "This video is generated by Video Summarization Hub."
+
+# Bitrates in kbit/s by [MPEG-1][bitrate index] for Layer III.
+MP3_BITRATES = (
+    (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0),
+    (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0),
+)
+# Sample rates by MPEG version bits (2.5, reserved, 2, 1) and rate index.
+MP3_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+
+def summary_audio_key(taskId):
+    """Key of the summary audio that text2speech stores in the audio bucket."""
+    return taskId + "-summary.mp3"
+
+
+def split_text(text, max_chars=2500):
+    """Split text on sentence boundaries into chunks of at most max_chars.
+
+    Synchronous synthesis accepts up to 3000 billed characters per request,
+    so the default leaves room for SSML markup. A sentence longer than
+    max_chars is split between words.
+    """
+    chunks = []
+    current = ""
+    for piece in split_sentences(text, max_chars):
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = piece if not current else current + " " + piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_sentences(text, max_chars=2500):
+    """Split text into sentences, and sentences longer than max_chars."""
+    return [
+        piece
+        for sentence in SENTENCE_END.split(text.strip())
+        for piece in split_long(sentence, max_chars)
+        if piece
+    ]
+
+
+def split_long(sentence, max_chars):
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    current = ""
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = ""
+        current = word if not current else current + " " + word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def synthesize_all(synthesize, requests, max_workers=8, cache=None):
+    """Run synthesize on every request concurrently, keeping the order.
+
+    :param synthesize: Callable that turns one request into audio or speech
+                       mark bytes, e.g. polly_synthesize().
+    :param requests: List of requests, or a generator, whose requests are
+                     each submitted as soon as they are produced.
+    :param cache: Optional TtsCache. Requests found in it are not synthesized,
+                  so they must hold every parameter that affects the output.
+    """
+    if isinstance(requests, list):
+        if not requests:
+            return []
+        max_workers = min(max_workers, len(requests))
+    if cache is not None:
+        synthesize = cache.wrap(synthesize)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return list(pool.map(synthesize, requests))
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+class TtsCache:
+    """Synthesis results in S3, keyed by a hash of the whole request.
+
+    With one sentence per request, an edited summary only needs the
+    sentences that changed to be synthesized again.
+    """
+
+    def __init__(self, s3_client, bucket, prefix="tts-cache/"):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, request):
+        request = dict(request, Text=normalize_text(request["Text"]))
+        return (
+            self.prefix
+            + hashlib.sha256(
+                json.dumps(request, sort_keys=True).encode("utf-8")
+            ).hexdigest()
+        )
+
+    def wrap(self, synthesize):
+        def cached_synthesize(request):
+            key = self.key(request)
+            data = self.get(key)
+            with self.lock:
+                if data is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if data is None:
+                data = synthesize(dict(request, Text=normalize_text(request["Text"])))
+                self.s3_client.put_object(Body=data, Bucket=self.bucket, Key=key)
+            return data
+
+        return cached_synthesize
+
+    def get(self, key):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return response["Body"].read()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def polly_synthesize(polly_client, **common):
+    """Synchronous synthesis of one request, given as a dict of parameters."""
+
+    def synthesize(request):
+        response = polly_client.synthesize_speech(**common, **request)
+        return response["AudioStream"].read()
+
+    return synthesize
+
+
+def mp3_duration_ms(data):
+    """Duration of an MP3 stream, from the headers of all its frames."""
+    position = skip_id3(data)
+    samples = 0
+    sample_rate = None
+    while position + 4 <= len(data):
+        header = int.from_bytes(data[position : position + 4], "big")
+        if header >> 21 != 0x7FF:
+            position += 1
+            continue
+        version = (header >> 19) & 3
+        layer = (header >> 17) & 3
+        bitrate_index = (header >> 12) & 15
+        rate_index = (header >> 10) & 3
+        padding = (header >> 9) & 1
+        if version == 1 or layer != 1 or rate_index == 3 or bitrate_index in (0, 15):
+            position += 1
+            continue
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES[mpeg1][bitrate_index] * 1000
+        sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+        frame_samples = 1152 if mpeg1 else 576
+        frame_length = frame_samples // 8 * bitrate // sample_rate + padding
+        samples += frame_samples
+        position += frame_length
+    if sample_rate is None:
+        return 0
+    return samples * 1000 // sample_rate
+
+
+def skip_id3(data):
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = size << 7 | byte & 0x7F
+    return 10 + size
+
+
+def concat_mp3(parts):
+    # MP3 frames are self-contained, so the streams can simply be joined once
+    # the ID3 tags of all but the first part are removed.
+    return b"".join(
+        part if i == 0 else part[skip_id3(part) :] for i, part in enumerate(parts)
+    )
+
+
+def rebase_speech_marks(mark_parts, durations_ms, texts, separator=" "):
+    """Join the speech marks of consecutive chunks into one stream.
+
+    Times are shifted by the audio duration of all earlier chunks, and the
+    start and end byte offsets by the UTF-8 length of all earlier texts, as
+    if the texts had been synthesized joined by separator.
+
+    :param mark_parts: Speech mark bytes of each chunk, one JSON per line.
+    :return: Speech marks of the whole text, one JSON per line.
+    """
+    lines = []
+    time_offset = 0
+    byte_offset = 0
+    for marks, duration_ms, text in zip(mark_parts, durations_ms, texts):
+        for line in marks.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            mark = json.loads(line)
+            mark["time"] += time_offset
+            if "start" in mark:
+                mark["start"] += byte_offset
+                mark["end"] += byte_offset
+            lines.append(json.dumps(mark, ensure_ascii=False, separators=(",", ":")))
+        time_offset += duration_ms
+        byte_offset += len((text + separator).encode("utf-8"))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,92 @@
+import re
+from array import array
+
+TIMING_LINE = re.compile(
+    r"(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})"
+)
+SENTENCE_ENDINGS = (".", "?", "!")
+
+
+def iter_lines(body, chunk_size=65536):
+    """Decode an SRT body line by line as it is read.
+
+    :param body: S3 StreamingBody, or anything else with iter_lines().
+    """
+    first = True
+    for line in body.iter_lines(chunk_size=chunk_size):
+        yield line.decode("utf-8-sig" if first else "utf-8")
+        first = False
+
+
+def iter_cues(lines):
+    """Yield (start_ms, end_ms, text) for every cue of an SRT document.
+
+    Text lines of a multi-line cue are joined with a space. The numeric cue
+    counter is optional, and cues without a timing line are skipped.
+    """
+    for start_ms, end_ms, text_lines in iter_cue_lines(lines):
+        yield start_ms, end_ms, " ".join(text_lines)
+
+
+def iter_cue_lines(lines):
+    """Like iter_cues, but yield the text lines of each cue as a list."""
+    timing = None
+    text = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if timing is not None:
+                yield timing[0], timing[1], text
+            timing = None
+            text = []
+            continue
+        if timing is None:
+            match = TIMING_LINE.match(line)
+            if match:
+                values = [int(value) for value in match.groups()]
+                timing = (to_ms(*values[:4]), to_ms(*values[4:]))
+            continue
+        text.append(line)
+    if timing is not None:
+        yield timing[0], timing[1], text
+
+
+def read_sentences(lines):
+    """Merge SRT cues into sentences in a single pass.
+
+    A sentence ends with the first cue whose text ends in ".", "?" or "!", or
+    with the last cue. It starts at its first cue and ends at its last one.
+
+    :param lines: Iterable of decoded SRT lines, for example from iter_lines().
+    :return: Tuple of (sentences, start_ms, end_ms), where the times are
+             int64 arrays aligned with the list of sentences.
+    """
+    sentences = []
+    start_ms = array("q")
+    end_ms = array("q")
+
+    parts = []
+    sentence_start = None
+    sentence_end = None
+    for cue_start, cue_end, text in iter_cues(lines):
+        if sentence_start is None:
+            sentence_start = cue_start
+        sentence_end = cue_end
+        if text:
+            parts.append(text)
+        if text.endswith(SENTENCE_ENDINGS):
+            sentences.append(" ".join(parts))
+            start_ms.append(sentence_start)
+            end_ms.append(sentence_end)
+            parts = []
+            sentence_start = None
+    if sentence_start is not None:
+        sentences.append(" ".join(parts))
+        start_ms.append(sentence_start)
+        end_ms.append(sentence_end)
+
+    return sentences, start_ms, end_ms
+
+
+def to_ms(hours, minutes, seconds, milliseconds):
+    return hours * 3600000 + minutes * 60000 + seconds * 1000 + milliseconds
@@ -0,0 +1,152 @@
+import json
+import re
+import time
+
+# A sentence ends at ".", "?" or "!" followed by whitespace, so the end is
+# only known once the next character has arrived.
+SENTENCE_END = re.compile(r"[.?!]+[\"')\]]*\s+")
+
+
+def stream_key(taskId):
+    return taskId + "-summary.stream"
+
+
+def iter_completion_text(event_stream):
+    """Yield the completion text of each event of a Bedrock response stream.
+
+    :param event_stream: response["body"] of invoke_model_with_response_stream,
+                         or a list of recorded events of the same shape.
+    """
+    for event in event_stream:
+        if "chunk" not in event:
+            # Errors inside the stream arrive as events such as
+            # {"throttlingException": {"message": ...}}.
+            name, detail = next(iter(event.items()))
+            raise RuntimeError(f"Bedrock stream error {name}: {detail}")
+        text = json.loads(event["chunk"]["bytes"]).get("completion")
+        if text:
+            yield text
+
+
+class SentenceSplitter:
+    """Turn arbitrary text fragments into complete sentences."""
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, text):
+        """Add a fragment and return the sentences it completed."""
+        self.pending += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.pending):
+            sentence = " ".join(self.pending[start : match.end()].split())
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self.pending = self.pending[start:]
+        return sentences
+
+    def flush(self):
+        """Return the remaining text once the stream has ended."""
+        sentence = " ".join(self.pending.split())
+        self.pending = ""
+        return [sentence] if sentence else []
+
+
+def split_sentences(text):
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+def stream_sentences(event_stream, on_sentence):
+    """Call on_sentence for each sentence as soon as it is complete.
+
+    :return: The whole completion, as it would have been returned by
+             invoke_model.
+    """
+    splitter = SentenceSplitter()
+    parts = []
+    for text in iter_completion_text(event_stream):
+        parts.append(text)
+        for sentence in splitter.feed(text):
+            on_sentence(sentence)
+    for sentence in splitter.flush():
+        on_sentence(sentence)
+    return "".join(parts)
+
+
+class SummaryStreamWriter:
+    """The sentences of a summary that is still being generated, in S3.
+
+    S3 objects cannot be appended to, so the object is written again with
+    every new sentence. Each line is a JSON record: {"sentence": ...} for
+    every sentence in order, then {"end": true} once the summary is complete,
+    or {"error": ...} when summarization failed.
+    """
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.lines = []
+        self.count = 0
+
+    def write(self, sentence):
+        self.append({"sentence": sentence})
+        self.count += 1
+        self.flush()
+
+    def write_text(self, text):
+        """Write all sentences of a text that is already complete at once."""
+        for sentence in split_sentences(text):
+            self.append({"sentence": sentence})
+            self.count += 1
+        self.flush()
+
+    def close(self):
+        self.append({"end": True})
+        self.flush()
+
+    def fail(self, error):
+        self.append({"error": error})
+        self.flush()
+
+    def append(self, record):
+        self.lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.s3_client.put_object(
+            Body="".join(self.lines), Bucket=self.bucket, Key=self.key
+        )
+
+
+def read_sentences(
+    read, poll_seconds=0.5, timeout_seconds=840, sleep=time.sleep, clock=time.monotonic
+):
+    """Yield the sentences of a summary stream as soon as they are written.
+
+    :param read: Callable returning the current bytes of the stream object,
+                 or None while it does not exist yet.
+    :param timeout_seconds: How long to wait for the end of the summary.
+    :raise RuntimeError: When summarization failed.
+    :raise TimeoutError: When the summary did not end in time.
+    """
+    deadline = clock() + timeout_seconds
+    consumed = 0
+    while True:
+        data = read()
+        if data is not None:
+            lines = data.decode("utf-8").splitlines()
+            for line in lines[consumed:]:
+                consumed += 1
+                record = json.loads(line)
+                if "sentence" in record:
+                    yield record["sentence"]
+                elif "error" in record:
+                    raise RuntimeError("Summarization failed: " + record["error"])
+                elif record.get("end"):
+                    return
+        if clock() >= deadline:
+            raise TimeoutError(f"The summary did not end in {timeout_seconds} s")
+        sleep(poll_seconds)
@@ -0,0 +1,181 @@
+import struct
+import sys
+from array import array
+
+# Layout of a transcript artifact:
+#   magic "VSHT", version (u16), column count (u16), header length (u32)
+#   header: per column name length (u8), name, type (u8), item count (u32),
+#           payload offset (u64) and payload length (u64)
+#   payloads, in header order
+# Integer columns are little-endian int32. String columns hold count + 1
+# uint32 end offsets followed by the UTF-8 bytes of all strings. Text columns
+# hold a single UTF-8 string. All offsets let a reader fetch single columns
+# with ranged GETs.
+MAGIC = b"VSHT"
+VERSION = 1
+PREFIX = struct.Struct("<4sHHI")
+COLUMN = struct.Struct("<BIQQ")
+INT32, STRINGS, TEXT = 1, 2, 3
+SENTENCE_ENDINGS = (".", "?", "!")
+
+
+def artifact_key(taskId):
+    return taskId + "-transcript.bin"
+
+
+def build_columns(transcribe_result, subtitle_sentences=None):
+    """Turn a Transcribe JSON result into word and sentence columns.
+
+    Punctuation items are appended to the preceding word. When
+    subtitle_sentences is given, as (sentences, start_ms, end_ms) from
+    srt.read_sentences(), the sentence columns keep those SRT cue boundaries
+    and timings, which getframes aligns against. Otherwise a sentence ends
+    after ".", "?" or "!" and spans from its first word to its last one.
+    """
+    words, word_start_ms, word_end_ms = [], array("i"), array("i")
+    sentences, sentence_start_ms, sentence_end_ms = [], array("i"), array("i")
+    sentence_first_word = None
+    for item in transcribe_result["results"]["items"]:
+        content = item["alternatives"][0]["content"]
+        if item["type"] == "punctuation":
+            if not words:
+                continue
+            words[-1] += content
+        else:
+            words.append(content)
+            word_start_ms.append(round(float(item["start_time"]) * 1000))
+            word_end_ms.append(round(float(item["end_time"]) * 1000))
+            if sentence_first_word is None:
+                sentence_first_word = len(words) - 1
+        if sentence_first_word is not None and words[-1].endswith(SENTENCE_ENDINGS):
+            sentences.append(" ".join(words[sentence_first_word:]))
+            sentence_start_ms.append(word_start_ms[sentence_first_word])
+            sentence_end_ms.append(word_end_ms[-1])
+            sentence_first_word = None
+    if sentence_first_word is not None:
+        sentences.append(" ".join(words[sentence_first_word:]))
+        sentence_start_ms.append(word_start_ms[sentence_first_word])
+        sentence_end_ms.append(word_end_ms[-1])
+
+    if subtitle_sentences is not None:
+        sentences = list(subtitle_sentences[0])
+        sentence_start_ms = array("i", subtitle_sentences[1])
+        sentence_end_ms = array("i", subtitle_sentences[2])
+
+    return {
+        "transcript": transcribe_result["results"]["transcripts"][0]["transcript"],
+        "word_text": words,
+        "word_start_ms": word_start_ms,
+        "word_end_ms": word_end_ms,
+        "sentence_text": sentences,
+        "sentence_start_ms": sentence_start_ms,
+        "sentence_end_ms": sentence_end_ms,
+    }
+
+
+def encode(columns):
+    payloads = []
+    for name, values in columns.items():
+        if isinstance(values, str):
+            payloads.append((name, TEXT, 1, values.encode("utf-8")))
+        elif isinstance(values, array):
+            payloads.append((name, INT32, len(values), little_endian(values)))
+        else:
+            encoded = [value.encode("utf-8") for value in values]
+            ends = array("I")
+            total = 0
+            for value in encoded:
+                total += len(value)
+                ends.append(total)
+            payloads.append(
+                (name, STRINGS, len(values), little_endian(ends) + b"".join(encoded))
+            )
+
+    header_length = sum(
+        1 + len(name.encode("utf-8")) + COLUMN.size for name, _, _, _ in payloads
+    )
+    offset = PREFIX.size + header_length
+    header = b""
+    for name, column_type, count, payload in payloads:
+        encoded_name = name.encode("utf-8")
+        header += struct.pack("<B", len(encoded_name)) + encoded_name
+        header += COLUMN.pack(column_type, count, offset, len(payload))
+        offset += len(payload)
+
+    return (
+        PREFIX.pack(MAGIC, VERSION, len(payloads), header_length)
+        + header
+        + b"".join(payload for _, _, _, payload in payloads)
+    )
+
+
+def read_columns(fetch, names, prefetch=4096):
+    """Read only the named columns of an artifact.
+
+    :param fetch: Callable (offset, length) -> bytes over the artifact.
+    :param names: Column names to load.
+    :param prefetch: Bytes read up front, which normally covers the header.
+    :return: Dictionary from column name to a str, a list of str or an int
+             array, depending on the column type.
+    """
+    head = fetch(0, prefetch)
+    magic, version, column_count, header_length = PREFIX.unpack_from(head)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 transcript artifact")
+    if len(head) < PREFIX.size + header_length:
+        head += fetch(len(head), PREFIX.size + header_length - len(head))
+
+    position = PREFIX.size
+    index = {}
+    for _ in range(column_count):
+        name_length = head[position]
+        name = head[position + 1 : position + 1 + name_length].decode("utf-8")
+        position += 1 + name_length
+        index[name] = COLUMN.unpack_from(head, position)
+        position += COLUMN.size
+
+    columns = {}
+    for name in names:
+        column_type, count, offset, length = index[name]
+        payload = fetch(offset, length) if length else b""
+        columns[name] = decode_column(column_type, count, payload)
+    return columns
+
+
+def decode_column(column_type, count, payload):
+    if column_type == TEXT:
+        return payload.decode("utf-8")
+    if column_type == INT32:
+        return from_little_endian("i", payload)
+    ends = from_little_endian("I", payload[: 4 * count])
+    data = payload[4 * count :]
+    values = []
+    start = 0
+    for end in ends:
+        values.append(data[start:end].decode("utf-8"))
+        start = end
+    return values
+
+
+def s3_fetch(s3_client, bucket, key):
+    def fetch(offset, length):
+        return s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}"
+        )["Body"].read()
+
+    return fetch
+
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode, payload):
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
@@ -0,0 +1,139 @@
+import json
+import importlib.util
+import sys
+import threading
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+FUNCTIONS = Path(__file__).resolve().parents[1] / "functions"
+LAYERS = Path(__file__).resolve().parents[1] / "layers"
+
+# Modules of the layers are importable by their plain names, as they are in
+# the Lambda runtime.
+for layer in sorted(LAYERS.iterdir()):
+    if str(layer) not in sys.path:
+        sys.path.insert(0, str(layer))
+
+import polly_sync  # noqa: E402
+
+
+def load_module(function, module):
+    """Import a module of a Lambda function the way its handler sees it.
+
+    Every function directory is its own import root and several of them hold
+    an app.py, so the module is registered under "<function>.<module>" while
+    its sibling modules stay importable by their plain names.
+    """
+    function_path = str(FUNCTIONS / function)
+    if function_path not in sys.path:
+        sys.path.insert(0, function_path)
+    name = f"{function}.{module}"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            name, FUNCTIONS / function / f"{module}.py"
+        )
+        sys.modules[name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[name])
+    return sys.modules[name]
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def iter_lines(self, chunk_size=1024):
+        return iter(self.data.splitlines())
+
+
+class FakeS3:
+    """The objects of every bucket in memory, with the calls the tests use."""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+        self.puts = 0
+        self.lock = threading.Lock()
+
+    def get_object(self, Bucket, Key, Range=None):
+        with self.lock:
+            self.gets += 1
+            if (Bucket, Key) not in self.objects:
+                raise client_error("NoSuchKey")
+            data = self.objects[Bucket, Key]
+        if Range is not None:
+            first, last = (int(value) for value in Range[len("bytes=") :].split("-"))
+            if first >= len(data):
+                raise client_error("InvalidRange")
+            data = data[first : last + 1]
+        return {"Body": FakeBody(data)}
+
+    def put_object(self, Body, Bucket, Key, **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        with self.lock:
+            self.puts += 1
+            self.objects[Bucket, Key] = bytes(Body)
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "operation")
+
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417 bytes and 1152 samples a frame.
+FRAME = bytes.fromhex("fffb9000") + bytes(413)
+FRAME_MS = 1152 * 1000 / 44100
+
+
+def id3(payload):
+    size = len(payload)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + payload
+
+
+def marks(*entries):
+    return "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+
+
+class FakePolly:
+    """One MP3 frame per word, or for all of an SSML text, and a sentence mark
+    per sentence of the text."""
+
+    def __init__(self):
+        self.requests = []
+
+    def synthesize_speech(self, **request):
+        self.requests.append(request)
+        text = request["Text"]
+        if request["OutputFormat"] == "mp3":
+            words = 1 if request.get("TextType") == "ssml" else len(text.split())
+            data = id3(b"tag") + FRAME * words
+        else:
+            entries = []
+            time = 0
+            start = 0
+            for sentence in polly_sync.split_sentences(text):
+                start = text.index(sentence, start)
+                end = start + len(sentence.encode("utf-8"))
+                entries.append(
+                    {
+                        "time": time,
+                        "type": "sentence",
+                        "start": start,
+                        "end": end,
+                        "value": sentence,
+                    }
+                )
+                time += round(len(sentence.split()) * FRAME_MS)
+                start = end
+            data = marks(*entries)
+        return {"AudioStream": FakeBody(data)}
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+from conftest import load_module
+
+alignment = load_module("getframes", "alignment")
+similarity = load_module("getframes", "similarity")
+
+
+def triple_loop_alignment(similarity_matrix):
+    """The O(M * N^2) alignment getframes used before the alignment module."""
+    len_summarized_sentences, len_original_sentences = similarity_matrix.shape
+    dp = np.zeros([len_summarized_sentences, len_original_sentences], dtype=float)
+    for i in range(0, len_summarized_sentences):
+        for j in range(0, len_original_sentences):
+            if i == 0:
+                dp[i][j] = similarity_matrix[i][j]
+            else:
+                max_score = -1
+                for k in range(0, j):
+                    if similarity_matrix[i][j] > 0 and dp[i - 1][k] > 0:
+                        max_score = max(
+                            max_score, similarity_matrix[i][j] + dp[i - 1][k]
+                        )
+                dp[i][j] = max_score
+
+    best_matching_indices = []
+    j = len_original_sentences
+    for i in range(min(len_original_sentences, len_summarized_sentences) - 1, -1, -1):
+        arr = dp[i][:j]
+        idx = np.argmax(arr)
+        best_matching_indices.append(idx)
+        j = idx
+    best_matching_indices.reverse()
+    return best_matching_indices
+
+
+def random_cases(count, max_sentences=30):
+    """Random similarity matrices the triple loop can backtrack through.
+
+    The triple loop fails on an empty slice when a path runs into the first
+    original sentence before the first summary sentence, so those matrices
+    are skipped rather than compared.
+    """
+    rng = np.random.default_rng(20240501)
+    cases = []
+    while len(cases) < count:
+        m = int(rng.integers(1, max_sentences))
+        n = int(rng.integers(1, max_sentences))
+        # Mostly positive similarities, like sentence embeddings, with
+        # enough negative cells to exercise the unreachable ones.
+        matrix = rng.uniform(-0.3, 1.0, size=(m, n))
+        try:
+            expected = triple_loop_alignment(matrix)
+        except ValueError:
+            continue
+        cases.append((matrix, [int(i) for i in expected]))
+    return cases
+
+
+CASES = random_cases(200)
+
+
+@pytest.mark.parametrize("matrix, expected", CASES)
+def test_full_matrix_matches_triple_loop(matrix, expected):
+    assert alignment.best_matching_indices(matrix) == expected
+
+
+@pytest.mark.parametrize("tile_size", [1, 3, 7, 64])
+def test_tiles_match_triple_loop(tile_size):
+    for matrix, expected in CASES:
+        tiles = (
+            matrix[:, start : start + tile_size]
+            for start in range(0, matrix.shape[1], tile_size)
+        )
+        assert (
+            alignment.best_matching_indices_from_tiles(tiles, *matrix.shape) == expected
+        )
+
+
+def test_similarity_tiles_match_triple_loop():
+    rng = np.random.default_rng(7)
+    compared = 0
+    for _ in range(100):
+        m, n = (int(size) for size in rng.integers(1, 40, size=2))
+        summarized = similarity.normalize_embeddings(rng.normal(size=(m, 16)) + 0.5)
+        original = similarity.normalize_embeddings(rng.normal(size=(n, 16)) + 0.5)
+        try:
+            expected = triple_loop_alignment(summarized @ original.T)
+        except ValueError:
+            continue
+        tiles = similarity.similarity_tiles(summarized, original, tile_size=5)
+        assert alignment.best_matching_indices_from_tiles(tiles, m, n) == expected
+        compared += 1
+    assert compared > 50
+
+
+@pytest.mark.parametrize("extra_band", [0, 5])
+def test_band_covering_transcript_matches_triple_loop(extra_band):
+    rng = np.random.default_rng(11)
+    compared = 0
+    for _ in range(100):
+        m, n = (int(size) for size in rng.integers(1, 40, size=2))
+        summarized = rng.normal(size=(m, 16)) + 0.5
+        original = rng.normal(size=(n, 16)) + 0.5
+        matrix = (
+            similarity.normalize_embeddings(summarized)
+            @ similarity.normalize_embeddings(original).T
+        )
+        try:
+            expected = triple_loop_alignment(matrix)
+        except ValueError:
+            continue
+        assert (
+            alignment.banded_best_matching_indices(
+                summarized, original, band=n + extra_band
+            )
+            == expected
+        )
+        compared += 1
+    assert compared > 50
+
+
+def test_empty_inputs():
+    assert alignment.best_matching_indices(np.zeros((0, 4))) == []
+    assert alignment.best_matching_indices(np.zeros((4, 0))) == []
+    assert (
+        alignment.banded_best_matching_indices(
+            np.zeros((0, 3)), np.ones((4, 3)), band=2
+        )
+        == []
+    )
+
+
+def test_normalize_embeddings_leaves_input_unchanged():
+    embeddings = np.array([[3.0, 4.0], [0.0, 0.0]], dtype=np.float32)
+    original = embeddings.copy()
+    normalized = similarity.normalize_embeddings(embeddings)
+    np.testing.assert_array_equal(embeddings, original)
+    np.testing.assert_allclose(normalized, [[0.6, 0.8], [0.0, 0.0]])
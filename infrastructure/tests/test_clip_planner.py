@@ -0,0 +1,44 @@
+from conftest import load_module
+
+clip_planner = load_module("getframes", "clip_planner")
+
+
+def output_frames(clips):
+    return sum(end - start for start, end in clips)
+
+
+def test_touching_ranges_are_merged():
+    clips = clip_planner.plan_clips([[0, 1000], [1000, 2000], [5000, 6000]], 25)
+    assert clips == [(0, 50), (125, 150)]
+
+
+def test_backward_jump_is_not_merged():
+    clips = clip_planner.plan_clips([[5000, 6000], [1000, 2000]], 25)
+    assert clips == [(125, 150), (25, 50)]
+
+
+def test_over_the_limit_merges_the_closest_forward_neighbours():
+    ranges = [[0, 1000], [10000, 11000], [11500, 12000], [40000, 41000]]
+    clips = clip_planner.plan_clips(ranges, 25, max_clips=3)
+    # 1 s + 1.5 s + 1 s of output is 87.5 frames.
+    assert clips == [(0, 25), (250, 287), (1000, 1026)]
+    assert output_frames(clips) == 88
+
+
+def test_over_the_limit_never_merges_far_or_backward_clips():
+    # No neighbours are within a second of each other going forward, so
+    # the shortest clip is dropped and its predecessor plays on.
+    ranges = [[0, 2000], [30000, 30400], [10000, 12000], [50000, 52000]]
+    clips = clip_planner.plan_clips(ranges, 25, max_clips=3)
+    assert clips == [(0, 60), (250, 300), (1250, 1300)]
+    assert output_frames(clips) == 160
+
+
+def test_clip_ends_follow_the_output_time():
+    # Three clips of 1/3 s at 25 fps add up to 25 frames, not 3 * 8.
+    ranges = [[0, 333.3], [1000, 1333.3], [2000, 2333.4]]
+    assert output_frames(clip_planner.plan_clips(ranges, 25)) == 25
+
+
+def test_timecodes_count_frames_at_the_nominal_rate():
+    assert clip_planner.frame_to_timecode(30 * 3661 + 5, 29.97) == "01:01:01:05"
@@ -0,0 +1,198 @@
+import time
+
+import numpy as np
+
+from conftest import FakeS3, load_module
+
+embedding_cache = load_module("getframes", "embedding_cache")
+
+
+class CountingEmbed:
+    """Embeds a text as [len(text), position of the call, 0, ...]."""
+
+    def __init__(self, dimension=8):
+        self.dimension = dimension
+        self.texts = []
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vectors[i, 0] = len(text)
+            vectors[i, 1] = len(self.texts) + i
+        self.texts += texts
+        return vectors
+
+
+class RangeRecordingS3(FakeS3):
+    def __init__(self):
+        super().__init__()
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.ranges.append((Key, Range))
+        return super().get_object(Bucket, Key, Range)
+
+
+def persistent_cache(s3, index):
+    return embedding_cache.EmbeddingCache(
+        store=embedding_cache.S3Store(s3, "transcripts", "embedding-cache/"),
+        index=index,
+    )
+
+
+def test_memory_tier_embeds_each_sentence_once():
+    cache = embedding_cache.EmbeddingCache(max_entries=2)
+    embed = CountingEmbed()
+
+    first = cache.get_or_embed(["One.", "Two.", " One. "], "model", embed)
+    assert embed.texts == ["One.", "Two."]
+    assert np.array_equal(first[0], first[2])
+
+    cache.get_or_embed(["Two.", "Three."], "model", embed)
+    assert embed.texts == ["One.", "Two.", "Three."]
+    assert cache.stats() == {
+        "memory_hits": 1,
+        "persistent_hits": 0,
+        "misses": 1,
+        "packs_read": 0,
+        "memory_entries": 2,
+    }
+    # "One." was evicted and a different model never shares vectors.
+    cache.get_or_embed(["One."], "model", embed)
+    cache.get_or_embed(["One."], "other model", embed)
+    assert embed.texts[3:] == ["One.", "One."]
+
+
+def test_a_task_writes_its_new_vectors_as_one_pack():
+    s3 = FakeS3()
+    index = embedding_cache.InMemoryKeyIndex()
+    cache = persistent_cache(s3, index)
+
+    vectors = cache.get_or_embed(["A.", "B.", "C.", "A."], "model", CountingEmbed())
+
+    assert s3.puts == 1
+    ((bucket, key),) = s3.objects
+    assert key.startswith("embedding-cache/packs/") and key.endswith(".f32")
+    assert len(s3.objects[bucket, key]) == 3 * 8 * 4
+    assert sorted(row for pack, row, dimension in index.entries.values()) == [0, 1, 2]
+    assert vectors.dtype == np.float32 and vectors.shape == (4, 8)
+
+
+def test_a_new_container_reads_only_the_rows_of_its_task():
+    s3 = RangeRecordingS3()
+    index = embedding_cache.InMemoryKeyIndex()
+    writer = persistent_cache(s3, index)
+    embed = CountingEmbed()
+    # Twenty earlier tasks of twenty sentences each.
+    for task in range(20):
+        writer.get_or_embed(
+            [f"Task {task} sentence {i}." for i in range(20)], "model", embed
+        )
+    expected = writer.get_or_embed(
+        ["Task 7 sentence 3.", "Task 7 sentence 5."], "model", embed
+    )
+
+    reader = persistent_cache(s3, index)
+    embed = CountingEmbed()
+    vectors = reader.get_or_embed(
+        ["Task 7 sentence 3.", "Task 7 sentence 5.", "Brand new."], "model", embed
+    )
+
+    assert embed.texts == ["Brand new."]
+    assert np.array_equal(vectors[:2], expected)
+    assert reader.stats()["persistent_hits"] == 2
+    assert reader.stats()["packs_read"] == 1
+    # One ranged read from row 3 to row 5 of a single pack of the 20.
+    ((key, byte_range),) = s3.ranges
+    assert byte_range == f"bytes={3 * 32}-{6 * 32 - 1}"
+
+
+def test_rows_of_a_missing_pack_are_embedded_again():
+    s3 = FakeS3()
+    index = embedding_cache.InMemoryKeyIndex()
+    persistent_cache(s3, index).get_or_embed(["A.", "B."], "model", CountingEmbed())
+    s3.objects.clear()
+
+    embed = CountingEmbed()
+    cache = persistent_cache(s3, index)
+    cache.get_or_embed(["A.", "B."], "model", embed)
+
+    assert embed.texts == ["A.", "B."]
+    assert cache.stats()["persistent_hits"] == 0
+
+
+def test_directory_store_reads_byte_ranges(tmp_path):
+    index = embedding_cache.InMemoryKeyIndex()
+    store = embedding_cache.DirectoryStore(str(tmp_path))
+    embed = CountingEmbed()
+    embedding_cache.EmbeddingCache(store=store, index=index).get_or_embed(
+        ["A.", "B.", "C."], "model", embed
+    )
+
+    cache = embedding_cache.EmbeddingCache(store=store, index=index)
+    vectors = cache.get_or_embed(["C."], "model", CountingEmbed())
+
+    assert vectors[0, 1] == 2
+    assert len(list((tmp_path / "packs").iterdir())) == 1
+
+
+class FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item):
+        self.table.items[Item["EmbeddingKey"]] = Item
+
+
+class FakeDynamoDB:
+    """batch_get_item and Table().batch_writer() of a DynamoDB resource.
+
+    The first request leaves one key unprocessed, as DynamoDB does when it
+    throttles a batch.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.requests = []
+
+    def Table(self, name):
+        return self
+
+    def batch_writer(self):
+        return FakeBatchWriter(self)
+
+    def batch_get_item(self, RequestItems):
+        ((name, request),) = RequestItems.items()
+        keys = [key["EmbeddingKey"] for key in request["Keys"]]
+        assert len(keys) <= 100
+        self.requests.append(keys)
+        unprocessed = {}
+        if len(self.requests) == 1:
+            unprocessed = {name: {"Keys": [{"EmbeddingKey": keys[-1]}]}}
+            keys = keys[:-1]
+        return {
+            "Responses": {name: [self.items[key] for key in keys if key in self.items]},
+            "UnprocessedKeys": unprocessed,
+        }
+
+
+def test_dynamodb_index_batches_lookups_and_skips_expired_items():
+    dynamodb = FakeDynamoDB()
+    index = embedding_cache.DynamoDBKeyIndex(dynamodb, "embedding-index")
+    keys = [f"{i:064x}" for i in range(250)]
+    index.put({key: ("pack", row, 1024) for row, key in enumerate(keys)})
+    dynamodb.items[keys[0]]["ExpireTime"] = int(time.time()) - 1
+
+    entries = index.get(keys + ["f" * 64])
+
+    # Three batches of at most 100 keys, plus the retried unprocessed key.
+    assert [len(request) for request in dynamodb.requests] == [100, 1, 100, 51]
+    assert len(entries) == 249
+    assert entries[keys[99]] == ("pack", 99, 1024)
+    assert keys[0] not in entries
@@ -0,0 +1,91 @@
+import random
+import types
+
+import numpy as np
+import pytest
+
+from conftest import client_error, load_module
+
+embeddings = load_module("getframes", "embeddings")
+
+
+class FailingInvoke:
+    """Raises the given error codes in turn, then returns [len(text)]."""
+
+    def __init__(self, *codes):
+        self.codes = list(codes)
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        if self.codes:
+            raise client_error(self.codes.pop(0))
+        return [len(text)]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the backoff delays instead of sleeping, at the jitter maximum."""
+    delays = []
+    monkeypatch.setattr(embeddings, "time", types.SimpleNamespace(sleep=delays.append))
+    monkeypatch.setattr(
+        embeddings,
+        "random",
+        types.SimpleNamespace(uniform=lambda low, high: high, random=random.random),
+    )
+    return delays
+
+
+def test_throttling_is_retried_with_exponential_backoff(sleeps):
+    invoke = FailingInvoke(
+        "ThrottlingException", "ServiceUnavailableException", "ThrottlingException"
+    )
+
+    assert embeddings.invoke_with_retry(invoke, "abc", base_delay=0.5) == [3]
+    assert invoke.calls == 4
+    assert sleeps == [0.5, 1.0, 2.0]
+
+
+def test_backoff_is_capped_at_max_delay(sleeps):
+    invoke = FailingInvoke(*["TooManyRequestsException"] * 5)
+
+    embeddings.invoke_with_retry(invoke, "abc", base_delay=1, max_delay=3)
+
+    assert sleeps == [1, 2, 3, 3, 3]
+
+
+def test_the_last_throttling_error_is_raised(sleeps):
+    invoke = FailingInvoke(*["ThrottlingException"] * 3)
+
+    with pytest.raises(Exception) as raised:
+        embeddings.invoke_with_retry(invoke, "abc", max_attempts=3)
+
+    assert raised.value.response["Error"]["Code"] == "ThrottlingException"
+    assert invoke.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_other_errors_are_not_retried(sleeps):
+    invoke = FailingInvoke("ValidationException")
+
+    with pytest.raises(Exception):
+        embeddings.invoke_with_retry(invoke, "abc")
+
+    assert invoke.calls == 1
+    assert sleeps == []
+
+
+def test_embed_texts_keeps_the_order_under_throttling(sleeps):
+    texts = [f"Sentence {i}." for i in range(50)]
+    expected = embeddings.embed_texts(
+        texts, embeddings.fake_invoke(dimension=16, latency=0), max_workers=1
+    )
+
+    throttled = embeddings.embed_texts(
+        texts,
+        embeddings.fake_invoke(dimension=16, latency=0, throttle_rate=0.3),
+        max_workers=8,
+        max_attempts=50,
+    )
+
+    assert np.array_equal(throttled, expected)
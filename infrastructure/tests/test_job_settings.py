@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["bucket_videos"] = "videos"
+os.environ["bucket_transcripts"] = "transcripts"
+os.environ["bucket_audio"] = "audio"
+os.environ["bucket_output_videos"] = "output"
+os.environ["media_convert_queue"] = "queue"
+os.environ["iam_role"] = "role"
+os.environ["vsh_dynamodb_table"] = "tasks"
+
+from conftest import FakeS3, load_module
+
+job_settings = load_module("outputvideo", "job_settings")
+app = load_module("outputvideo", "app")
+
+
+@pytest.mark.parametrize(
+    "timecode, frame_rate, ms",
+    [
+        ("00:00:00:00", 24, 0),
+        ("00:00:01:12", 24, 1500),
+        ("01:02:03:00", 25, 3723000),
+        # Frames are counted at the nominal 30 and timed at 29.97.
+        ("00:00:10:00", 29.97, 10010),
+    ],
+)
+def test_timecode_to_ms(timecode, frame_rate, ms):
+    assert job_settings.timecode_to_ms(timecode, frame_rate) == ms
+
+
+def test_single_job_has_one_input_per_clip_shifted_by_source_minus_output():
+    timecodes = [
+        {"StartTimecode": "00:00:10:00", "EndTimecode": "00:00:12:12"},
+        {"StartTimecode": "00:01:00:00", "EndTimecode": "00:01:01:00"},
+        {"StartTimecode": "00:00:05:00", "EndTimecode": "00:00:06:00"},
+    ]
+
+    settings = job_settings.single_job_settings(
+        "s3://videos/v.mp4",
+        "s3://audio/task.mp3",
+        "s3://transcripts/task-summary.srt",
+        timecodes,
+        "s3://output/user/task/",
+    )
+
+    inputs = settings["Inputs"]
+    assert [clip["InputClippings"] for clip in inputs] == [[clip] for clip in timecodes]
+    # Output starts at 0, 2500 and 3500 ms; a later clip may come from an
+    # earlier source time, which makes the shift negative.
+    expected = [10000 - 0, 60000 - 2500, 5000 - 3500]
+    assert [
+        clip["AudioSelectors"]["Audio Selector 1"]["Offset"] for clip in inputs
+    ] == expected
+    assert [
+        clip["CaptionSelectors"]["Captions Selector 1"]["SourceSettings"][
+            "FileSourceSettings"
+        ]["TimeDelta"]
+        for clip in inputs
+    ] == expected
+    assert {clip["FileInput"] for clip in inputs} == {"s3://videos/v.mp4"}
+    (output,) = settings["OutputGroups"][0]["Outputs"]
+    assert "NameModifier" not in output
+    (caption,) = output["CaptionDescriptions"]
+    assert caption["DestinationSettings"]["DestinationType"] == "BURN_IN"
+
+
+class FakeMediaConvert:
+    def __init__(self):
+        self.jobs = []
+
+    def describe_endpoints(self, Mode):
+        return {"Endpoints": [{"Url": "https://mediaconvert"}]}
+
+    def create_job(self, **job):
+        self.jobs.append(job)
+        return {"Job": {"Id": "job"}}
+
+
+def render(monkeypatch, clips, **params):
+    s3 = FakeS3()
+    s3.objects["transcripts", "task.dat"] = "".join(
+        f"00:{i // 60:02d}:{i % 60:02d}:00,00:{i // 60:02d}:{i % 60:02d}:12\n"
+        for i in range(clips)
+    ).encode()
+    mediaconvert = FakeMediaConvert()
+    monkeypatch.setattr(app, "s3_client", s3)
+    monkeypatch.setattr(app.boto3, "client", lambda *args, **kwargs: mediaconvert)
+    monkeypatch.setattr(app, "updateTaskStatus", lambda *args: None)
+    app.lambda_handler(
+        {
+            "TaskToken": "token",
+            "VSHParams": {
+                "video_name": "v.mp4",
+                "userId": "user",
+                "taskId": "task",
+                "PollyAudioParams": {"outputUri": "s3://audio/task.mp3"},
+                **params,
+            },
+        },
+        None,
+    )
+    (job,) = mediaconvert.jobs
+    return job
+
+
+def test_single_mode_renders_in_one_job(monkeypatch):
+    job = render(monkeypatch, job_settings.MAX_INPUTS, render_mode="single")
+
+    assert job["UserMetadata"] == {"TaskId": "task", "RenderMode": "single"}
+    assert len(job["Settings"]["Inputs"]) == job_settings.MAX_INPUTS
+
+
+def test_single_mode_falls_back_to_two_passes_above_max_inputs(monkeypatch):
+    job = render(monkeypatch, job_settings.MAX_INPUTS + 1, render_mode="single")
+
+    assert job["UserMetadata"] == {"TaskId": "task", "RenderMode": "two_pass"}
+    (clip_input,) = job["Settings"]["Inputs"]
+    assert len(clip_input["InputClippings"]) == job_settings.MAX_INPUTS + 1
+    assert job["Settings"]["OutputGroups"][0]["Outputs"][0]["NameModifier"] == "_raw"
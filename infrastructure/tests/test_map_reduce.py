@@ -0,0 +1,101 @@
+import pytest
+
+from conftest import load_module
+
+map_reduce = load_module("summarizetext", "map_reduce")
+
+# Every sentence is 8 estimated tokens.
+TEXT = " ".join(f"Sentence {i:02d} has a few words." for i in range(24))
+
+
+def prompt_body(prompt):
+    """The transcript part or the joined partials inside a prompt."""
+    return prompt.split(":\n\n    ", 1)[1].split("\n\n    \n\n", 1)[0]
+
+
+class FakeModel:
+    """Summarizes a part as "S<first sentence number>" and combines summaries
+    as "R(<summaries>)", padding map results to partial_chars characters."""
+
+    def __init__(self, partial_chars=0):
+        self.partial_chars = partial_chars
+        self.maps = []
+        self.reduces = []
+
+    def __call__(self, prompt):
+        body = prompt_body(prompt)
+        if "one part of the transcript" in prompt:
+            self.maps.append(body)
+            return f"S{body.split()[1]}".ljust(self.partial_chars, ".")
+        partials = body.split("\n\n")
+        self.reduces.append(partials)
+        return "R(" + ",".join(partial.rstrip(".") for partial in partials) + ")"
+
+
+def test_a_text_that_fits_one_chunk_is_summarized_as_a_whole():
+    model = FakeModel()
+    final = []
+
+    summary = map_reduce.summarize(
+        TEXT,
+        model,
+        chunk_tokens=1000,
+        whole_prompt=lambda text: "whole video: " + text,
+        final_complete=lambda prompt: final.append(prompt) or "Summary.",
+    )
+
+    assert summary == "Summary."
+    assert final == ["whole video: " + TEXT]
+    assert model.maps == model.reduces == []
+
+
+def test_chunks_are_mapped_then_reduced_in_order():
+    model = FakeModel()
+    final = []
+
+    def final_complete(prompt):
+        final.append(prompt)
+        return model(prompt)
+
+    summary = map_reduce.summarize(
+        TEXT, model, chunk_tokens=48, final_complete=final_complete
+    )
+
+    # Six sentences of 8 tokens fit a budget of 48.
+    assert [chunk.split()[1] for chunk in model.maps] == ["00", "06", "12", "18"]
+    assert model.reduces == [["S00", "S06", "S12", "S18"]]
+    assert summary == "R(S00,S06,S12,S18)"
+    assert len(final) == 1 and prompt_body(final[0]) == "S00\n\nS06\n\nS12\n\nS18"
+
+
+def test_partials_over_the_budget_are_reduced_in_groups():
+    # Each partial is 21 tokens, so two of them fit a budget of 48.
+    model = FakeModel(partial_chars=80)
+
+    summary = map_reduce.summarize(TEXT, model, chunk_tokens=48, max_workers=1)
+
+    assert len(model.maps) == 4
+    assert [len(partials) for partials in model.reduces] == [2, 2, 2]
+    assert summary == "R(R(S00,S06),R(S12,S18))"
+
+
+@pytest.mark.parametrize(
+    "partials, groups",
+    [
+        (["a" * 40] * 3, [["a" * 40] * 2, ["a" * 40]]),
+        # Partials over the budget are still combined two at a time.
+        (["a" * 400] * 3, [["a" * 400] * 2, ["a" * 400]]),
+    ],
+)
+def test_group_partials_always_shrinks_the_list(partials, groups):
+    assert map_reduce.group_partials(partials, 30) == groups
+
+
+def test_chunks_keep_sentences_whole_unless_a_sentence_is_too_long():
+    long_sentence = " ".join(["word"] * 40) + "."
+    chunks = map_reduce.split_into_chunks("Short one. " + long_sentence, 20)
+
+    assert chunks[0] == "Short one."
+    assert len(chunks) > 2
+    assert " ".join(chunks) == "Short one. " + long_sentence
+    assert all(map_reduce.estimate_tokens(chunk) <= 20 for chunk in chunks)
@@ -0,0 +1,79 @@
+import struct
+
+import mp4_boxes
+from conftest import load_module
+
+media_info = load_module("stepfunction", "media_info")
+media_segments = load_module("transcribe", "media_segments")
+
+
+def box(box_type, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), box_type) + data
+
+
+def large_box(box_type, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4sQ", 1, box_type, 16 + len(data)) + data
+
+
+def track(handler, timescale, stts):
+    return box(
+        b"trak",
+        box(
+            b"mdia",
+            box(b"mdhd", struct.pack(">4xIII", 0, 0, timescale), bytes(8)),
+            box(b"hdlr", bytes(8), handler, bytes(12)),
+            box(
+                b"minf",
+                box(
+                    b"stbl",
+                    box(
+                        b"stts",
+                        struct.pack(">4xI", len(stts)),
+                        *(struct.pack(">II", *entry) for entry in stts),
+                    ),
+                ),
+            ),
+        ),
+    )
+
+
+# An audio track before the video track, and the movie header giving 90 s.
+MP4 = (
+    box(b"ftyp", b"isom", bytes(4))
+    + large_box(b"mdat", bytes(64))
+    + box(
+        b"moov",
+        box(b"mvhd", struct.pack(">4xIIII", 0, 0, 1000, 90000), bytes(80)),
+        track(b"soun", 48000, [(100, 1024)]),
+        track(b"vide", 30000, [(2, 1002), (2000, 1001)]),
+    )
+)
+
+
+def fetch(offset, length):
+    return MP4[offset : offset + length]
+
+
+def test_iter_boxes_reads_top_level_boxes_with_64_bit_sizes():
+    boxes = list(mp4_boxes.iter_boxes(fetch, 0, len(MP4)))
+    assert [box_type for box_type, _, _ in boxes] == [b"ftyp", b"mdat", b"moov"]
+    _, mdat_start, mdat_end = boxes[1]
+    assert mdat_end - mdat_start == 64
+    assert boxes[2][2] == len(MP4)
+
+
+def test_find_path_and_missing_boxes():
+    moov = mp4_boxes.find_box(fetch, b"moov", 0, len(MP4))
+    assert mp4_boxes.find_path(fetch, (b"trak", b"mdia", b"minf"), *moov)
+    assert mp4_boxes.find_path(fetch, (b"trak", b"edts"), *moov) is None
+    assert mp4_boxes.find_box(fetch, b"free", 0, len(MP4)) is None
+
+
+def test_frame_rate_of_the_video_track():
+    assert media_info.mp4_frame_rate(fetch, len(MP4)) == 30000 / 1001
+
+
+def test_duration_from_the_movie_header():
+    assert media_segments.mp4_duration_ms(fetch, len(MP4)) == 90000
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from conftest import client_error
+import notify
+
+
+class FakeApiGateway:
+    """post_to_connection, failing with errors[connection ID] if given."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = {}
+
+    def post_to_connection(self, ConnectionId, Data):
+        if ConnectionId in self.errors:
+            raise client_error(self.errors[ConnectionId])
+        self.sent.setdefault(ConnectionId, []).append(json.loads(Data))
+
+
+@pytest.fixture
+def store():
+    store = notify.InMemoryConnectionStore()
+    store.add("alice-laptop", "alice")
+    store.add("alice-phone", "alice")
+    store.add("bob-laptop", "bob")
+    return store
+
+
+def use_notifier(monkeypatch, store, api):
+    monkeypatch.setattr(
+        notify, "notifier", notify.Notifier(store, notify.api_gateway_sender(api))
+    )
+
+
+def test_events_reach_only_the_connections_of_the_task_owner(monkeypatch, store):
+    api = FakeApiGateway()
+    use_notifier(monkeypatch, store, api)
+
+    notify.publish_task_event("alice", "task", "Transcribe", progress=50)
+
+    event = notify.task_event("task", "Transcribe", progress=50)
+    assert api.sent == {"alice-laptop": [event], "alice-phone": [event]}
+
+
+def test_gone_connections_are_pruned(monkeypatch, store):
+    api = FakeApiGateway({"alice-phone": "GoneException"})
+    use_notifier(monkeypatch, store, api)
+
+    assert notify.notifier.publish("alice", {"type": "ping"}) == 1
+    assert store.connections("alice") == ["alice-laptop"]
+    assert store.connections("bob") == ["bob-laptop"]
+
+
+class BrokenStore:
+    def connections(self, userId):
+        raise client_error("ProvisionedThroughputExceededException")
+
+
+def test_a_store_error_never_raises_into_the_caller(monkeypatch, caplog):
+    use_notifier(monkeypatch, BrokenStore(), FakeApiGateway())
+
+    notify.publish_task_event("alice", "task", "Summarize")
+
+    assert "Could not publish the Summarize event of task task" in caplog.text
+
+
+def test_a_send_error_never_raises_into_the_caller(monkeypatch, caplog, store):
+    api = FakeApiGateway({"alice-phone": "LimitExceededException"})
+    use_notifier(monkeypatch, store, api)
+
+    notify.publish_task_event("alice", "task", "Summarize")
+
+    assert "LimitExceededException" in caplog.text
+
+
+def test_no_websocket_endpoint_means_no_notifier(monkeypatch):
+    monkeypatch.setattr(notify, "notifier", None)
+    monkeypatch.delenv("websocket_endpoint", raising=False)
+
+    assert notify.get_notifier() is None
+    notify.publish_task_event("alice", "task", "Transcribe")
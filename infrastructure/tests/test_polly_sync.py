@@ -0,0 +1,126 @@
+import json
+import os
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["bucket_audio"] = "audio"
+os.environ["bucket_transcripts"] = "transcripts"
+os.environ["embedding_index_table"] = "embedding-index"
+os.environ["bedrock_endpoint_region"] = "us-east-1"
+
+import polly_sync
+from conftest import FRAME, FRAME_MS, FakePolly, FakeS3, id3, load_module, marks
+
+text2speech = load_module("text2speech", "app")
+getframes = load_module("getframes", "app")
+
+
+def test_mp3_duration_skips_id3_and_counts_frames():
+    assert polly_sync.mp3_duration_ms(FRAME * 10) == int(10 * FRAME_MS)
+    assert polly_sync.mp3_duration_ms(id3(bytes(100)) + FRAME * 10) == int(
+        10 * FRAME_MS
+    )
+    assert polly_sync.mp3_duration_ms(b"") == 0
+
+
+def test_concat_mp3_keeps_only_the_first_id3_tag():
+    parts = [id3(b"first") + FRAME * 2, id3(b"second") + FRAME * 3, FRAME]
+    joined = polly_sync.concat_mp3(parts)
+    assert joined == id3(b"first") + FRAME * 6
+    assert polly_sync.mp3_duration_ms(joined) == int(6 * FRAME_MS)
+
+
+def test_rebase_speech_marks_shifts_times_and_byte_offsets():
+    texts = ["Héllo there.", "Second chunk."]
+    parts = [
+        marks({"time": 0, "type": "sentence", "start": 0, "end": 13, "value": "a"}),
+        marks(
+            {"time": 0, "type": "sentence", "start": 0, "end": 13, "value": "b"},
+            {"time": 50, "type": "viseme", "value": "p"},
+        ),
+    ]
+    lines = polly_sync.rebase_speech_marks(parts, [700, 400], texts).splitlines()
+    rebased = [json.loads(line) for line in lines]
+    # "Héllo there. " is 14 bytes in UTF-8.
+    assert rebased == [
+        {"time": 0, "type": "sentence", "start": 0, "end": 13, "value": "a"},
+        {"time": 700, "type": "sentence", "start": 14, "end": 27, "value": "b"},
+        {"time": 750, "type": "viseme", "value": "p"},
+    ]
+
+
+def test_split_text_keeps_sentences_under_the_limit():
+    text = "One two three. Four five six seven. Eight."
+    assert polly_sync.split_text(text, 20) == [
+        "One two three.",
+        "Four five six seven.",
+        "Eight.",
+    ]
+    assert polly_sync.split_text(text, 60) == [text]
+    assert polly_sync.split_sentences("aaa bbb ccc.", 7) == ["aaa bbb", "ccc."]
+
+
+def test_speech_marks_store_the_summary_audio_without_the_trailer(monkeypatch):
+    s3 = FakeS3()
+    polly = FakePolly()
+    monkeypatch.setattr(text2speech, "s3_client", s3)
+    monkeypatch.setattr(text2speech, "polly_client", polly)
+
+    summary = "First sentence here. Second one."
+    uri = text2speech.create_speech_marks_sync(
+        polly_sync.split_text(summary), "audio", "Joanna", "task"
+    )
+
+    assert uri == "s3://audio/task.marks"
+    speech_marks = [
+        json.loads(line) for line in s3.objects["audio", "task.marks"].splitlines()
+    ]
+    assert [mark["value"] for mark in speech_marks] == [
+        "First sentence here.",
+        "Second one.",
+        polly_sync.TRAILER,
+    ]
+    # The trailer starts after the five words of the summary.
+    assert speech_marks[2]["time"] == int(5 * FRAME_MS)
+    assert speech_marks[2]["start"] == len(summary) + 1
+    summary_audio = s3.objects["audio", polly_sync.summary_audio_key("task")]
+    assert polly_sync.mp3_duration_ms(summary_audio) == int(5 * FRAME_MS)
+
+
+def test_narration_only_synthesizes_the_intro_with_stored_summary_audio(
+    monkeypatch,
+):
+    s3 = FakeS3()
+    polly = FakePolly()
+    monkeypatch.setattr(getframes, "s3_client", s3)
+    monkeypatch.setattr(getframes, "polly_client", polly)
+    s3.put_object(
+        Body=id3(b"summary") + FRAME * 5,
+        Bucket="audio",
+        Key=polly_sync.summary_audio_key("task"),
+    )
+
+    uri = getframes.generate_polly_audio_sync("audio", "task", "Joanna", 2500)
+
+    assert uri == "s3://audio/task.mp3"
+    assert [request["TextType"] for request in polly.requests] == ["ssml"]
+    # One frame of intro and the five of the stored summary.
+    assert polly_sync.mp3_duration_ms(s3.objects["audio", "task.mp3"]) == int(
+        6 * FRAME_MS
+    )
+
+
+def test_narration_synthesizes_the_summary_without_stored_audio(monkeypatch):
+    s3 = FakeS3()
+    polly = FakePolly()
+    monkeypatch.setattr(getframes, "s3_client", s3)
+    monkeypatch.setattr(getframes, "polly_client", polly)
+    s3.put_object(
+        Body="First sentence here. Second one.", Bucket="transcripts", Key="task.txt"
+    )
+
+    getframes.generate_polly_audio_sync("audio", "task", "Joanna", 2500)
+
+    assert [request["TextType"] for request in polly.requests] == ["ssml", "text"]
+    assert polly_sync.mp3_duration_ms(s3.objects["audio", "task.mp3"]) == int(
+        6 * FRAME_MS
+    )
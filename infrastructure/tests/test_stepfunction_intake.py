@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["vsh_dynamodb_table"] = "tasks"
+os.environ["StepFunction"] = "arn:aws:states:us-east-1:123456789012:stateMachine:vsh"
+
+from conftest import load_module
+
+app = load_module("stepfunction", "app")
+
+EXECUTION_PREFIX = "arn:aws:states:us-east-1:123456789012:execution:vsh:"
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "operation")
+
+
+class FakeTable:
+    """The task items, with the condition claim_task writes with."""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        with self.lock:
+            item = self.items.setdefault(Key["TaskId"], dict(Key))
+            if "ConditionExpression" in kwargs and item.get("ExecutionState") not in (
+                None,
+                ExpressionAttributeValues[":starting"],
+            ):
+                raise client_error("ConditionalCheckFailedException")
+            if ":starting" in ExpressionAttributeValues:
+                item["ExecutionState"] = ExpressionAttributeValues[":starting"]
+            else:
+                item["ExecutionState"] = ExpressionAttributeValues[":started"]
+                item["ExecutionArn"] = ExpressionAttributeValues[":arn"]
+
+
+class FakeDynamoDB:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+class FakeStepFunctions:
+    """Step Functions refuses a second execution with the same name."""
+
+    def __init__(self, error=None):
+        self.executions = {}
+        self.calls = 0
+        self.error = error
+        self.lock = threading.Lock()
+
+    def start_execution(self, stateMachineArn, name, input):
+        with self.lock:
+            self.calls += 1
+            if self.error is not None:
+                raise self.error
+            if name in self.executions:
+                raise client_error("ExecutionAlreadyExists")
+            self.executions[name] = json.loads(input)
+            return {"executionArn": EXECUTION_PREFIX + name}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(app, "dynamodb_client", FakeDynamoDB(table))
+    return table
+
+
+@pytest.fixture
+def stepfunctions(monkeypatch):
+    stepfunctions = FakeStepFunctions()
+    monkeypatch.setattr(app, "stepfunctions_client", stepfunctions)
+    return stepfunctions
+
+
+def record(taskId="task-1", messageId="message-1"):
+    body = {
+        "taskId": taskId,
+        "userId": "user",
+        "video_name": "video.mp4",
+        "voiceId": "Joanna",
+        "gender": "female",
+        # Given with the request, so the video is not read from S3.
+        "frame_rate": 25,
+    }
+    return {"messageId": messageId, "body": json.dumps(body)}
+
+
+def test_first_delivery_starts_the_execution(table, stepfunctions):
+    assert app.lambda_handler({"Records": [record()]}, None) == {
+        "batchItemFailures": []
+    }
+    assert list(stepfunctions.executions) == ["task-1"]
+    assert stepfunctions.executions["task-1"]["frame_rate"] == 25.0
+    assert table.items["task-1"]["ExecutionState"] == "Started"
+    assert table.items["task-1"]["ExecutionArn"] == EXECUTION_PREFIX + "task-1"
+
+
+def test_duplicate_delivery_after_started_is_skipped(table, stepfunctions):
+    app.lambda_handler({"Records": [record()]}, None)
+    response = app.lambda_handler({"Records": [record(messageId="message-2")]}, None)
+    assert response == {"batchItemFailures": []}
+    assert stepfunctions.calls == 1
+
+
+def test_concurrent_deliveries_start_one_execution(table, stepfunctions):
+    # Both copies can claim the task before either has started it, the
+    # execution name makes Step Functions refuse the second one.
+    records = [record(messageId=f"message-{i}") for i in range(4)]
+    assert app.lambda_handler({"Records": records}, None) == {"batchItemFailures": []}
+    assert list(stepfunctions.executions) == ["task-1"]
+    assert table.items["task-1"]["ExecutionState"] == "Started"
+
+
+def test_execution_already_exists_counts_as_started(table, stepfunctions):
+    assert app.claim_task("task-1")
+    assert app.claim_task("task-1")
+    app.start_execution("task-1", {"taskId": "task-1"})
+    app.start_execution("task-1", {"taskId": "task-1"})
+    assert stepfunctions.calls == 2
+    assert len(stepfunctions.executions) == 1
+    assert table.items["task-1"]["ExecutionArn"] == EXECUTION_PREFIX + "task-1"
+
+
+def test_retry_from_stale_starting_without_execution(table, stepfunctions):
+    # An earlier attempt claimed the task and failed before starting it.
+    table.items["task-1"] = {"TaskId": "task-1", "ExecutionState": "Starting"}
+    assert app.lambda_handler({"Records": [record()]}, None) == {
+        "batchItemFailures": []
+    }
+    assert list(stepfunctions.executions) == ["task-1"]
+    assert table.items["task-1"]["ExecutionState"] == "Started"
+
+
+def test_retry_from_stale_starting_after_execution(table, stepfunctions):
+    # An earlier attempt started the execution but failed to record it.
+    table.items["task-1"] = {"TaskId": "task-1", "ExecutionState": "Starting"}
+    stepfunctions.executions["task-1"] = {}
+    assert app.lambda_handler({"Records": [record()]}, None) == {
+        "batchItemFailures": []
+    }
+    assert stepfunctions.calls == 1
+    assert table.items["task-1"]["ExecutionState"] == "Started"
+    assert table.items["task-1"]["ExecutionArn"] == EXECUTION_PREFIX + "task-1"
+
+
+def test_failed_start_is_reported_and_can_be_retried(table, monkeypatch):
+    failing = FakeStepFunctions(error=client_error("ThrottlingException"))
+    monkeypatch.setattr(app, "stepfunctions_client", failing)
+    other = record("task-2", "message-2")
+    response = app.lambda_handler({"Records": [record(), other]}, None)
+    assert response == {
+        "batchItemFailures": [
+            {"itemIdentifier": "message-1"},
+            {"itemIdentifier": "message-2"},
+        ]
+    }
+    assert table.items["task-1"]["ExecutionState"] == "Starting"
+
+    working = FakeStepFunctions()
+    monkeypatch.setattr(app, "stepfunctions_client", working)
+    assert app.lambda_handler({"Records": [record()]}, None) == {
+        "batchItemFailures": []
+    }
+    assert list(working.executions) == ["task-1"]
+
+
+def test_message_without_task_id_uses_the_message_id(table, stepfunctions):
+    body = json.loads(record()["body"])
+    del body["taskId"]
+    message = {"messageId": "message-1", "body": json.dumps(body)}
+    app.lambda_handler({"Records": [message]}, None)
+    assert list(stepfunctions.executions) == ["message-1"]
@@ -0,0 +1,147 @@
+import srt
+from conftest import load_module
+
+stitching = load_module("eventbridge_transcribe", "stitching")
+
+# Two 10 s segments overlapping by 2 s, cut in the middle of the overlap.
+SEGMENTS = [(0, 10000), (8000, 18000)]
+
+
+def word(content, start, end):
+    return {
+        "type": "pronunciation",
+        "start_time": f"{start:.3f}",
+        "end_time": f"{end:.3f}",
+        "alternatives": [{"content": content}],
+    }
+
+
+def punctuation(content):
+    return {"type": "punctuation", "alternatives": [{"content": content}]}
+
+
+def result(*items):
+    return {"results": {"items": list(items)}}
+
+
+def words(stitched):
+    return [
+        (item["alternatives"][0]["content"], item.get("start_time"))
+        for item in stitched["results"]["items"]
+    ]
+
+
+def test_cut_points_split_the_overlaps_in_the_middle():
+    assert stitching.cut_points(SEGMENTS) == [(0, 9000), (9000, None)]
+    assert stitching.cut_points([(0, 5000)]) == [(0, None)]
+
+
+def test_json_keeps_each_word_once_around_the_cut():
+    first = result(
+        word("it", 8.2, 8.4),
+        word("was", 8.5, 8.8),
+        word("cold", 8.95, 9.2),
+        punctuation("."),
+    )
+    # The same words seen from the second segment, 8 s earlier.
+    second = result(
+        word("it", 0.2, 0.4),
+        word("was", 0.5, 0.8),
+        word("cold", 1.0, 1.2),
+        punctuation("."),
+        word("Then", 1.5, 1.8),
+    )
+    stitched = stitching.stitch_json(SEGMENTS, [first, second], "job")
+    assert words(stitched) == [
+        ("it", "8.200"),
+        ("was", "8.500"),
+        ("cold", "8.950"),
+        (".", None),
+        ("Then", "9.500"),
+    ]
+    assert stitched["results"]["transcripts"][0]["transcript"] == ("it was cold. Then")
+
+
+def test_json_drops_a_word_heard_on_both_sides_of_the_cut():
+    # "cold" starts just before the cut in the first segment and is heard
+    # again just after it in the second one.
+    first = result(word("so", 8.6, 8.8), word("cold", 8.9, 9.2))
+    second = result(word("cold", 1.05, 1.3), word("today", 1.4, 1.8))
+    stitched = stitching.stitch_json(SEGMENTS, [first, second], "job")
+    assert [content for content, _ in words(stitched)] == ["so", "cold", "today"]
+
+
+def test_json_keeps_repeated_words_inside_a_segment():
+    first = result(word("very", 8.9, 9.1))
+    second = result(
+        word("very", 1.05, 1.1),
+        word("very", 1.15, 1.4),
+        word("cold", 1.5, 1.8),
+    )
+    stitched = stitching.stitch_json(SEGMENTS, [first, second], "job")
+    assert words(stitched) == [
+        ("very", "8.900"),
+        ("very", "9.150"),
+        ("cold", "9.500"),
+    ]
+
+
+def test_json_keeps_a_repeat_after_the_first_word_of_a_segment():
+    first = result(word("no", 8.8, 8.95))
+    second = result(word("and", 1.0, 1.1), word("no", 1.15, 1.3))
+    stitched = stitching.stitch_json(SEGMENTS, [first, second], "job")
+    assert [content for content, _ in words(stitched)] == ["no", "and", "no"]
+
+
+def test_json_renumbers_item_ids():
+    first = result({**word("a", 1.0, 1.1), "id": 7})
+    second = result({**word("b", 2.0, 2.1), "id": 3})
+    stitched = stitching.stitch_json(SEGMENTS, [first, second], "job")
+    assert [item["id"] for item in stitched["results"]["items"]] == [0, 1]
+
+
+def cue(number, start, end, *lines):
+    return "\n".join(
+        [str(number), stitching.srt_time(start) + " --> " + stitching.srt_time(end)]
+        + list(lines)
+    )
+
+
+def test_srt_shifts_and_renumbers_cues():
+    first = cue(1, 1000, 3000, "Hello there")
+    second = cue(1, 2000, 4000, "General Kenobi")
+    assert stitching.stitch_srt(SEGMENTS, [first, second]) == (
+        "1\n00:00:01,000 --> 00:00:03,000\nHello there\n\n"
+        "2\n00:00:10,000 --> 00:00:12,000\nGeneral Kenobi\n"
+    )
+
+
+def test_srt_splits_a_cue_that_crosses_the_cut():
+    # One cue of four words from 8 s to 10 s, seen by both segments. Each
+    # word lasts 0.5 s, so two of them are before the 9 s cut.
+    first = cue(1, 8000, 10000, "one two", "three four")
+    second = cue(1, 0, 2000, "one two", "three four")
+    cues = list(
+        srt.iter_cue_lines(stitching.stitch_srt(SEGMENTS, [first, second]).splitlines())
+    )
+    assert cues == [
+        (8000, 9000, ["one two"]),
+        (9000, 10000, ["three four"]),
+    ]
+
+
+def test_srt_cues_do_not_overlap_across_the_cut():
+    # The segments break the same speech into different cues.
+    first = "\n\n".join([cue(1, 7000, 8500, "a b c"), cue(2, 8500, 9900, "d e f g")])
+    second = "\n\n".join([cue(1, 0, 1200, "c d e"), cue(2, 1200, 2500, "f g h")])
+    cues = list(
+        srt.iter_cue_lines(stitching.stitch_srt(SEGMENTS, [first, second]).splitlines())
+    )
+    for (_, end, _), (start, _, _) in zip(cues, cues[1:]):
+        assert end <= start
+    assert " ".join(" ".join(lines) for _, _, lines in cues) == "a b c d e f g h"
+
+
+def test_srt_of_a_single_segment_is_unchanged():
+    document = cue(1, 0, 1500, "Only cue")
+    assert stitching.stitch_srt([(0, 5000)], [document]) == document + "\n"
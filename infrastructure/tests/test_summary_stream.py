@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["bucket_audio"] = "audio"
+os.environ["bucket_transcripts"] = "transcripts"
+os.environ["bedrock_endpoint_region"] = "us-east-1"
+os.environ["bedrock_endpoint_model"] = "anthropic.claude-v2"
+os.environ["summary_stream_poll_seconds"] = "0"
+
+import polly_sync
+import summary_stream
+from conftest import FakePolly, FakeS3, load_module
+
+summarizetext = load_module("summarizetext", "app")
+text2speech = load_module("text2speech", "app")
+
+STREAM_KEY = summary_stream.stream_key("task")
+
+
+def event(completion):
+    return {"chunk": {"bytes": json.dumps({"completion": completion}).encode()}}
+
+
+def stream_lines(s3):
+    return [
+        json.loads(line)
+        for line in s3.objects["transcripts", STREAM_KEY].decode().splitlines()
+    ]
+
+
+def test_sentences_are_split_across_fragments():
+    completed = []
+    completion = summary_stream.stream_sentences(
+        [event("Hello wor"), event("ld. How"), event(" are you?"), event(" Fine")],
+        completed.append,
+    )
+    assert completed == ["Hello world.", "How are you?", "Fine"]
+    assert completion == "Hello world. How are you? Fine"
+
+
+def test_sentence_end_waits_for_the_next_character():
+    splitter = summary_stream.SentenceSplitter()
+    assert splitter.feed("Version 2.") == []
+    assert splitter.feed("5 is out. And") == ["Version 2.5 is out."]
+    assert splitter.flush() == ["And"]
+
+
+def test_error_events_raise():
+    with pytest.raises(RuntimeError, match="throttlingException"):
+        summary_stream.stream_sentences(
+            [event("One. "), {"throttlingException": {"message": "slow down"}}],
+            lambda sentence: None,
+        )
+
+
+def test_reader_follows_the_writer_until_the_end():
+    s3 = FakeS3()
+    writer = summary_stream.SummaryStreamWriter(s3, "transcripts", STREAM_KEY)
+    # Each poll of the reader lets the writer make progress.
+    steps = iter(
+        [
+            lambda: None,
+            lambda: writer.write("First."),
+            lambda: (writer.write("Second."), writer.write("Third.")),
+            writer.close,
+        ]
+    )
+
+    def read():
+        try:
+            return s3.get_object(Bucket="transcripts", Key=STREAM_KEY)["Body"].read()
+        except Exception:
+            return None
+
+    sentences = summary_stream.read_sentences(read, sleep=lambda seconds: next(steps)())
+    assert list(sentences) == ["First.", "Second.", "Third."]
+
+
+def test_reader_raises_when_summarization_failed():
+    s3 = FakeS3()
+    writer = summary_stream.SummaryStreamWriter(s3, "transcripts", STREAM_KEY)
+    writer.write("First.")
+    writer.fail("RuntimeError('model error')")
+    sentences = summary_stream.read_sentences(
+        lambda: s3.objects["transcripts", STREAM_KEY]
+    )
+    assert next(sentences) == "First."
+    with pytest.raises(RuntimeError, match="model error"):
+        next(sentences)
+
+
+def test_reader_gives_up_after_the_timeout():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    sentences = summary_stream.read_sentences(
+        lambda: None,
+        poll_seconds=1,
+        timeout_seconds=5,
+        sleep=sleep,
+        clock=lambda: now[0],
+    )
+    with pytest.raises(TimeoutError):
+        list(sentences)
+    assert now[0] == 5
+
+
+class FakeBedrock:
+    """Streams a completion in fragments and records what S3 held meanwhile."""
+
+    def __init__(self, s3, fragments):
+        self.s3 = s3
+        self.fragments = fragments
+        self.streamed_while_generating = []
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        def body():
+            for fragment in self.fragments:
+                if ("transcripts", STREAM_KEY) in self.s3.objects:
+                    self.streamed_while_generating.append(
+                        [line["sentence"] for line in stream_lines(self.s3)]
+                    )
+                yield event(fragment)
+
+        return {"body": body()}
+
+
+class NoCache:
+    def get(self, key):
+        return None
+
+    def put(self, key, text):
+        pass
+
+
+def summarizetext_fakes(monkeypatch, fragments):
+    s3 = FakeS3()
+    bedrock = FakeBedrock(s3, fragments)
+    monkeypatch.setattr(summarizetext, "s3_client", s3)
+    monkeypatch.setattr(summarizetext, "bedrock_client", bedrock)
+    monkeypatch.setattr(summarizetext, "summary_cache", NoCache())
+    monkeypatch.setattr(
+        summarizetext, "record_summary_cache_result", lambda taskId, hit: None
+    )
+    monkeypatch.setattr(
+        summarizetext, "get_transcript", lambda bucket, taskId: "Transcript text."
+    )
+    return s3, bedrock
+
+
+def test_summarizetext_streams_sentences_of_the_final_call(monkeypatch):
+    s3, bedrock = summarizetext_fakes(
+        monkeypatch, ["The video ", "shows a cat. It ", "sleeps.", " The end."]
+    )
+
+    summarizetext.lambda_handler({"taskId": "task", "summary_streaming": True}, None)
+
+    # The first sentence was readable before the model had finished.
+    assert ["The video shows a cat."] in bedrock.streamed_while_generating
+    assert stream_lines(s3) == [
+        {"sentence": "The video shows a cat."},
+        {"sentence": "It sleeps."},
+        {"sentence": "The end."},
+        {"end": True},
+    ]
+    assert (
+        s3.objects["transcripts", "task.txt"]
+        == b"The video shows a cat. It sleeps. The end."
+    )
+
+
+def test_summarizetext_without_streaming_writes_no_stream(monkeypatch):
+    s3, bedrock = summarizetext_fakes(monkeypatch, [])
+    monkeypatch.setattr(summarizetext, "bedrock_complete", lambda prompt: "Short.")
+
+    summarizetext.lambda_handler({"taskId": "task"}, None)
+
+    assert ("transcripts", STREAM_KEY) not in s3.objects
+    assert s3.objects["transcripts", "task.txt"] == b"Short."
+
+
+def test_summarizetext_marks_the_stream_failed(monkeypatch):
+    s3, bedrock = summarizetext_fakes(monkeypatch, [])
+
+    def fail(prompt, on_sentence):
+        on_sentence("Half a summary.")
+        raise RuntimeError("model error")
+
+    monkeypatch.setattr(summarizetext, "bedrock_stream_complete", fail)
+
+    with pytest.raises(RuntimeError):
+        summarizetext.lambda_handler(
+            {"taskId": "task", "summary_streaming": True}, None
+        )
+    assert stream_lines(s3)[-1] == {"error": "RuntimeError('model error')"}
+
+
+class GrowingStreamS3(FakeS3):
+    """Reveals one more line of the summary stream with every read.
+
+    The read that reveals the last line waits until Polly got a request, so
+    the test fails if synthesis only starts once the summary is complete.
+    """
+
+    def __init__(self, lines, first_request):
+        super().__init__()
+        self.lines = lines
+        self.first_request = first_request
+        self.stream_reads = 0
+        self.synthesized_before_the_end = None
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Key == STREAM_KEY:
+            self.stream_reads += 1
+            if self.stream_reads == len(self.lines):
+                self.synthesized_before_the_end = self.first_request.wait(5)
+            self.objects[Bucket, Key] = "".join(
+                json.dumps(line) + "\n" for line in self.lines[: self.stream_reads]
+            ).encode()
+        return super().get_object(Bucket, Key, Range)
+
+
+class RecordingStepFunctions:
+    def __init__(self):
+        self.outputs = []
+
+    def send_task_success(self, taskToken, output):
+        self.outputs.append(json.loads(output))
+
+
+def test_text2speech_synthesizes_sentences_while_the_summary_streams(monkeypatch):
+    first_request = threading.Event()
+    s3 = GrowingStreamS3(
+        [{"sentence": "A cat appears."}, {"sentence": "It sleeps."}, {"end": True}],
+        first_request,
+    )
+
+    class Polly(FakePolly):
+        def synthesize_speech(self, **request):
+            first_request.set()
+            return super().synthesize_speech(**request)
+
+    stepfunctions = RecordingStepFunctions()
+    monkeypatch.setenv("polly_mode", "sync")
+    monkeypatch.setattr(text2speech, "s3_client", s3)
+    monkeypatch.setattr(text2speech, "polly_client", Polly())
+    monkeypatch.setattr(text2speech, "stepfunctions_client", stepfunctions)
+    monkeypatch.setattr(
+        text2speech.notify, "publish_task_event", lambda *args, **kwargs: None
+    )
+
+    text2speech.lambda_handler(
+        {
+            "TaskToken": "token",
+            "VSHParams": {
+                "taskId": "task",
+                "userId": "user",
+                "voiceId": "Joanna",
+                "summary_streaming": True,
+            },
+        },
+        None,
+    )
+
+    assert s3.synthesized_before_the_end
+    assert stepfunctions.outputs == [{"outputUri": "s3://audio/task.marks"}]
+    speech_marks = [
+        json.loads(line) for line in s3.objects["audio", "task.marks"].splitlines()
+    ]
+    assert [mark["value"] for mark in speech_marks] == [
+        "A cat appears.",
+        "It sleeps.",
+        polly_sync.TRAILER,
+    ]
+    assert ("audio", polly_sync.summary_audio_key("task")) in s3.objects
@@ -0,0 +1,73 @@
+import srt
+import transcript_artifact
+
+TRANSCRIBE_RESULT = {
+    "results": {
+        "transcripts": [{"transcript": "Hello there. General Kenobi."}],
+        "items": [
+            (
+                {
+                    "type": "pronunciation",
+                    "start_time": f"{start:.3f}",
+                    "end_time": f"{end:.3f}",
+                    "alternatives": [{"content": content}],
+                }
+                if start is not None
+                else {"type": "punctuation", "alternatives": [{"content": content}]}
+            )
+            for content, start, end in [
+                ("Hello", 0.5, 0.9),
+                ("there", 1.0, 1.4),
+                (".", None, None),
+                ("General", 2.0, 2.5),
+                ("Kenobi", 2.6, 3.1),
+                (".", None, None),
+            ]
+        ],
+    }
+}
+
+# One cue holds the end of the first sentence and the start of the second,
+# so cue boundaries and word boundaries differ.
+SRT = """1
+00:00:00,400 --> 00:00:01,000
+Hello
+
+2
+00:00:01,000 --> 00:00:02,600
+there. General
+
+3
+00:00:02,600 --> 00:00:03,200
+Kenobi.
+"""
+
+
+def round_trip(columns, names):
+    data = transcript_artifact.encode(columns)
+    return transcript_artifact.read_columns(
+        lambda offset, length: data[offset : offset + length], names
+    )
+
+
+def test_sentences_from_words():
+    columns = round_trip(
+        transcript_artifact.build_columns(TRANSCRIBE_RESULT),
+        ["sentence_text", "sentence_start_ms", "sentence_end_ms", "word_text"],
+    )
+    assert columns["sentence_text"] == ["Hello there.", "General Kenobi."]
+    assert list(columns["sentence_start_ms"]) == [500, 2000]
+    assert list(columns["sentence_end_ms"]) == [1400, 3100]
+    assert columns["word_text"] == ["Hello", "there.", "General", "Kenobi."]
+
+
+def test_sentences_keep_srt_cue_boundaries():
+    subtitle_sentences = srt.read_sentences(SRT.splitlines())
+    columns = round_trip(
+        transcript_artifact.build_columns(TRANSCRIBE_RESULT, subtitle_sentences),
+        ["sentence_text", "sentence_start_ms", "sentence_end_ms", "transcript"],
+    )
+    assert columns["sentence_text"] == ["Hello there. General Kenobi."]
+    assert list(columns["sentence_start_ms"]) == [400]
+    assert list(columns["sentence_end_ms"]) == [3200]
+    assert columns["transcript"] == "Hello there. General Kenobi."